@@ -1,6 +1,14 @@
 import json
+import common_path
+from client_validation import CLIENT_INPUT_RULES, RecordValidator
+
+RULES = CLIENT_INPUT_RULES
+
+VALIDATOR = RecordValidator(RULES)
 
 class ClientBase:
+    __slots__ = ('__last_name', '__first_name', '__middle_name', '__address', '__phone')
+
     def __init__(self, last_name=None, first_name=None, middle_name=None, address=None, phone=None, data=None):
         if data:
             if isinstance(data, str):
@@ -14,32 +22,37 @@ class ClientBase:
             else:
                 raise ValueError("Invalid data format. Expected JSON string, plain string, or dictionary.")
         else:
-            self.__last_name = self.validate_field(last_name, "Last name", is_alpha=True, max_length=50)
-            self.__first_name = self.validate_field(first_name, "First name", is_alpha=True, max_length=50)
-            self.__middle_name = self.validate_field(middle_name, "Middle name", is_alpha=True, max_length=50)
-            self.__address = self.validate_field(address, "Address", max_length=100)
-            self.__phone = self.validate_field(phone, "Phone number", is_phone=True, exact_length=12)
+            self.__set_fields(dict(last_name=last_name, first_name=first_name, middle_name=middle_name,
+                                   address=address, phone=phone))
 
     def __init_from_string(self, data_str):
         parts = data_str.split()
         if len(parts) != 5:
             raise ValueError("Invalid string format. Expected: 'LastName FirstName MiddleName Address Phone'")
         
-        self.__last_name = self.validate_field(parts[0], "Last name", is_alpha=True, max_length=50)
-        self.__first_name = self.validate_field(parts[1], "First name", is_alpha=True, max_length=50)
-        self.__middle_name = self.validate_field(parts[2], "Middle name", is_alpha=True, max_length=50)
-        self.__address = self.validate_field(parts[3], "Address", max_length=100)
-        self.__phone = self.validate_field(parts[4], "Phone number", is_phone=True, exact_length=12)
+        self.__set_fields(dict(zip(RULES, parts)))
 
     def __init_from_dict(self, data_dict):
         try:
-            self.__last_name = self.validate_field(data_dict['last_name'], "Last name", is_alpha=True, max_length=50)
-            self.__first_name = self.validate_field(data_dict['first_name'], "First name", is_alpha=True, max_length=50)
-            self.__middle_name = self.validate_field(data_dict['middle_name'], "Middle name", is_alpha=True, max_length=50)
-            self.__address = self.validate_field(data_dict['address'], "Address", max_length=100)
-            self.__phone = self.validate_field(data_dict['phone'], "Phone number", is_phone=True, exact_length=12)
+            values = {key: data_dict[key] for key in RULES}
         except KeyError as e:
             raise ValueError(f"Missing key in JSON or dict: {e}")
+        self.__set_fields(values)
+
+    def __set_fields(self, values):
+        errors = VALIDATOR.validate(values)
+        if errors:
+            raise ValueError("; ".join(errors))
+        self.__last_name = values['last_name']
+        self.__first_name = values['first_name']
+        self.__middle_name = values['middle_name']
+        self.__address = values['address']
+        self.__phone = values['phone']
+
+    @staticmethod
+    def validate_batch(records):
+        # Все ошибки по каждой записи без исключений: {номер записи: [ошибки]}
+        return VALIDATOR.validate_batch(records)
 
     @staticmethod
     def validate_field(value, field_name, is_alpha=False, is_phone=False, max_length=None, exact_length=None):
@@ -75,6 +88,15 @@ class ClientBase:
     def get_phone(self):
         return self.__phone
 
+    def to_dict(self):
+        return {
+            'last_name': self.__last_name,
+            'first_name': self.__first_name,
+            'middle_name': self.__middle_name,
+            'address': self.__address,
+            'phone': self.__phone
+        }
+
     def __eq__(self, other):
         if isinstance(other, ClientBase):
             return (self.__last_name == other.__last_name and
@@ -86,6 +108,8 @@ class ClientBase:
 
 
 class Client(ClientBase):
+    __slots__ = ()
+
     def __str__(self):
         return (f"Client: {self.get_last_name()} {self.get_first_name()} {self.get_middle_name()}\n"
                 f"Address: {self.get_address()}\n"
@@ -93,6 +117,8 @@ class Client(ClientBase):
 
 
 class ClientShortInfo(ClientBase):
+    __slots__ = ()
+
     def __str__(self):
         return f"Client: {self.get_last_name()} {self.get_first_name()} - Phone: {self.get_phone()}"
 
@@ -0,0 +1,659 @@
+import json
+import os
+from datetime import date
+import common_path
+from client_file import CorruptFileError, atomic_write, open_checked
+from client_metrics import count, timed, timer
+from client_stream import iter_json_array
+from rental_availability import AvailabilityIndex, BookingConflictError
+from Client import Client
+
+# Нарушение ограничения-исключения rental_no_overlap
+EXCLUSION_VIOLATION = '23P01'
+
+
+def validate_amount(field_name, field_value):
+    if isinstance(field_value, bool) or not isinstance(field_value, (int, float)):
+        raise ValueError(f"{field_name} должна быть числом.")
+    if field_value <= 0:
+        raise ValueError(f"{field_name} должна быть больше нуля.")
+    return float(field_value)
+
+
+class Car:
+    __slots__ = ('_car_id', '_brand', '_model', '_type', '_rental_cost_per_day')
+
+    def __init__(self, car_id, brand, model, car_type, rental_cost_per_day):
+        Client.validate_field("CarID", car_id, int)
+        Client.validate_field("Марка", brand, str)
+        Client.validate_field("Модель", model, str)
+        Client.validate_field("Тип", car_type, str)
+        self._car_id = car_id
+        self._brand = brand
+        self._model = model
+        self._type = car_type
+        self._rental_cost_per_day = validate_amount("Стоимость аренды в сутки", rental_cost_per_day)
+
+    def to_dict(self):
+        return {
+            '_car_id': self._car_id,
+            '_brand': self._brand,
+            '_model': self._model,
+            '_type': self._type,
+            '_rental_cost_per_day': self._rental_cost_per_day,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['_car_id'], data['_brand'], data['_model'], data['_type'], data['_rental_cost_per_day'])
+
+    def get_car_details(self):
+        return f"{self._brand} {self._model} ({self._type}), {self._rental_cost_per_day:.2f} в сутки"
+
+    def get_rental_cost(self, days):
+        return days * self._rental_cost_per_day
+
+    def __str__(self):
+        return (f"Car(ID={self._car_id}, Марка='{self._brand}', Модель='{self._model}', "
+                f"Тип='{self._type}', Стоимость={self._rental_cost_per_day:.2f})")
+
+    def __repr__(self):
+        return f"Car(ID={self._car_id}, Марка='{self._brand}', Модель='{self._model}')"
+
+    def __eq__(self, other):
+        if not isinstance(other, Car):
+            return False
+        return self._car_id == other._car_id
+
+
+class Rental:
+    # Период аренды полуоткрытый: RentalEndDate - день возврата, с этого дня автомобиль снова свободен
+    __slots__ = ('_rental_id', '_client_id', '_car_id', '_start_date', '_end_date')
+
+    def __init__(self, rental_id, client_id, car_id, start_date, end_date):
+        Client.validate_field("RentalID", rental_id, int)
+        Client.validate_field("ClientID", client_id, int)
+        Client.validate_field("CarID", car_id, int)
+        Client.validate_field("Дата начала аренды", start_date, date)
+        Client.validate_field("Дата окончания аренды", end_date, date)
+        if end_date <= start_date:
+            raise ValueError("Дата окончания аренды должна быть позже даты начала.")
+        self._rental_id = rental_id
+        self._client_id = client_id
+        self._car_id = car_id
+        self._start_date = start_date
+        self._end_date = end_date
+
+    def to_dict(self):
+        return {
+            '_rental_id': self._rental_id,
+            '_client_id': self._client_id,
+            '_car_id': self._car_id,
+            '_start_date': self._start_date.isoformat(),
+            '_end_date': self._end_date.isoformat(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['_rental_id'], data['_client_id'], data['_car_id'],
+                   date.fromisoformat(data['_start_date']), date.fromisoformat(data['_end_date']))
+
+    def get_rental_duration(self):
+        return (self._end_date - self._start_date).days
+
+    def calculate_total_cost(self, car):
+        return car.get_rental_cost(self.get_rental_duration())
+
+    def __str__(self):
+        return (f"Rental(ID={self._rental_id}, ClientID={self._client_id}, CarID={self._car_id}, "
+                f"С={self._start_date.isoformat()}, По={self._end_date.isoformat()})")
+
+    def __repr__(self):
+        return f"Rental(ID={self._rental_id}, CarID={self._car_id})"
+
+    def __eq__(self, other):
+        if not isinstance(other, Rental):
+            return False
+        return self._rental_id == other._rental_id
+
+
+class Payment:
+    __slots__ = ('_payment_id', '_rental_id', '_amount', '_payment_date')
+
+    def __init__(self, payment_id, rental_id, amount, payment_date):
+        Client.validate_field("PaymentID", payment_id, int)
+        Client.validate_field("RentalID", rental_id, int)
+        Client.validate_field("Дата платежа", payment_date, date)
+        self._payment_id = payment_id
+        self._rental_id = rental_id
+        self._amount = validate_amount("Сумма платежа", amount)
+        self._payment_date = payment_date
+
+    def to_dict(self):
+        return {
+            '_payment_id': self._payment_id,
+            '_rental_id': self._rental_id,
+            '_amount': self._amount,
+            '_payment_date': self._payment_date.isoformat(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['_payment_id'], data['_rental_id'], data['_amount'], date.fromisoformat(data['_payment_date']))
+
+    def get_payment_info(self):
+        return f"Платёж {self._payment_id} по аренде {self._rental_id}: {self._amount:.2f} от {self._payment_date.isoformat()}"
+
+    def __str__(self):
+        return (f"Payment(ID={self._payment_id}, RentalID={self._rental_id}, "
+                f"Сумма={self._amount:.2f}, Дата={self._payment_date.isoformat()})")
+
+    def __repr__(self):
+        return f"Payment(ID={self._payment_id}, RentalID={self._rental_id})"
+
+    def __eq__(self, other):
+        if not isinstance(other, Payment):
+            return False
+        return self._payment_id == other._payment_id
+
+
+class Record_rep:
+    # Общая часть JSON-хранилищ автомобилей, аренд и платежей: загрузка, сохранение и индекс по ID
+    record_class = None
+    id_field = None
+    name = 'records'
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.records = []
+        self.next_id = 1
+        self._id_index = {}
+        with timer(f'{self.name}.load'):
+            if os.path.exists(self.filepath):
+                self.load_data()
+            self.rebuild_index()
+        count(f'{self.name}.loaded', len(self.records))
+
+    def load_data(self):
+        try:
+            with open_checked(self.filepath) as f:
+                self.records = [self.record_class.from_dict(item) for item in iter_json_array(f)]
+        except FileNotFoundError as e:
+            print(f"Ошибка при загрузке из JSON: {e}")
+        except CorruptFileError:
+            raise
+        except (KeyError, TypeError, ValueError) as e:
+            raise CorruptFileError(f"{self.filepath}: {e}") from e
+
+    def rebuild_index(self):
+        self._id_index = {getattr(record, self.id_field): record for record in self.records}
+        self.next_id = max(self._id_index) + 1 if self._id_index else 1
+
+    def save_data(self):
+        try:
+            atomic_write(self.filepath, lambda f: json.dump([record.to_dict() for record in self.records], f,
+                                                            ensure_ascii=False, indent=4))
+        except OSError as e:
+            print(f"Ошибка при сохранении в JSON: {e}")
+
+    def get_by_id(self, record_id):
+        return self._id_index.get(record_id)
+
+    def _append(self, record):
+        self.records.append(record)
+        self._id_index[getattr(record, self.id_field)] = record
+        self.next_id += 1
+        self.save_data()
+        return record
+
+    def _remove(self, record_id):
+        record = self._id_index.pop(record_id, None)
+        if record is not None:
+            self.records.remove(record)
+        return record
+
+    def get_count(self):
+        return len(self.records)
+
+
+class Car_rep(Record_rep):
+    record_class = Car
+    id_field = '_car_id'
+    name = 'cars'
+
+    def __init__(self, filepath="cars.json"):
+        self._type_index = {}
+        self._brand_index = {}
+        # Задаёт Rental_rep, созданный поверх этого хранилища
+        self.rental_rep = None
+        super().__init__(filepath)
+
+    def rebuild_index(self):
+        super().rebuild_index()
+        self._type_index = {}
+        self._brand_index = {}
+        for car in self.records:
+            self._index_car(car)
+
+    def _index_car(self, car):
+        self._type_index.setdefault(car._type, set()).add(car._car_id)
+        self._brand_index.setdefault(car._brand, set()).add(car._car_id)
+
+    def _unindex_car(self, car):
+        self._type_index[car._type].discard(car._car_id)
+        self._brand_index[car._brand].discard(car._car_id)
+
+    def get_car_by_id(self, car_id):
+        return self.get_by_id(car_id)
+
+    def get_all_cars(self):
+        return list(self.records)
+
+    def find_car_ids(self, car_type=None, brand=None):
+        if car_type is None and brand is None:
+            return sorted(self._id_index)
+        if car_type is None:
+            return sorted(self._brand_index.get(brand, ()))
+        ids = self._type_index.get(car_type, set())
+        if brand is not None:
+            ids = ids & self._brand_index.get(brand, set())
+        return sorted(ids)
+
+    @timed('cars.add_car')
+    def add_car(self, brand, model, car_type, rental_cost_per_day):
+        car = self._append(Car(self.next_id, brand, model, car_type, rental_cost_per_day))
+        self._index_car(car)
+        return car
+
+    @timed('cars.update_car')
+    def update_car(self, car_id, brand, model, car_type, rental_cost_per_day):
+        car = self.get_car_by_id(car_id)
+        if car is None:
+            return False
+        updated = Car(car_id, brand, model, car_type, rental_cost_per_day)
+        self._unindex_car(car)
+        car._brand, car._model, car._type = updated._brand, updated._model, updated._type
+        car._rental_cost_per_day = updated._rental_cost_per_day
+        self._index_car(car)
+        self.save_data()
+        return True
+
+    @timed('cars.delete_car')
+    def delete_car(self, car_id):
+        # Как REFERENCES Car в таблице Rental без ON DELETE: автомобиль с арендами не удаляется
+        if self.rental_rep is not None and self.rental_rep.has_rentals_for_car(car_id):
+            raise ValueError(f"Автомобиль с ID {car_id} нельзя удалить: на него оформлены аренды.")
+        car = self._remove(car_id)
+        if car is None:
+            return False
+        self._unindex_car(car)
+        self.save_data()
+        return True
+
+
+class Rental_rep(Record_rep):
+    record_class = Rental
+    id_field = '_rental_id'
+    name = 'rentals'
+
+    def __init__(self, filepath="rentals.json", car_rep=None, client_rep=None):
+        self.car_rep = car_rep
+        self.client_rep = client_rep
+        # Задаёт Payment_rep, созданный поверх этого хранилища
+        self.payment_rep = None
+        self.availability = AvailabilityIndex()
+        super().__init__(filepath)
+        if car_rep is not None:
+            car_rep.rental_rep = self
+
+    def rebuild_index(self):
+        super().rebuild_index()
+        self.availability = AvailabilityIndex()
+        for rental in self.records:
+            try:
+                self.availability.book(rental._rental_id, rental._car_id, rental._start_date, rental._end_date)
+            except BookingConflictError as e:
+                raise CorruptFileError(f"{self.filepath}: {e}") from e
+
+    def _check_references(self, client_id, car_id):
+        if self.car_rep is not None and self.car_rep.get_car_by_id(car_id) is None:
+            raise ValueError(f"Автомобиль с ID {car_id} не найден.")
+        if self.client_rep is not None and self.client_rep.get_client_by_id(client_id) is None:
+            raise ValueError(f"Клиент с ID {client_id} не найден.")
+
+    def get_rental_by_id(self, rental_id):
+        return self.get_by_id(rental_id)
+
+    def get_rentals_for_car(self, car_id, start_date=date.min, end_date=date.max):
+        return [self._id_index[rental_id] for rental_id, _, _ in self.availability.bookings(car_id, start_date, end_date)]
+
+    def is_car_free(self, car_id, start_date, end_date):
+        return self.availability.is_free(car_id, start_date, end_date)
+
+    def has_rentals_for_car(self, car_id):
+        return self.availability.has_bookings(car_id)
+
+    @timed('rentals.find_free_cars')
+    def find_free_cars(self, start_date, end_date, car_type=None, brand=None):
+        if self.car_rep is None:
+            raise ValueError("Для поиска свободных автомобилей нужно хранилище автомобилей.")
+        free = self.availability.free_cars(self.car_rep.find_car_ids(car_type, brand), start_date, end_date)
+        return [self.car_rep.get_car_by_id(car_id) for car_id in free]
+
+    def free_slots(self, car_id, start_date, end_date):
+        return self.availability.free_slots(car_id, start_date, end_date)
+
+    @timed('rentals.add_rental')
+    def add_rental(self, client_id, car_id, start_date, end_date):
+        rental = Rental(self.next_id, client_id, car_id, start_date, end_date)
+        self._check_references(client_id, car_id)
+        # Пересечение с существующей бронью отклоняется до того, как аренда попадёт в список
+        self.availability.book(rental._rental_id, car_id, start_date, end_date)
+        return self._append(rental)
+
+    @timed('rentals.update_rental')
+    def update_rental(self, rental_id, client_id, car_id, start_date, end_date):
+        rental = self.get_rental_by_id(rental_id)
+        if rental is None:
+            return False
+        updated = Rental(rental_id, client_id, car_id, start_date, end_date)
+        self._check_references(client_id, car_id)
+        self.availability.rebook(rental_id, car_id, start_date, end_date)
+        rental._client_id, rental._car_id = updated._client_id, updated._car_id
+        rental._start_date, rental._end_date = updated._start_date, updated._end_date
+        self.save_data()
+        return True
+
+    @timed('rentals.delete_rental')
+    def delete_rental(self, rental_id):
+        if self._remove(rental_id) is None:
+            return False
+        self.availability.release(rental_id)
+        # Как ON DELETE CASCADE у Payment.RentalID: платежи удаляются вместе с арендой
+        if self.payment_rep is not None:
+            self.payment_rep.delete_payments_for_rental(rental_id)
+        self.save_data()
+        return True
+
+
+class Payment_rep(Record_rep):
+    record_class = Payment
+    id_field = '_payment_id'
+    name = 'payments'
+
+    def __init__(self, filepath="payments.json", rental_rep=None):
+        self.rental_rep = rental_rep
+        self._rental_index = {}
+        super().__init__(filepath)
+        if rental_rep is not None:
+            rental_rep.payment_rep = self
+
+    def rebuild_index(self):
+        super().rebuild_index()
+        self._rental_index = {}
+        for payment in self.records:
+            self._rental_index.setdefault(payment._rental_id, []).append(payment)
+
+    def get_payment_by_id(self, payment_id):
+        return self.get_by_id(payment_id)
+
+    def get_payments_for_rental(self, rental_id):
+        return list(self._rental_index.get(rental_id, ()))
+
+    @timed('payments.add_payment')
+    def add_payment(self, rental_id, amount, payment_date):
+        payment = Payment(self.next_id, rental_id, amount, payment_date)
+        if self.rental_rep is not None and self.rental_rep.get_rental_by_id(rental_id) is None:
+            raise ValueError(f"Аренда с ID {rental_id} не найдена.")
+        self._rental_index.setdefault(rental_id, []).append(payment)
+        return self._append(payment)
+
+    @timed('payments.delete_payment')
+    def delete_payment(self, payment_id):
+        payment = self._remove(payment_id)
+        if payment is None:
+            return False
+        self._rental_index[payment._rental_id].remove(payment)
+        self.save_data()
+        return True
+
+    def delete_payments_for_rental(self, rental_id):
+        payments = self._rental_index.pop(rental_id, None)
+        if not payments:
+            return 0
+        for payment in payments:
+            del self._id_index[payment._payment_id]
+        self.records = [payment for payment in self.records if payment._rental_id != rental_id]
+        self.save_data()
+        return len(payments)
+
+
+CAR_COLUMNS = ('CarID', 'Brand', 'Model', 'Type', 'RentalCostPerDay')
+RENTAL_COLUMNS = ('RentalID', 'ClientID', 'CarID', 'RentalStartDate', 'RentalEndDate')
+PAYMENT_COLUMNS = ('PaymentID', 'RentalID', 'Amount', 'PaymentDate')
+
+# Пересечение броней одного автомобиля запрещает сама база. Индекс GiST этого ограничения
+# заодно обслуживает поиск свободных автомобилей (CarID = ... AND daterange && ...)
+RENTAL_EXCLUSION_SQL = """
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'rental_no_overlap') THEN
+        ALTER TABLE Rental ADD CONSTRAINT rental_no_overlap
+            EXCLUDE USING gist (CarID WITH =, daterange(RentalStartDate, RentalEndDate) WITH &&);
+    END IF;
+END $$;
+"""
+
+OVERLAP_CONDITION = ("r.CarID = c.CarID "
+                     "AND daterange(r.RentalStartDate, r.RentalEndDate) && daterange(%s, %s)")
+
+
+def row_to_car(row):
+    car_id, brand, model, car_type, cost = row
+    return Car(car_id, brand, model, car_type, float(cost))
+
+
+def row_to_payment(row):
+    payment_id, rental_id, amount, payment_date = row
+    return Payment(payment_id, rental_id, float(amount), payment_date)
+
+
+class CarDB:
+    def __init__(self, db_connector):
+        self.db_connector = db_connector
+
+    def initialize_db(self):
+        cursor = self.db_connector.execute_query("""
+            CREATE TABLE IF NOT EXISTS Car (
+                CarID SERIAL PRIMARY KEY,
+                Brand VARCHAR(100) NOT NULL,
+                Model VARCHAR(100) NOT NULL,
+                Type VARCHAR(50) NOT NULL,
+                RentalCostPerDay NUMERIC(10, 2) NOT NULL CHECK (RentalCostPerDay > 0)
+            )
+        """)
+        self.db_connector.execute_query("CREATE INDEX IF NOT EXISTS car_type_brand_idx ON Car (Type, Brand)")
+        self.db_connector.execute_query("CREATE INDEX IF NOT EXISTS car_brand_idx ON Car (Brand)")
+        if cursor:
+            print("Таблица 'Car' успешно создана.")
+
+    @timed('db.get_car_by_id')
+    def get_car_by_id(self, car_id):
+        cursor = self.db_connector.execute_query(
+            f"SELECT {', '.join(CAR_COLUMNS)} FROM Car WHERE CarID = %s", (car_id,), idempotent=True)
+        row = cursor.fetchone() if cursor else None
+        return row_to_car(row) if row else None
+
+    @timed('db.get_all_cars')
+    def get_all_cars(self):
+        cursor = self.db_connector.execute_query(f"SELECT {', '.join(CAR_COLUMNS)} FROM Car ORDER BY CarID", idempotent=True)
+        return [row_to_car(row) for row in cursor.fetchall()] if cursor else []
+
+    @timed('db.add_car')
+    def add_car(self, brand, model, car_type, rental_cost_per_day):
+        cursor = self.db_connector.execute_query(
+            f"INSERT INTO Car (Brand, Model, Type, RentalCostPerDay) VALUES (%s, %s, %s, %s) "
+            f"RETURNING {', '.join(CAR_COLUMNS)}", (brand, model, car_type, rental_cost_per_day))
+        row = cursor.fetchone() if cursor else None
+        return row_to_car(row) if row else None
+
+    @timed('db.update_car')
+    def update_car(self, car_id, brand, model, car_type, rental_cost_per_day):
+        cursor = self.db_connector.execute_query(
+            "UPDATE Car SET Brand = %s, Model = %s, Type = %s, RentalCostPerDay = %s WHERE CarID = %s",
+            (brand, model, car_type, rental_cost_per_day, car_id))
+        return cursor is not None and cursor.rowcount > 0
+
+    @timed('db.delete_car')
+    def delete_car(self, car_id):
+        cursor = self.db_connector.execute_query("DELETE FROM Car WHERE CarID = %s", (car_id,))
+        return cursor is not None and cursor.rowcount > 0
+
+
+class RentalDB:
+    def __init__(self, db_connector):
+        self.db_connector = db_connector
+
+    def initialize_db(self):
+        cursor = self.db_connector.execute_query("""
+            CREATE TABLE IF NOT EXISTS Rental (
+                RentalID SERIAL PRIMARY KEY,
+                ClientID INTEGER NOT NULL REFERENCES Client (ClientID),
+                CarID INTEGER NOT NULL REFERENCES Car (CarID),
+                RentalStartDate DATE NOT NULL,
+                RentalEndDate DATE NOT NULL,
+                CHECK (RentalEndDate > RentalStartDate)
+            )
+        """)
+        self.db_connector.execute_query("CREATE INDEX IF NOT EXISTS rental_client_idx ON Rental (ClientID)")
+        # btree_gist нужен, чтобы в одном GiST-индексе сравнивать CarID на равенство и периоды на пересечение
+        if self.db_connector.execute_query("CREATE EXTENSION IF NOT EXISTS btree_gist"):
+            self.db_connector.execute_query(RENTAL_EXCLUSION_SQL)
+        else:
+            print("Расширение btree_gist недоступно: пересечения броней проверяются только при вставке.")
+            self.db_connector.execute_query(
+                "CREATE INDEX IF NOT EXISTS rental_car_period_idx ON Rental (CarID, RentalStartDate, RentalEndDate)")
+        if cursor:
+            print("Таблица 'Rental' успешно создана.")
+
+    @timed('db.get_rental_by_id')
+    def get_rental_by_id(self, rental_id):
+        cursor = self.db_connector.execute_query(
+            f"SELECT {', '.join(RENTAL_COLUMNS)} FROM Rental WHERE RentalID = %s", (rental_id,), idempotent=True)
+        row = cursor.fetchone() if cursor else None
+        return Rental(*row) if row else None
+
+    @timed('db.get_rentals_for_car')
+    def get_rentals_for_car(self, car_id, start_date=None, end_date=None):
+        query = f"SELECT {', '.join(RENTAL_COLUMNS)} FROM Rental r WHERE r.CarID = %s"
+        params = [car_id]
+        if start_date is not None and end_date is not None:
+            query += " AND daterange(r.RentalStartDate, r.RentalEndDate) && daterange(%s, %s)"
+            params += [start_date, end_date]
+        cursor = self.db_connector.execute_query(query + " ORDER BY RentalStartDate", params, idempotent=True)
+        return [Rental(*row) for row in cursor.fetchall()] if cursor else []
+
+    @timed('db.find_free_cars')
+    def find_free_cars(self, start_date, end_date, car_type=None, brand=None):
+        if end_date <= start_date:
+            raise ValueError("Дата окончания аренды должна быть позже даты начала.")
+        conditions = [f"NOT EXISTS (SELECT 1 FROM Rental r WHERE {OVERLAP_CONDITION})"]
+        params = [start_date, end_date]
+        if car_type is not None:
+            conditions.append("c.Type = %s")
+            params.append(car_type)
+        if brand is not None:
+            conditions.append("c.Brand = %s")
+            params.append(brand)
+        columns = ', '.join(f"c.{column}" for column in CAR_COLUMNS)
+        cursor = self.db_connector.execute_query(
+            f"SELECT {columns} FROM Car c WHERE {' AND '.join(conditions)} ORDER BY c.CarID", params, idempotent=True)
+        return [row_to_car(row) for row in cursor.fetchall()] if cursor else []
+
+    @timed('db.add_rental')
+    def add_rental(self, client_id, car_id, start_date, end_date):
+        # Вставка с NOT EXISTS сразу сообщает о занятом периоде; одновременную бронь того же
+        # периода из другой транзакции отклонит ограничение rental_no_overlap
+        Rental(0, client_id, car_id, start_date, end_date)
+        query = (f"INSERT INTO Rental (ClientID, CarID, RentalStartDate, RentalEndDate) "
+                 f"SELECT %s, c.CarID, %s, %s FROM Car c WHERE c.CarID = %s "
+                 f"AND NOT EXISTS (SELECT 1 FROM Rental r WHERE {OVERLAP_CONDITION}) "
+                 f"RETURNING {', '.join(RENTAL_COLUMNS)}")
+        try:
+            with self.db_connector.cursor() as cursor:
+                cursor.execute(query, (client_id, start_date, end_date, car_id, start_date, end_date))
+                row = cursor.fetchone()
+        except self.db_connector.driver.Error as e:
+            if getattr(e, 'pgcode', None) == EXCLUSION_VIOLATION:
+                raise BookingConflictError(car_id, start_date, end_date) from e
+            raise
+        if row is None:
+            cursor = self.db_connector.execute_query("SELECT 1 FROM Car WHERE CarID = %s", (car_id,), idempotent=True)
+            if cursor is not None and cursor.fetchone() is None:
+                raise ValueError(f"Автомобиль с ID {car_id} не найден.")
+            raise BookingConflictError(car_id, start_date, end_date)
+        return Rental(*row)
+
+    @timed('db.update_rental')
+    def update_rental(self, rental_id, client_id, car_id, start_date, end_date):
+        Rental(rental_id, client_id, car_id, start_date, end_date)
+        try:
+            with self.db_connector.cursor() as cursor:
+                cursor.execute("UPDATE Rental SET ClientID = %s, CarID = %s, RentalStartDate = %s, RentalEndDate = %s "
+                               "WHERE RentalID = %s", (client_id, car_id, start_date, end_date, rental_id))
+                return cursor.rowcount > 0
+        except self.db_connector.driver.Error as e:
+            if getattr(e, 'pgcode', None) == EXCLUSION_VIOLATION:
+                raise BookingConflictError(car_id, start_date, end_date) from e
+            raise
+
+    @timed('db.delete_rental')
+    def delete_rental(self, rental_id):
+        cursor = self.db_connector.execute_query("DELETE FROM Rental WHERE RentalID = %s", (rental_id,))
+        return cursor is not None and cursor.rowcount > 0
+
+
+class PaymentDB:
+    def __init__(self, db_connector):
+        self.db_connector = db_connector
+
+    def initialize_db(self):
+        cursor = self.db_connector.execute_query("""
+            CREATE TABLE IF NOT EXISTS Payment (
+                PaymentID SERIAL PRIMARY KEY,
+                RentalID INTEGER NOT NULL REFERENCES Rental (RentalID) ON DELETE CASCADE,
+                Amount NUMERIC(12, 2) NOT NULL CHECK (Amount > 0),
+                PaymentDate DATE NOT NULL
+            )
+        """)
+        self.db_connector.execute_query("CREATE INDEX IF NOT EXISTS payment_rental_idx ON Payment (RentalID)")
+        if cursor:
+            print("Таблица 'Payment' успешно создана.")
+
+    @timed('db.get_payments_for_rental')
+    def get_payments_for_rental(self, rental_id):
+        cursor = self.db_connector.execute_query(
+            f"SELECT {', '.join(PAYMENT_COLUMNS)} FROM Payment WHERE RentalID = %s ORDER BY PaymentDate, PaymentID",
+            (rental_id,), idempotent=True)
+        return [row_to_payment(row) for row in cursor.fetchall()] if cursor else []
+
+    @timed('db.add_payment')
+    def add_payment(self, rental_id, amount, payment_date):
+        Payment(0, rental_id, amount, payment_date)
+        cursor = self.db_connector.execute_query(
+            f"INSERT INTO Payment (RentalID, Amount, PaymentDate) VALUES (%s, %s, %s) "
+            f"RETURNING {', '.join(PAYMENT_COLUMNS)}", (rental_id, amount, payment_date))
+        row = cursor.fetchone() if cursor else None
+        return row_to_payment(row) if row else None
+
+    @timed('db.delete_payment')
+    def delete_payment(self, payment_id):
+        cursor = self.db_connector.execute_query("DELETE FROM Payment WHERE PaymentID = %s", (payment_id,))
+        return cursor is not None and cursor.rowcount > 0
+
+
+def initialize_rental_db(db_connector):
+    # Порядок важен: Rental ссылается на Client и Car, Payment - на Rental
+    CarDB(db_connector).initialize_db()
+    RentalDB(db_connector).initialize_db()
+    PaymentDB(db_connector).initialize_db()
@@ -2,53 +2,347 @@ import yaml
 import json
 import psycopg2
 import os
+import sys
+import io
+import csv
+import sqlite3
+import bisect
+import random
+import threading
+import time
+from contextlib import contextmanager
+from itertools import count as counter, islice, starmap
+from operator import attrgetter, itemgetter
+import common_path
+from client_stream import iter_json_array, iter_json_lines, iter_yaml_list
+from client_bulk import import_clients, export_clients
+from client_search import WORD_RE, ClientSearchIndex, normalize, phone_digits
+from client_file import CorruptFileError, atomic_write, open_checked, paused_gc, read_checksum
+from client_snapshot import open_snapshot, save_snapshot
+from client_metrics import count, observe_query, start_profiling, timed, timer
+from client_cache import ChangeListener, LRUCache
+from client_validation import CLIENT_STORED_RULES, RUSSIAN_MESSAGES, RecordValidator, describe_errors, keyed_rules
+
+class QueryResult:
+    def __init__(self, cursor):
+        self.description = cursor.description
+        self.rowcount = cursor.rowcount
+        self._rows = cursor.fetchall() if cursor.description is not None else []
+        self._pos = 0
+
+    def fetchone(self):
+        if self._pos >= len(self._rows):
+            return None
+        row = self._rows[self._pos]
+        self._pos += 1
+        return row
+
+    def fetchall(self):
+        rows = self._rows[self._pos:]
+        self._pos = len(self._rows)
+        return rows
+
+
+# serialization_failure и deadlock_detected: транзакцию можно безопасно повторить целиком
+RETRYABLE_ERRORS = ('40001', '40P01')
+ISOLATION_LEVELS = ('READ COMMITTED', 'REPEATABLE READ', 'SERIALIZABLE')
+
 
 class DatabaseConnector:
     __instance = None
 
     @staticmethod
-    def get_instance(host, user, password, database, port=5432):
+    def get_instance(host, user, password, database, port=5432, min_size=1, max_size=10):
         if DatabaseConnector.__instance is None:
-            DatabaseConnector(host, user, password, database, port)
+            DatabaseConnector(host, user, password, database, port, min_size, max_size)
         return DatabaseConnector.__instance
 
-    def __init__(self, host, user, password, database, port=5432):
+    def __init__(self, host, user, password, database, port=5432, min_size=1, max_size=10,
+                 driver=psycopg2, health_check_interval=30):
         if DatabaseConnector.__instance is not None:
             raise Exception("Это паттерн 'Одиночка'")
         else:
             DatabaseConnector.__instance = self
-            self.connection = None
-            self.cursor = None
+            self.driver = driver
+            self.connect_params = dict(host=host, user=user, password=password, database=database, port=port)
+            self.min_size = min_size
+            self.max_size = max_size
+            self.health_check_interval = health_check_interval
+            self.connected = False
+            self._idle = []
+            self._local = threading.local()
+            self._stream_ids = counter(1)
+            self._lock = threading.Lock()
+            self._slots = threading.BoundedSemaphore(max_size)
             try:
-                self.connection = psycopg2.connect(
-                    host=host,
-                    user=user,
-                    password=password,
-                    database=database,
-                    port=port
-                )
-                self.cursor = self.connection.cursor()
-            except psycopg2.Error as e:
+                for _ in range(min_size):
+                    self._idle.append((self._connect(), time.monotonic()))
+                self.connected = True
+            except driver.Error as e:
                 print(f"Ошибка подключения к базе данных PostgreSQL: {e}")
 
-    def execute_query(self, query, params=None):
+    def _connect(self):
+        return self.driver.connect(**self.connect_params)
+
+    def _is_alive(self, conn, idle_since):
+        if getattr(conn, 'closed', 0):
+            return False
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except self.driver.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except self.driver.Error:
+            pass
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, idle_since = self._idle.pop()
+            if self._is_alive(conn, idle_since):
+                return conn
+            self._discard(conn)
+        return self._connect()
+
+    def _checkin(self, conn):
+        with self._lock:
+            if len(self._idle) < self.max_size:
+                self._idle.append((conn, time.monotonic()))
+                return
+        self._discard(conn)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        if not self._slots.acquire(timeout=timeout):
+            raise self.driver.OperationalError("Пул соединений исчерпан")
+        conn = None
+        try:
+            conn = self._checkout()
+            yield conn
+        except BaseException as e:
+            if conn is not None:
+                broken = isinstance(e, (self.driver.OperationalError, self.driver.InterfaceError))
+                if not broken:
+                    try:
+                        conn.rollback()
+                    except self.driver.Error:
+                        broken = True
+                if broken or getattr(conn, 'closed', 0):
+                    self._discard(conn)
+                    conn = None
+            raise
+        finally:
+            if conn is not None:
+                self._checkin(conn)
+            self._slots.release()
+
+    def in_transaction(self):
+        return getattr(self._local, 'conn', None) is not None
+
+    @contextmanager
+    def transaction(self, isolation_level=None, timeout=None):
+        # Все запросы этого потока внутри блока идут через одно соединение и фиксируются одним COMMIT.
+        # Вложенный блок становится точкой сохранения и откатывается отдельно
+        if isolation_level and isolation_level.upper() not in ISOLATION_LEVELS:
+            raise ValueError(f"Неизвестный уровень изоляции: {isolation_level}")
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.depth += 1
+            name = f"unit_{self._local.depth}"
+            try:
+                self._execute(conn, f"SAVEPOINT {name}")
+                try:
+                    yield conn
+                except BaseException:
+                    self._execute(conn, f"ROLLBACK TO SAVEPOINT {name}")
+                    raise
+                self._execute(conn, f"RELEASE SAVEPOINT {name}")
+            finally:
+                self._local.depth -= 1
+            return
+        with self.connection(timeout) as conn:
+            self._local.conn = conn
+            self._local.depth = 0
+            try:
+                if isolation_level:
+                    self._execute(conn, f"SET TRANSACTION ISOLATION LEVEL {isolation_level.upper()}")
+                yield conn
+                with timer('db.commit'):
+                    conn.commit()
+            finally:
+                self._local.conn = None
+
+    def run_in_transaction(self, work, *args, retries=5, isolation_level=None):
+        def attempt():
+            with self.transaction(isolation_level):
+                return work(*args)
+        return self.retrying(attempt, retries)
+
+    def retrying(self, attempt, retries=5):
+        if self.in_transaction():
+            # Повторять может только внешняя транзакция, вложенная ошибка уходит к ней
+            return attempt()
+        for number in range(retries + 1):
+            try:
+                return attempt()
+            except self.driver.Error as e:
+                if number == retries or getattr(e, 'pgcode', None) not in RETRYABLE_ERRORS:
+                    raise
+                count('db.transaction_retries')
+                time.sleep(random.uniform(0, min(1.0, 0.01 * 2 ** number)))
+
+    def stream(self, query, params=None, itersize=2000):
+        # Именованный курсор открывается на сервере: в памяти клиента одновременно не больше itersize строк.
+        # Соединение занято, пока генератор не дочитан или не закрыт
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield from self._stream(conn, query, params, itersize)
+            return
+        with self.connection() as conn:
+            yield from self._stream(conn, query, params, itersize)
+            # Курсор жил в неявной транзакции только на чтение, её нужно закрыть перед возвратом в пул.
+            # При ошибке или брошенном генераторе откат делает connection()
+            conn.rollback()
+
+    def _stream(self, conn, query, params, itersize):
+        cursor = conn.cursor(name=f"client_stream_{next(self._stream_ids)}")
+        cursor.itersize = itersize
+        try:
+            started = time.perf_counter()
+            cursor.execute(query, params)
+            observe_query(query, time.perf_counter() - started)
+            yield from cursor
+        finally:
+            cursor.close()
+
+    def _execute(self, conn, query, params=None):
+        # Внутри транзакции ошибка не глотается: PostgreSQL всё равно прервал транзакцию,
+        # и решать, откатывать ли её целиком, должен вызывающий
+        started = time.perf_counter()
+        cursor = conn.cursor()
         try:
             if params:
-                self.cursor.execute(query, params)
+                cursor.execute(query, params)
             else:
-                self.cursor.execute(query)
-            self.connection.commit()
-            return self.cursor
-        except psycopg2.Error as e:
-            print(f"Ошибка выполнения запроса: {e}")
-            if self.connection:
-                self.connection.rollback()
-            return None
+                cursor.execute(query)
+            return QueryResult(cursor)
+        except self.driver.Error:
+            count('db.failed_queries')
+            raise
+        finally:
+            cursor.close()
+            observe_query(query, time.perf_counter() - started)
+
+    @contextmanager
+    def cursor(self, timeout=None):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            cursor = conn.cursor()
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+            return
+        with self.connection(timeout) as conn:
+            cursor = conn.cursor()
+            try:
+                yield cursor
+                conn.commit()
+            finally:
+                cursor.close()
+
+    def execute_query(self, query, params=None, idempotent=False):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return self._execute(conn, query, params)
+        for attempt in range(2):
+            started = time.perf_counter()
+            sent = False
+            try:
+                with self.cursor() as cursor:
+                    sent = True
+                    if params:
+                        cursor.execute(query, params)
+                    else:
+                        cursor.execute(query)
+                    result = QueryResult(cursor)
+                observe_query(query, time.perf_counter() - started)
+                return result
+            except (self.driver.OperationalError, self.driver.InterfaceError) as e:
+                # Пока запрос не отправлен (не удалось подключиться), повтор безопасен. После отправки
+                # неизвестно, успел ли сервер его выполнить и зафиксировать: повторный INSERT добавил бы
+                # строку дважды, поэтому заново выполняются только запросы, помеченные idempotent
+                if attempt == 1 or (sent and not idempotent):
+                    print(f"Ошибка выполнения запроса: {e}")
+                    break
+            except self.driver.Error as e:
+                print(f"Ошибка выполнения запроса: {e}")
+                break
+        count('db.failed_queries')
+        return None
+
+    def listen(self, channel, on_change):
+        # Для LISTEN нужно отдельное соединение вне пула: оно всё время занято ожиданием уведомлений
+        listener = ChangeListener(self._connect, channel, on_change, errors=(self.driver.Error, OSError))
+        listener.start()
+        return listener
 
     def close(self):
-        if self.connection:
-            self.cursor.close()
-            self.connection.close()
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+        self.connected = False
+
+
+CHANGE_CHANNEL = 'client_changed'
+
+# Уведомление на каждую инструкцию, а не на каждую строку: COPY на миллион записей даёт одно событие.
+# В полезной нагрузке ID изменённых или удалённых клиентов через запятую, пустая строка - сбросить весь кэш
+CHANGE_NOTIFY_SQL = f"""
+    CREATE OR REPLACE FUNCTION client_notify_change() RETURNS trigger AS $$
+    DECLARE
+        ids text;
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            SELECT string_agg(ClientID::text, ',') INTO ids FROM old_rows;
+            IF ids IS NULL THEN
+                RETURN NULL;
+            END IF;
+        END IF;
+        PERFORM pg_notify('{CHANGE_CHANNEL}', CASE WHEN length(ids) < 7900 THEN ids ELSE '' END);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+    DROP TRIGGER IF EXISTS client_update_notify ON Client;
+    CREATE TRIGGER client_update_notify AFTER UPDATE ON Client
+        REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION client_notify_change();
+    DROP TRIGGER IF EXISTS client_delete_notify ON Client;
+    CREATE TRIGGER client_delete_notify AFTER DELETE ON Client
+        REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION client_notify_change();
+    DROP TRIGGER IF EXISTS client_insert_notify ON Client;
+    CREATE TRIGGER client_insert_notify AFTER INSERT OR TRUNCATE ON Client
+        FOR EACH STATEMENT EXECUTE FUNCTION client_notify_change();
+"""
+
+CLIENT_COLUMNS = ('ClientID', 'LastName', 'FirstName', 'MiddleName', 'Address', 'Phone')
+
+SEARCH_EXPRESSION = "LastName || ' ' || FirstName || ' ' || MiddleName || ' ' || Address || ' ' || Phone"
+
+
+def escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
 
 
 class ClientDB:
@@ -66,26 +360,48 @@ class ClientDB:
                 Phone VARCHAR(20) NOT NULL
             )
         """)
+        self.db_connector.execute_query("CREATE INDEX IF NOT EXISTS client_lastname_id_idx ON Client (LastName, ClientID)")
+        self.db_connector.execute_query("CREATE INDEX IF NOT EXISTS client_phone_idx ON Client (Phone)")
+        self.db_connector.execute_query("CREATE INDEX IF NOT EXISTS client_firstname_id_idx ON Client (FirstName, ClientID)")
+        self.db_connector.execute_query("CREATE INDEX IF NOT EXISTS client_middlename_id_idx ON Client (MiddleName, ClientID)")
+        self.db_connector.execute_query("CREATE INDEX IF NOT EXISTS client_lastname_prefix_idx ON Client (lower(LastName) text_pattern_ops)")
+        if self.db_connector.execute_query("CREATE EXTENSION IF NOT EXISTS pg_trgm"):
+            self.db_connector.execute_query(f"CREATE INDEX IF NOT EXISTS client_search_trgm_idx ON Client USING gin (({SEARCH_EXPRESSION}) gin_trgm_ops)")
         if cursor:
             print("База данных PostgreSQL и таблица 'Client' успешно созданы.")
 
+    def enable_change_notifications(self):
+        return self.db_connector.execute_query(CHANGE_NOTIFY_SQL) is not None
+
+    @timed('db.get_client_by_id')
     def get_client_by_id(self, client_id):
-        cursor = self.db_connector.execute_query("SELECT * FROM Client WHERE ClientID = %s", (client_id,))
+        cursor = self.db_connector.execute_query("SELECT * FROM Client WHERE ClientID = %s", (client_id,), idempotent=True)
         if cursor:
             result = cursor.fetchone()
             return dict(zip([desc[0] for desc in cursor.description], result)) if result else None
         return None
 
-    def get_all_client(self):
-        cursor = self.db_connector.execute_query("SELECT * FROM Client")
-        if cursor:
-            results = cursor.fetchall()
-            return [dict(zip([desc[0] for desc in cursor.description], row)) for row in results]
-        return []
+    @timed('db.get_all_client')
+    def get_all_client(self, order_by=None):
+        return list(self.iter_all_client(order_by))
+
+    def iter_all_client(self, order_by=None, row_factory=None, itersize=2000):
+        # row_factory получает значения столбцов CLIENT_COLUMNS позиционно; по умолчанию - словарь,
+        # ключи которого собраны один раз, а не для каждой строки
+        query = f"SELECT {', '.join(CLIENT_COLUMNS)} FROM Client"
+        if order_by:
+            query += f" ORDER BY {SORT_COLUMNS[order_by]}, ClientID"
+        if row_factory is None:
+            keys = [column.lower() for column in CLIENT_COLUMNS]
+
+            def row_factory(*values):
+                return dict(zip(keys, values))
+        return starmap(row_factory, self.db_connector.stream(query, itersize=itersize))
 
+    @timed('db.add_client')
     def add_client(self, client_data):
         query = """INSERT INTO Client (LastName, FirstName, MiddleName, Address, Phone) 
-                    VALUES (%s, %s, %s, %s, %s) RETURNING ClientID;"""
+                    VALUES (%s, %s, %s, %s, %s) RETURNING *;"""
         cursor = self.db_connector.execute_query(query, (client_data['LastName'],
                                                          client_data['FirstName'],
                                                          client_data['MiddleName'],
@@ -93,42 +409,139 @@ class ClientDB:
                                                          client_data['Phone']))
         if cursor:
             result = cursor.fetchone()
-            return result[0] if result else None
+            return dict(zip([desc[0] for desc in cursor.description], result)) if result else None
         return None
 
+    @timed('db.add_clients')
+    def add_clients(self, records, on_error=None):
+        # on_error(номер записи в records, текст ошибки) получает каждую строку, которую не удалось вставить
+        rows = [(r['LastName'], r['FirstName'], r['MiddleName'], r['Address'], r['Phone']) for r in records]
+        if not rows:
+            return 0
+        try:
+            with self.db_connector.cursor() as cursor:
+                if hasattr(cursor, 'copy_expert'):
+                    buffer = io.StringIO()
+                    csv.writer(buffer).writerows(rows)
+                    buffer.seek(0)
+                    cursor.copy_expert("COPY Client (LastName, FirstName, MiddleName, Address, Phone) "
+                                       "FROM STDIN WITH (FORMAT csv)", buffer)
+                else:
+                    cursor.executemany("INSERT INTO Client (LastName, FirstName, MiddleName, Address, Phone) "
+                                       "VALUES (%s, %s, %s, %s, %s)", rows)
+            return len(rows)
+        except self.db_connector.driver.Error as e:
+            if self.db_connector.in_transaction():
+                raise
+            print(f"Ошибка пакетной вставки: {e}. Строки пачки вставляются по одной")
+        return self._add_rows_one_by_one(rows, on_error)
+
+    def _add_rows_one_by_one(self, rows, on_error):
+        # Одна транзакция, каждая строка - в своей точке сохранения: ошибка откатывает только её
+        errors = {}
+        try:
+            with self.db_connector.transaction():
+                for i, row in enumerate(rows):
+                    try:
+                        with self.db_connector.transaction():
+                            self.db_connector.execute_query("INSERT INTO Client (LastName, FirstName, MiddleName, Address, Phone) "
+                                                            "VALUES (%s, %s, %s, %s, %s)", row)
+                    except self.db_connector.driver.Error as e:
+                        errors[i] = str(e).strip()
+        except self.db_connector.driver.Error as e:
+            # Транзакция не зафиксирована: не сохранилась ни одна строка пачки
+            errors = {i: errors.get(i, str(e).strip()) for i in range(len(rows))}
+        for i, error in errors.items():
+            if on_error:
+                on_error(i, error)
+            else:
+                print(f"Строка {i + 1} пачки не добавлена: {error}")
+        return len(rows) - len(errors)
+
+    @timed('db.find_existing_phones')
+    def find_existing_phones(self, phones):
+        if not phones:
+            return set()
+        cursor = self.db_connector.execute_query("SELECT Phone FROM Client WHERE Phone = ANY(%s)", (list(phones),), idempotent=True)
+        if cursor:
+            return {row[0] for row in cursor.fetchall()}
+        return set()
+
+    @timed('db.update_client')
     def update_client(self, client_id, updated_client):
         query = """UPDATE Client
                     SET LastName = %s, FirstName = %s, MiddleName = %s, Address = %s, Phone = %s
-                    WHERE ClientID = %s"""
-        self.cursor.execute(query, (updated_client['LastName'],
-                                    updated_client['FirstName'],
-                                    updated_client['MiddleName'],
-                                    updated_client['Address'],
-                                    updated_client['Phone'],
-                                    client_id))
-        print("Данные клиента успешно обновлены.")
+                    WHERE ClientID = %s
+                    RETURNING *"""
+        cursor = self.db_connector.execute_query(query, (updated_client['LastName'],
+                                                         updated_client['FirstName'],
+                                                         updated_client['MiddleName'],
+                                                         updated_client['Address'],
+                                                         updated_client['Phone'],
+                                                         client_id))
+        if cursor:
+            result = cursor.fetchone()
+            return dict(zip([desc[0] for desc in cursor.description], result)) if result else None
+        return None
 
+    @timed('db.delete_client')
     def delete_client(self, client_id):
         cursor = self.db_connector.execute_query("DELETE FROM Client WHERE ClientID = %s", (client_id,))
-        return cursor is not None
+        return cursor is not None and cursor.rowcount > 0
 
+    @timed('db.get_count')
     def get_count(self):
-        cursor = self.db_connector.execute_query("SELECT COUNT(*) FROM Client")
+        cursor = self.db_connector.execute_query("SELECT COUNT(*) FROM Client", idempotent=True)
         if cursor:
             result = cursor.fetchone()
             return result[0] if result else 0
         return 0
 
+    @timed('db.get_k_n_short_list')
     def get_k_n_short_list(self, k, n):
         offset = (k - 1) * n
-        cursor = self.db_connector.execute_query("SELECT LastName, FirstName, MiddleName, Address, Phone FROM Client LIMIT %s OFFSET %s", (n, offset))
+        cursor = self.db_connector.execute_query("SELECT ClientID, LastName, FirstName, MiddleName, Address, Phone FROM Client ORDER BY ClientID LIMIT %s OFFSET %s", (n, offset), idempotent=True)
         if cursor:
             results = cursor.fetchall()
-            return [dict(zip(['LastName', 'FirstName', 'MiddleName', 'Address', 'Phone'], row)) for row in results]
+            return [dict(zip(['ClientID', 'LastName', 'FirstName', 'MiddleName', 'Address', 'Phone'], row)) for row in results]
+        return []
+
+    @timed('db.search')
+    def search(self, query, limit=50):
+        words = query.split()
+        if not words:
+            return []
+        if len(words) == 1 and len(words[0]) < 3:
+            # Триграммный индекс не помогает на одном-двух символах, ищем по префиксу фамилии
+            conditions = "lower(LastName) LIKE %s"
+            params = [escape_like(words[0].lower()) + '%']
+        else:
+            conditions = " AND ".join([f"({SEARCH_EXPRESSION}) ILIKE %s"] * len(words))
+            params = ['%' + escape_like(word) + '%' for word in words]
+        cursor = self.db_connector.execute_query(
+            f"SELECT * FROM Client WHERE {conditions} ORDER BY LastName, ClientID LIMIT %s", params + [limit], idempotent=True)
+        if cursor:
+            return [dict(zip([desc[0] for desc in cursor.description], row)) for row in cursor.fetchall()]
+        return []
+
+    @timed('db.get_page_after')
+    def get_page_after(self, n, last_key=None):
+        if last_key is None:
+            cursor = self.db_connector.execute_query(
+                "SELECT ClientID, LastName, Phone FROM Client ORDER BY LastName, ClientID LIMIT %s", (n,), idempotent=True)
+        else:
+            last_name, client_id = last_key
+            cursor = self.db_connector.execute_query(
+                "SELECT ClientID, LastName, Phone FROM Client WHERE (LastName, ClientID) > (%s, %s) "
+                "ORDER BY LastName, ClientID LIMIT %s", (last_name, client_id, n), idempotent=True)
+        if cursor:
+            return [ClientShort.from_fields(*row) for row in cursor.fetchall()]
         return []
 
 
 class Client:
+    __slots__ = ('_client_id', '_last_name', '_first_name', '_middle_name', '_address', '_phone')
+
     @staticmethod
     def validate_field(field_name, field_value, expected_type):
         if not isinstance(field_value, expected_type):
@@ -148,12 +561,39 @@ class Client:
         Client.validate_field("Телефон", phone, str)
 
         self._client_id = client_id
-        self._last_name = last_name
-        self._first_name = first_name
-        self._middle_name = middle_name
+        self._last_name = sys.intern(last_name)
+        self._first_name = sys.intern(first_name)
+        self._middle_name = sys.intern(middle_name)
         self._address = address
         self._phone = phone
 
+    def to_dict(self):
+        return {
+            '_client_id': self._client_id,
+            '_last_name': self._last_name,
+            '_first_name': self._first_name,
+            '_middle_name': self._middle_name,
+            '_address': self._address,
+            '_phone': self._phone,
+        }
+
+    @classmethod
+    def from_fields(cls, client_id, last_name, first_name, middle_name, address, phone):
+        # Без проверок: для данных, которые уже прошли их при записи (снимок)
+        client = cls.__new__(cls)
+        client._client_id = client_id
+        client._last_name = sys.intern(last_name)
+        client._first_name = sys.intern(first_name)
+        client._middle_name = sys.intern(middle_name)
+        client._address = address
+        client._phone = phone
+        return client
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['_client_id'], data['_last_name'], data['_first_name'],
+                   data['_middle_name'], data['_address'], data['_phone'])
+
     def __str__(self):
         return (f"Client(ID={self._client_id}, Фамилия='{self._last_name}', "
                 f"Имя='{self._first_name}', Отчество='{self._middle_name}', "
@@ -172,202 +612,854 @@ class Client:
 
 
 class ClientShort:
+    __slots__ = ('_client_id', '_last_name', '_phone')
+
     def __init__(self, client):
         if not isinstance(client, Client):
             raise ValueError("Параметр должен быть экземпляром класса Client.")
-        self._client = client
+        self._client_id = client._client_id
+        self._last_name = client._last_name
+        self._phone = client._phone
+
+    @classmethod
+    def from_fields(cls, client_id, last_name, phone):
+        short = cls.__new__(cls)
+        short._client_id = client_id
+        short._last_name = last_name
+        short._phone = phone
+        return short
+
+    def key(self):
+        return self._last_name, self._client_id
 
     def __str__(self):
-        return (f"ClientShort(ID={self._client._client_id}, "
-                f"Фамилия={self._client._last_name}, Телефон={self._client._phone})")
+        return (f"ClientShort(ID={self._client_id}, "
+                f"Фамилия={self._last_name}, Телефон={self._phone})")
+
+    def __repr__(self):
+        return str(self)
+
+
+SORT_FIELDS = ('client_id', 'last_name', 'first_name', 'middle_name', 'address', 'phone')
+
+SORT_COLUMNS = {
+    'client_id': 'ClientID',
+    'last_name': 'LastName',
+    'first_name': 'FirstName',
+    'middle_name': 'MiddleName',
+    'address': 'Address',
+    'phone': 'Phone',
+}
+
+
+SNAPSHOT_FIELDS = [
+    ('client_id', 'q'),
+    ('last_name', 's'),
+    ('first_name', 's'),
+    ('middle_name', 's'),
+    ('address', 's'),
+    ('phone', 's'),
+]
+
+# Записи в JSON/YAML проверяются пачками, без исключения на каждое поле
+CLIENT_RULES = {
+    '_client_id': ("ClientID", dict(type=int)),
+    **keyed_rules(CLIENT_STORED_RULES, ['_last_name', '_first_name', '_middle_name', '_address', '_phone']),
+}
+
+CLIENT_VALIDATOR = RecordValidator(CLIENT_RULES, RUSSIAN_MESSAGES)
+client_values = itemgetter(*CLIENT_RULES)
+
+
+def sort_key(value):
+    if isinstance(value, str):
+        folded = value.casefold()
+        return folded.replace('ё', 'е'), folded
+    return value
+
+
+def search_text(client):
+    return ' '.join((client._last_name, client._first_name, client._middle_name, client._address))
+
+
+def compare_text(a, b):
+    # Сравнение строк в порядке sort_key: так SQLite сортирует так же, как файловые хранилища
+    a, b = sort_key(a), sort_key(b)
+    return (a > b) - (a < b)
+
+
+def phone_search_key(phone):
+    # Цифры номера в обратном порядке: поиск по окончанию номера становится поиском по префиксу
+    return phone_digits(phone)[::-1]
+
+
+def fts_query(query, suffix_length=4):
+    # Те же правила, что у ClientSearchIndex: слово ищется по префиксу, число от suffix_length цифр -
+    # по окончанию телефона
+    terms = []
+    for word in WORD_RE.findall(normalize(query)):
+        if word.isdigit() and len(word) >= suffix_length:
+            terms.append(f'Phone : "{word[::-1]}"*')
+        else:
+            terms.append(f'Text : "{word}"*')
+    return ' AND '.join(terms)
 
 
 class Client_rep:
-    def __init__(self, filepath):
+    def __init__(self, filepath, progress_callback=None, snapshot=False):
         self.filepath = filepath
+        self.progress_callback = progress_callback
+        self.snapshot_path = filepath + ".snap"
+        self.use_snapshot = snapshot
         self.clients = []
         self.next_id = 1
-        if os.path.exists(self.filepath):
-            self.load_data()
+        self._id_index = {}
+        self._phone_index = {}
+        self._shared_phones = set()
+        self._page_keys = []
+        self._sort_cache = {}
+        self._search_index = None
+        with timer('repository.load'), paused_gc():
+            if os.path.exists(self.filepath) and not self.load_snapshot():
+                self.load_data()
+            self.rebuild_index()
+        count('repository.loaded_clients', len(self.clients))
+
+    def rebuild_index(self):
+        self._id_index = {c._client_id: c for c in self.clients}
+        self._phone_index = {}
+        # Новые дубликаты телефонов не принимаются, но в файлах, записанных раньше, они могут быть
+        self._shared_phones = set()
+        for c in self.clients:
+            if c._phone in self._phone_index:
+                self._shared_phones.add(c._phone)
+            else:
+                self._phone_index[c._phone] = c
+        self._page_keys = sorted((c._last_name, c._client_id) for c in self.clients)
+        self._sort_cache = {}
+        self._search_index = None
+
+    def load_records(self, f, records, batch_size=10000):
+        total = os.fstat(f.fileno()).st_size
+        for batch in iter(lambda: list(islice(records, batch_size)), []):
+            invalid = CLIENT_VALIDATOR.validate_batch(batch, len(self.clients) + 1)
+            if invalid:
+                raise CorruptFileError(f"{self.filepath}: некорректные записи\n{describe_errors(invalid)}")
+            self.clients.extend(Client.from_fields(*client_values(item)) for item in batch)
+            if self.progress_callback:
+                self.progress_callback(f.tell(), total)
+        self.next_id = max(c._client_id for c in self.clients) + 1 if self.clients else 1
+        if self.progress_callback:
+            self.progress_callback(total, total)
+
+    def load_snapshot(self):
+        snapshot = open_snapshot(self.snapshot_path, read_checksum(self.filepath))
+        if snapshot is None:
+            return False
+        self.use_snapshot = True
+        with snapshot:
+            self.clients = list(map(Client.from_fields, *snapshot.columns()))
+        self.next_id = max(c._client_id for c in self.clients) + 1 if self.clients else 1
+        if self.progress_callback:
+            self.progress_callback(len(self.clients), len(self.clients))
+        return True
+
+    def write_snapshot(self, checksum):
+        if self.use_snapshot:
+            columns = [list(map(attrgetter(f"_{field}"), self.clients)) for field, _ in SNAPSHOT_FIELDS]
+            save_snapshot(self.snapshot_path, SNAPSHOT_FIELDS, columns, checksum)
+
+    def cache_stats(self):
+        return None
+
+    def close(self):
+        pass
+
+    def enable_snapshot(self):
+        self.use_snapshot = True
+        self.save_data()
 
+    @timed('repository.get_client_by_id')
     def get_client_by_id(self, client_id):
-        for client in self.clients:
-            if client._client_id == client_id:
-                return client
-        return None
+        return self._id_index.get(client_id)
+
+    def get_client_by_phone(self, phone):
+        return self._phone_index.get(phone)
 
+    def is_phone_unique(self, phone):
+        return phone not in self._phone_index
+
+    def find_existing_phones(self, phones):
+        return {phone for phone in phones if phone in self._phone_index}
+
+    def iter_clients(self):
+        return iter(self.clients)
+
+    @timed('repository.get_k_n_short_list')
     def get_k_n_short_list(self, k, n):
         return [str(ClientShort(c)) for c in self.clients[(k - 1) * n:(k - 1) * n + n]]
 
+    @timed('repository.get_page_after')
+    def get_page_after(self, n, last_key=None):
+        start = 0 if last_key is None else bisect.bisect_right(self._page_keys, tuple(last_key))
+        return [ClientShort(self._id_index[client_id]) for _, client_id in self._page_keys[start:start + n]]
+
+    @timed('repository.sort_by_field')
     def sort_by_field(self, field):
-        try:
-            self.clients.sort(key=lambda x: getattr(x, f"_{field}"))
-        except AttributeError:
+        if field not in SORT_FIELDS:
             print(f"Поле '{field}' не найдено.")
+            return
+        entries = self._sort_cache.get(field)
+        if entries is None:
+            entries = self._sort_cache[field] = sorted(self._sort_entry(c, field) for c in self.clients)
+        self.clients = [self._id_index[client_id] for _, client_id in entries]
+
+    @timed('repository.search')
+    def search(self, query, limit=50):
+        if self._search_index is None:
+            self._search_index = ClientSearchIndex(self._describe_client)
+            for client in self.clients:
+                self._index_client(client)
+        return [self._id_index[client_id] for client_id in self._search_index.search(query, limit)]
+
+    def _describe_client(self, client_id):
+        client = self._id_index[client_id]
+        return search_text(client), client._phone
+
+    def _index_client(self, client):
+        if self._search_index is not None:
+            self._search_index.add(client._client_id, search_text(client), client._phone)
+
+    def _unindex_client(self, client):
+        if self._search_index is not None:
+            self._search_index.remove(client._client_id, search_text(client), client._phone)
 
+    @staticmethod
+    def _sort_entry(client, field):
+        return sort_key(getattr(client, f"_{field}")), client._client_id
+
+    def _add_sort_entries(self, client):
+        for field, entries in self._sort_cache.items():
+            bisect.insort(entries, self._sort_entry(client, field))
+
+    def _remove_sort_entries(self, client):
+        for field, entries in self._sort_cache.items():
+            entry = self._sort_entry(client, field)
+            i = bisect.bisect_left(entries, entry)
+            if i < len(entries) and entries[i] == entry:
+                del entries[i]
+
+    @timed('repository.add_client')
     def add_client(self, last_name, first_name, middle_name, address, phone):
         new_client = Client(self.next_id, last_name, first_name, middle_name, address, phone)
+        if not self.is_phone_unique(phone):
+            return None
         self.clients.append(new_client)
+        self._id_index[new_client._client_id] = new_client
+        self._phone_index[new_client._phone] = new_client
+        bisect.insort(self._page_keys, (last_name, new_client._client_id))
+        self._add_sort_entries(new_client)
+        self._index_client(new_client)
         self.next_id += 1
         self.save_data()
         return new_client
 
+    @timed('repository.add_clients')
+    def add_clients(self, records, save=True, on_error=None):
+        added = 0
+        for i, r in enumerate(records):
+            try:
+                new_client = Client(self.next_id, r['LastName'], r['FirstName'], r['MiddleName'], r['Address'], r['Phone'])
+            except ValueError as e:
+                if on_error is None:
+                    raise
+                on_error(i, str(e))
+                continue
+            self.clients.append(new_client)
+            self._id_index[new_client._client_id] = new_client
+            self._phone_index[new_client._phone] = new_client
+            self._page_keys.append((new_client._last_name, new_client._client_id))
+            self._index_client(new_client)
+            self.next_id += 1
+            added += 1
+        self._page_keys.sort()
+        self._sort_cache.clear()
+        if save:
+            self.save_data()
+        return added
+
+    @timed('repository.update_client')
     def update_client(self, client_id, last_name, first_name, middle_name, address, phone):
         client = self.get_client_by_id(client_id)
         if client:
+            if phone != client._phone and not self.is_phone_unique(phone):
+                return False
+            self._release_phone(client)
+            self._remove_page_key(client)
+            self._remove_sort_entries(client)
+            self._unindex_client(client)
+            bisect.insort(self._page_keys, (last_name, client_id))
             client._last_name = last_name
             client._first_name = first_name
             client._middle_name = middle_name
             client._address = address
             client._phone = phone
-            self.save_to_yaml()
+            self._phone_index[phone] = client
+            self._add_sort_entries(client)
+            self._index_client(client)
+            self.save_data()
             return True
         return False
 
+    @timed('repository.delete_client')
     def delete_client(self, client_id):
-        self.clients = [c for c in self.clients if c._client_id != client_id]
+        client = self._id_index.pop(client_id, None)
+        if client is None:
+            return False
+        self.clients.remove(client)
+        self._release_phone(client)
+        self._remove_page_key(client)
+        self._remove_sort_entries(client)
+        self._unindex_client(client)
         self.save_data()
+        return True
+
+    def _release_phone(self, client):
+        if self._phone_index.get(client._phone) is not client:
+            return
+        del self._phone_index[client._phone]
+        if client._phone in self._shared_phones:
+            # Номер остаётся занят, пока он есть хотя бы у одного клиента
+            other = next((c for c in self.clients if c is not client and c._phone == client._phone), None)
+            if other is None:
+                self._shared_phones.discard(client._phone)
+            else:
+                self._phone_index[client._phone] = other
+
+    def _remove_page_key(self, client):
+        key = (client._last_name, client._client_id)
+        i = bisect.bisect_left(self._page_keys, key)
+        if i < len(self._page_keys) and self._page_keys[i] == key:
+            del self._page_keys[i]
 
     def get_count(self):
         return len(self.clients)
 
 
 class Client_rep_yaml(Client_rep):
-    def __init__(self, filepath="clients.yaml"):
-        super().__init__(filepath)
+    def __init__(self, filepath="clients.yaml", progress_callback=None, snapshot=False):
+        super().__init__(filepath, progress_callback, snapshot)
 
     def load_data(self):
         try:
-            with open(self.filepath, "r", encoding="utf-8") as f:
-                data = yaml.safe_load(f)
-                if data:
-                    for client_data in data:
-                        self.clients.append(Client(*client_data.values()))
-                    self.next_id = max(c._client_id for c in self.clients) + 1 if self.clients else 1
-        except (FileNotFoundError, yaml.YAMLError) as e:
+            with open_checked(self.filepath) as f:
+                self.load_records(f, iter_yaml_list(f))
+        except FileNotFoundError as e:
             print(f"Ошибка при загрузке из YAML: {e}")
+        except yaml.YAMLError as e:
+            raise CorruptFileError(f"Ошибка при загрузке из YAML: {e}") from e
 
+    @timed('repository.save_data')
     def save_data(self):
         try:
-            data = [vars(c) for c in self.clients]
-            with open(self.filepath, "w", encoding="utf-8") as f:
-                yaml.dump(data, f, allow_unicode=True, default_flow_style=False, sort_keys=False)
-        except (FileNotFoundError, yaml.YAMLError) as e:
+            data = [c.to_dict() for c in self.clients]
+            checksum = atomic_write(self.filepath, lambda f: yaml.dump(data, f, allow_unicode=True, default_flow_style=False, sort_keys=False))
+            self.write_snapshot(checksum)
+        except (OSError, yaml.YAMLError) as e:
             print(f"Ошибка при сохранении в YAML: {e}")
 
 
 class Client_rep_json(Client_rep):
-    def __init__(self, filepath="clients.json"):
-        super().__init__(filepath)
+    def __init__(self, filepath="clients.json", progress_callback=None, snapshot=False):
+        super().__init__(filepath, progress_callback, snapshot)
 
     def load_data(self):
         try:
-            with open(self.filepath, "r") as f:
-                data = json.load(f)
-                for item in data:
-                    self.clients.append(Client(*item.values()))
-                self.next_id = max(c._client_id for c in self.clients) + 1 if self.clients else 1
-        except (FileNotFoundError, json.JSONDecodeError) as e:
+            with open_checked(self.filepath) as f:
+                if self.filepath.endswith(".jsonl"):
+                    self.load_records(f, iter_json_lines(f))
+                else:
+                    self.load_records(f, iter_json_array(f))
+        except FileNotFoundError as e:
             print(f"Ошибка при загрузке из JSON: {e}")
+        except json.JSONDecodeError as e:
+            raise CorruptFileError(f"Ошибка при загрузке из JSON: {e}") from e
 
+    @timed('repository.save_data')
     def save_data(self):
         try:
-            data = [vars(c) for c in self.clients]
-            with open(self.filepath, "w") as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
+            self.write_snapshot(atomic_write(self.filepath, self.write_clients))
+        except OSError as e:
             print(f"Ошибка при сохранении в JSON: {e}")
 
+    def write_clients(self, f):
+        if self.filepath.endswith(".jsonl"):
+            for c in self.clients:
+                f.write(json.dumps(c.to_dict(), ensure_ascii=False) + "\n")
+        else:
+            json.dump([c.to_dict() for c in self.clients], f, ensure_ascii=False, indent=4)
+
 class ClientRepDBAdapter(Client_rep):
-    def __init__(self, db_connector):
+    def __init__(self, db_connector, cache_size=1024, page_cache_size=64, cache_ttl=60.0, listen=False):
         self.db_rep = ClientDB(db_connector)
-        self.clients = self.db_rep.get_all_client()
-        self.next_id = self.db_rep.get_count() + 1 if self.db_rep.get_count() > 0 else 1
+        self._clients = None
+        self._order_by = None
+        self._client_cache = LRUCache(cache_size, cache_ttl, 'cache.client')
+        self._page_cache = LRUCache(page_cache_size, cache_ttl, 'cache.page')
+        self._listener = None
+        if listen:
+            if self.db_rep.enable_change_notifications():
+                self._listener = db_connector.listen(CHANGE_CHANNEL, self._on_change)
+            else:
+                print("Не удалось включить уведомления об изменениях, кэш сбрасывается только по TTL")
+
+    def _on_change(self, payload):
+        # Изменения из других процессов: None или пустая строка - сбросить всё
+        if payload:
+            for client_id in payload.split(','):
+                self._client_cache.invalidate(int(client_id))
+        else:
+            self._client_cache.clear()
+        self._page_cache.clear()
+        self._clients = None
+
+    @contextmanager
+    def transaction(self, isolation_level=None):
+        # Несколько операций одним COMMIT. Кэш и список клиентов обновляются по ходу операций,
+        # поэтому после отката они сбрасываются целиком
+        try:
+            with self.db_rep.db_connector.transaction(isolation_level):
+                yield self
+        except BaseException:
+            self._on_change(None)
+            raise
+        # Пока транзакция шла, другой поток мог положить в кэш старую версию строки
+        self._client_cache.clear()
+        self._page_cache.clear()
+
+    def run_in_transaction(self, work, *args, retries=5, isolation_level=None):
+        def attempt():
+            with self.transaction(isolation_level):
+                return work(*args)
+        return self.db_rep.db_connector.retrying(attempt, retries)
+
+    def _cached(self, cache, key, load):
+        # Незафиксированные строки своей транзакции в общий кэш не кладём
+        if self.db_rep.db_connector.in_transaction():
+            return load()
+        return cache.get_or_load(key, load)
+
+    def cache_stats(self):
+        return {'clients': self._client_cache.stats(), 'pages': self._page_cache.stats(),
+                'listening': self._listener is not None}
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+
+    @staticmethod
+    def row_to_client(row):
+        return Client(row['clientid'], row['lastname'], row['firstname'], row['middlename'], row['address'], row['phone'])
+
+    @property
+    def clients(self):
+        clients = self._clients
+        if clients is None:
+            clients = self._clients = {c._client_id: c for c in self.get_all_clients(self._order_by)}
+        return list(clients.values())
 
+    @clients.setter
+    def clients(self, clients):
+        self._clients = {c._client_id: c for c in clients}
+
+    @timed('repository.add_client')
     def add_client(self, last_name, first_name, middle_name, address, phone):
-        client_data = {'Фамилия': last_name, 'Имя': first_name, 'Отчество': middle_name, 'Адрес': address, 'Телофен': phone}
-        new_id = self.db_rep.add_client(client_data)
-        if new_id:
-            self.clients = self.db_rep.get_all_client()
-            self.next_id += 1
-            return True
-        return False
+        client_data = {'LastName': last_name, 'FirstName': first_name, 'MiddleName': middle_name, 'Address': address, 'Phone': phone}
+        row = self.db_rep.add_client(client_data)
+        if row:
+            client = self.row_to_client(row)
+            if self._clients is not None:
+                self._clients[client._client_id] = client
+            self._client_cache.invalidate(client._client_id)
+            self._page_cache.clear()
+            return client
+        return None
 
+    @timed('repository.add_clients')
+    def add_clients(self, records, save=True, on_error=None):
+        count = self.db_rep.add_clients(records, on_error)
+        if count:
+            self._clients = None
+            self._client_cache.clear()
+            self._page_cache.clear()
+        return count
+
+    def find_existing_phones(self, phones):
+        return self.db_rep.find_existing_phones(phones)
+
+    @timed('repository.update_clients')
+    def update_clients(self, updates):
+        # updates: {client_id: (фамилия, имя, отчество, адрес, телефон)}, всё одной транзакцией
+        return self.run_in_transaction(
+            lambda: sum(self.update_client(client_id, *fields) for client_id, fields in updates.items()))
+
+    def iter_clients(self):
+        return self.db_rep.iter_all_client(self._order_by, Client.from_fields)
+
+    @timed('repository.delete_client')
     def delete_client(self, client_id):
         result = self.db_rep.delete_client(client_id)
-        self.clients = self.db_rep.get_all_client()
+        if result:
+            if self._clients is not None:
+                self._clients.pop(client_id, None)
+            self._client_cache.invalidate(client_id)
+            self._page_cache.clear()
         return result
 
+    @timed('repository.get_client_by_id')
     def get_client_by_id(self, client_id):
+        # Отсутствующий ID тоже кэшируется, чтобы повторный поиск не шёл в базу
+        return self._cached(self._client_cache, client_id, lambda: self._load_client(client_id))
+
+    def _load_client(self, client_id):
         client_data = self.db_rep.get_client_by_id(client_id)
         if client_data:
-            return Client(client_data['client_id'], client_data['last_name'], client_data['first_name'], client_data['middle_name'], client_data['address'], client_data['phone'])
+            return self.row_to_client(client_data)
         return None
 
-    def get_all_clients(self):
-        return [Client(c['client_id'], c['last_name'], c['first_name'], c['middle_name'], c['address'], c['phone']) for c in self.db_rep.get_all_client()]
+    def get_all_clients(self, order_by=None):
+        return list(self.db_rep.iter_all_client(order_by, Client.from_fields))
 
+    @timed('repository.get_k_n_short_list')
     def get_k_n_short_list(self, k, n):
+        return list(self._cached(self._page_cache, ('k_n', k, n), lambda: self._load_k_n_short_list(k, n)))
+
+    def _load_k_n_short_list(self, k, n):
         short_list_data = self.db_rep.get_k_n_short_list(k, n)
-        return [ClientShort(Client(0, c['last_name'], c['first_name'], c['middle_name'], c['address'], c['phone'])) for b in short_list_data]
+        return [ClientShort.from_fields(c['ClientID'], c['LastName'], c['Phone']) for c in short_list_data]
 
+    @timed('repository.get_page_after')
+    def get_page_after(self, n, last_key=None):
+        return list(self._cached(self._page_cache, ('after', n, last_key), lambda: self.db_rep.get_page_after(n, last_key)))
+
+    @timed('repository.search')
+    def search(self, query, limit=50):
+        return [self.row_to_client(row) for row in self.db_rep.search(query, limit)]
+
+    @timed('repository.sort_by_field')
     def sort_by_field(self, field):
-        clients = self.get_all_clients()
-        try:
-            clients.sort(key=lambda x: getattr(x, f"_{field}"))
-            self.clients = clients
-        except AttributeError:
+        if field not in SORT_COLUMNS:
             print(f"Поле '{field}' не найдено.")
+            return
+        self._order_by = field
+        self._clients = None
 
+    @timed('repository.update_client')
     def update_client(self, client_id, last_name, first_name, middle_name, address, phone):
-        client = self.get_client_by_id(client_id)
-        if client:
-            client._last_name = last_name
-            client._first_name = first_name
-            client._middle_name = middle_name
-            client._address = address
-            client._phone = phone
-            self.db_rep.update_client(client_id, {'Фамилия': last_name, 'Имя': first_name, 'Отчество': middle_name, 'Адрес': address, 'Телофен': phone})
-            self.clients = self.db_rep.get_all_client()
+        row = self.db_rep.update_client(client_id, {'LastName': last_name, 'FirstName': first_name, 'MiddleName': middle_name, 'Address': address, 'Phone': phone})
+        if row:
+            if self._clients is not None and client_id in self._clients:
+                self._clients[client_id] = self.row_to_client(row)
+            self._client_cache.invalidate(client_id)
+            self._page_cache.clear()
             return True
         return False
 
     def get_count(self):
         return self.db_rep.get_count()
 
+    def enable_snapshot(self):
+        raise ValueError("Снимок поддерживается только для файловых хранилищ")
+
     def save_data(self):
         pass
 
 
-def main():
+class Client_rep_sqlite:
+    # Тот же интерфейс, что у Client_rep, но данные, индексы и сортировку держит база, а не список в памяти
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS Client (
+            ClientID INTEGER PRIMARY KEY,
+            LastName TEXT NOT NULL,
+            FirstName TEXT NOT NULL,
+            MiddleName TEXT NOT NULL,
+            Address TEXT NOT NULL,
+            Phone TEXT NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS client_phone_idx ON Client (Phone)",
+        "CREATE INDEX IF NOT EXISTS client_lastname_id_idx ON Client (LastName, ClientID)",
+        # Полнотекстовый индекс поиска, rowid = ClientID. Текст уже приведён normalize, поэтому
+        # токенизатору остаётся только разбить его на слова
+        "CREATE VIRTUAL TABLE IF NOT EXISTS ClientSearch USING fts5(Text, Phone, tokenize='unicode61 remove_diacritics 0')",
+    ]
+    COLUMNS = ', '.join(CLIENT_COLUMNS)
+    SEARCH_INSERT = ("INSERT INTO ClientSearch (rowid, Text, Phone) "
+                     "SELECT ClientID, normalize(LastName || ' ' || FirstName || ' ' || MiddleName || ' ' || Address), "
+                     "phone_search_key(Phone) FROM Client")
+
+    def __init__(self, filepath="clients.db", progress_callback=None, snapshot=False):
+        self.filepath = filepath
+        self._clients = None
+        self._order_by = None
+        # Запросы - неизменяемые строки с параметрами: sqlite3 держит их скомпилированными в кэше соединения
+        self.connection = sqlite3.connect(filepath, check_same_thread=False, cached_statements=256)
+        # Встроенные lower и LIKE в SQLite меняют регистр только у латиницы: текст для индекса поиска
+        # и порядок сортировки задают те же функции, что и в файловых хранилищах
+        self.connection.create_function('normalize', 1, normalize, deterministic=True)
+        self.connection.create_function('phone_search_key', 1, phone_search_key, deterministic=True)
+        self.connection.create_collation('client_order', compare_text)
+        # WAL: чтение не блокирует запись, а коммит - одна дописанная страница без перезаписи базы.
+        # synchronous=NORMAL в WAL не теряет согласованность, fsync делается на контрольных точках
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            for statement in self.SCHEMA:
+                self.connection.execute(statement)
+            # База из версии без индекса поиска или изменённая в обход репозитория
+            if self._query("SELECT COUNT(*) FROM ClientSearch").fetchone() != self._query("SELECT COUNT(*) FROM Client").fetchone():
+                self._reindex_all()
+
+    def _reindex_all(self):
+        self._query("DELETE FROM ClientSearch")
+        self._query(self.SEARCH_INSERT)
+
+    def _reindex(self, client_id):
+        self._query("DELETE FROM ClientSearch WHERE rowid = ?", (client_id,))
+        self._query(self.SEARCH_INSERT + " WHERE ClientID = ?", (client_id,))
+
+    @property
+    def clients(self):
+        clients = self._clients
+        if clients is None:
+            clients = self._clients = self.get_all_clients(self._order_by)
+        return clients
+
+    @clients.setter
+    def clients(self, clients):
+        self._clients = list(clients)
+
+    def _query(self, query, params=()):
+        started = time.perf_counter()
+        try:
+            return self.connection.execute(query, params)
+        finally:
+            observe_query(query, time.perf_counter() - started)
+
+    def get_all_clients(self, order_by=None):
+        query = f"SELECT {self.COLUMNS} FROM Client"
+        if order_by:
+            query += f" ORDER BY {SORT_COLUMNS[order_by]} COLLATE client_order, ClientID"
+        return [Client.from_fields(*row) for row in self._query(query)]
+
+    def iter_clients(self):
+        # Курсор sqlite3 читает строки по мере обхода, весь результат в памяти не собирается
+        order = f"{SORT_COLUMNS[self._order_by]} COLLATE client_order, ClientID" if self._order_by else "ClientID"
+        return starmap(Client.from_fields, self._query(f"SELECT {self.COLUMNS} FROM Client ORDER BY {order}"))
+
+    @timed('repository.get_client_by_id')
+    def get_client_by_id(self, client_id):
+        row = self._query(f"SELECT {self.COLUMNS} FROM Client WHERE ClientID = ?", (client_id,)).fetchone()
+        return Client.from_fields(*row) if row else None
+
+    def get_client_by_phone(self, phone):
+        row = self._query(f"SELECT {self.COLUMNS} FROM Client WHERE Phone = ? LIMIT 1", (phone,)).fetchone()
+        return Client.from_fields(*row) if row else None
+
+    def is_phone_unique(self, phone):
+        return self._query("SELECT 1 FROM Client WHERE Phone = ? LIMIT 1", (phone,)).fetchone() is None
+
+    def find_existing_phones(self, phones):
+        phones = list(phones)
+        existing = set()
+        # Не больше 500 параметров в запросе: у старых сборок SQLite предел 999
+        for start in range(0, len(phones), 500):
+            chunk = phones[start:start + 500]
+            query = f"SELECT Phone FROM Client WHERE Phone IN ({', '.join('?' * len(chunk))})"
+            existing.update(row[0] for row in self._query(query, chunk))
+        return existing
+
+    @timed('repository.get_k_n_short_list')
+    def get_k_n_short_list(self, k, n):
+        rows = self._query("SELECT ClientID, LastName, Phone FROM Client ORDER BY ClientID LIMIT ? OFFSET ?", (n, (k - 1) * n))
+        return [ClientShort.from_fields(*row) for row in rows]
+
+    @timed('repository.get_page_after')
+    def get_page_after(self, n, last_key=None):
+        if last_key is None:
+            rows = self._query("SELECT ClientID, LastName, Phone FROM Client ORDER BY LastName, ClientID LIMIT ?", (n,))
+        else:
+            rows = self._query("SELECT ClientID, LastName, Phone FROM Client WHERE (LastName, ClientID) > (?, ?) "
+                               "ORDER BY LastName, ClientID LIMIT ?", (*last_key, n))
+        return [ClientShort.from_fields(*row) for row in rows]
+
+    @timed('repository.sort_by_field')
+    def sort_by_field(self, field):
+        if field not in SORT_COLUMNS:
+            print(f"Поле '{field}' не найдено.")
+            return
+        self._order_by = field
+        self._clients = None
+
+    @timed('repository.search')
+    def search(self, query, limit=50):
+        match = fts_query(query)
+        if not match:
+            return []
+        # Порядок по ClientID, как у ClientSearchIndex в файловых хранилищах
+        rows = self._query(f"SELECT {self.COLUMNS} FROM Client WHERE ClientID IN "
+                           "(SELECT rowid FROM ClientSearch WHERE ClientSearch MATCH ?) ORDER BY ClientID LIMIT ?",
+                           (match, limit))
+        return [Client.from_fields(*row) for row in rows]
+
+    @timed('repository.add_client')
+    def add_client(self, last_name, first_name, middle_name, address, phone):
+        with self.connection:
+            if not self.is_phone_unique(phone):
+                return None
+            cursor = self._query("INSERT INTO Client (LastName, FirstName, MiddleName, Address, Phone) VALUES (?, ?, ?, ?, ?)",
+                                 (last_name, first_name, middle_name, address, phone))
+            self._reindex(cursor.lastrowid)
+        client = Client(cursor.lastrowid, last_name, first_name, middle_name, address, phone)
+        if self._clients is not None:
+            self._clients.append(client)
+        return client
+
+    @timed('repository.add_clients')
+    def add_clients(self, records, save=True, on_error=None):
+        rows = [(r['LastName'], r['FirstName'], r['MiddleName'], r['Address'], r['Phone']) for r in records]
+        insert = "INSERT INTO Client (LastName, FirstName, MiddleName, Address, Phone) VALUES (?, ?, ?, ?, ?)"
+        self._clients = None
+        try:
+            with self.connection:
+                last_id = self._query("SELECT COALESCE(MAX(ClientID), 0) FROM Client").fetchone()[0]
+                self.connection.executemany(insert, rows)
+                self._query(self.SEARCH_INSERT + " WHERE ClientID > ?", (last_id,))
+            return len(rows)
+        except sqlite3.Error:
+            if on_error is None:
+                raise
+        # Пачка откатилась целиком: строки вставляются по одной, каждая ошибка уходит в on_error
+        added = 0
+        for i, row in enumerate(rows):
+            try:
+                with self.connection:
+                    self._reindex(self.connection.execute(insert, row).lastrowid)
+                added += 1
+            except sqlite3.Error as e:
+                on_error(i, str(e))
+        return added
+
+    def copy_clients(self, clients):
+        # ID переносятся как есть, чтобы ссылки на клиентов остались верными
+        with self.connection:
+            self.connection.executemany(f"INSERT INTO Client ({self.COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)",
+                                        ((c._client_id, c._last_name, c._first_name, c._middle_name, c._address, c._phone)
+                                         for c in clients))
+            self._reindex_all()
+        self._clients = None
+
+    @timed('repository.update_client')
+    def update_client(self, client_id, last_name, first_name, middle_name, address, phone):
+        with self.connection:
+            if self._query("SELECT 1 FROM Client WHERE Phone = ? AND ClientID <> ? LIMIT 1", (phone, client_id)).fetchone():
+                return False
+            cursor = self._query("UPDATE Client SET LastName = ?, FirstName = ?, MiddleName = ?, Address = ?, Phone = ? "
+                                 "WHERE ClientID = ?", (last_name, first_name, middle_name, address, phone, client_id))
+            if cursor.rowcount:
+                self._reindex(client_id)
+        if cursor.rowcount:
+            self._clients = None
+            return True
+        return False
+
+    @timed('repository.delete_client')
+    def delete_client(self, client_id):
+        with self.connection:
+            cursor = self._query("DELETE FROM Client WHERE ClientID = ?", (client_id,))
+            self._query("DELETE FROM ClientSearch WHERE rowid = ?", (client_id,))
+        if cursor.rowcount:
+            self._clients = None
+            return True
+        return False
+
+    def get_count(self):
+        return self._query("SELECT COUNT(*) FROM Client").fetchone()[0]
+
+    def cache_stats(self):
+        return None
+
+    def enable_snapshot(self):
+        raise ValueError("Снимок поддерживается только для файловых хранилищ")
+
+    def save_data(self):
+        pass
+
+    def close(self):
+        self.connection.close()
+
+
+def migrate_to_sqlite(target, source_path):
+    if target.get_count():
+        raise ValueError(f"База {target.filepath} уже содержит клиентов")
+    source_class = Client_rep_yaml if source_path.endswith(('.yaml', '.yml')) else Client_rep_json
+    if not os.path.exists(source_path):
+        raise ValueError(f"Файл {source_path} не найден")
+    source = source_class(source_path)
+    target.copy_clients(source.clients)
+    return len(source.clients)
+
+
+DB_SETTINGS = dict(host='localhost', user='postgres', password='dimal', database='LiksDB')
+
+
+def open_client_rep(storage_type):
+    if storage_type == "db":
+        db_connector = DatabaseConnector.get_instance(**DB_SETTINGS)
+        if not db_connector.connected:
+            print("Ошибка подключения к базе данных.")
+            return None, None
+        client_rep = ClientRepDBAdapter(db_connector, listen=os.environ.get('CLIENT_CACHE_LISTEN') == '1')
+        client_rep.db_rep.initialize_db()
+        return client_rep, db_connector
+    elif storage_type == "json":
+        return Client_rep_json(), None
+    elif storage_type == "yaml":
+        return Client_rep_yaml(), None
+    elif storage_type == "sqlite":
+        return Client_rep_sqlite(), None
+    else:
+        raise ValueError("Неподдерживаемый тип хранилища данных")
+
+
+def main(storage_type="json", command=None, *args):
+    start_profiling()
     try:
-        if storage_type == "db":
-            host = 'localhost'
-            user = 'postgres'
-            password = 'dimal'
-            database = 'LiksDB'
-
-            db_connector = DatabaseConnector.get_instance(host, user, password, database)
-            if db_connector.connection is None:
-                print("Ошибка подключения к базе данных.")
-                return
-            client_rep = ClientRepDBAdapter(db_connector)
-            client_rep.db_rep.initialize_db()
-        elif storage_type == "json":
-            client_rep = Client_rep_json()
-        elif storage_type == "yaml":
-            client_rep = Client_rep_yaml()
+        client_rep, db_connector = open_client_rep(storage_type)
+        if client_rep is None:
+            return
+        if command == "import":
+            imported, rejected = import_clients(client_rep, *args)
+            print(f"Импортировано клиентов: {imported}, отклонено: {rejected}")
+        elif command == "export":
+            print(f"Экспортировано клиентов: {export_clients(client_rep, *args)}")
+        elif command == "snapshot":
+            client_rep.enable_snapshot()
+            print(f"Снимок сохранён: {client_rep.snapshot_path}")
+        elif command == "migrate":
+            if not isinstance(client_rep, Client_rep_sqlite):
+                raise ValueError("Перенос возможен только в хранилище sqlite")
+            print(f"Перенесено клиентов: {migrate_to_sqlite(client_rep, *args)}")
         else:
-            raise ValueError("Неподдерживаемый тип хранилища данных")
-        run_operations(client_rep)
-        if storage_type == "db" and db_connector:
+            run_operations(client_rep)
+        client_rep.close()
+        if db_connector:
             db_connector.close()
     except ValueError as e:
         print(f"Ошибка: {e}")
 
 
 def run_operations(client_rep):
-    clients = client_rep.get_all_client()
     while True:
         print("\nМеню:")
         print("1. Вывести всех клиентов")
@@ -377,14 +1469,19 @@ def run_operations(client_rep):
         print("5. Найти клиента по ID")
         print("6. Получить k-n короткий список")
         print("7. Отсортировать клиентов")
-        print("8. Выход")
+        print("8. Постраничный просмотр по фамилии")
+        print("9. Импорт клиентов из файла (CSV/JSON Lines)")
+        print("10. Экспорт клиентов в файл (CSV/JSON Lines)")
+        print("11. Поиск клиентов")
+        print("12. Статистика кэша")
+        print("0. Выход")
 
         choice = input("Выберите действие: ")
 
         try:
             if choice == "1":
                 print("\nВсе клиенты:")
-                for client in client_rep.clients:
+                for client in client_rep.iter_clients():
                     print(client)
 
             elif choice == "2":
@@ -393,8 +1490,10 @@ def run_operations(client_rep):
                 middle_name = input("Введите отчество: ")
                 address = input("Введите адрес: ")
                 phone = input("Введите телефон: ")
-                client_rep.add_client(last_name, first_name, middle_name, address, phone)
-                print("Клиент добавлен")
+                if client_rep.add_client(last_name, first_name, middle_name, address, phone):
+                    print("Клиент добавлен")
+                else:
+                    print("Клиент не добавлен: телефон уже занят или база недоступна")
 
             elif choice == "3":
                 client_id = int(input("Введите ID клиента для удаления: "))
@@ -405,13 +1504,15 @@ def run_operations(client_rep):
                 client_id = int(input("Введите ID клиента для изменения: "))
                 client = client_rep.get_client_by_id(client_id)
                 if client:
-                    client._last_name = input(f"Новая фамилия ({client._last_name}): ") or client._last_name
-                    client._first_name = input(f"Новое имя ({client._first_name}): ") or client._first_name
-                    client._middle_name = input(f"Новое отчество ({client._middle_name}): ") or client._middle_name
-                    client._address = input(f"Новый адресс ({client._address}): ") or client._address
-                    client._phone = input(f"Новый телефон ({client._phone}): ") or client._phone
-                    client_rep.save_to_yaml()
-                    print("Данные клиента изменены")
+                    last_name = input(f"Новая фамилия ({client._last_name}): ") or client._last_name
+                    first_name = input(f"Новое имя ({client._first_name}): ") or client._first_name
+                    middle_name = input(f"Новое отчество ({client._middle_name}): ") or client._middle_name
+                    address = input(f"Новый адресс ({client._address}): ") or client._address
+                    phone = input(f"Новый телефон ({client._phone}): ") or client._phone
+                    if client_rep.update_client(client_id, last_name, first_name, middle_name, address, phone):
+                        print("Данные клиента изменены")
+                    else:
+                        print("Данные не изменены: телефон уже занят другим клиентом или база недоступна")
                 else:
                     print("Клиент не найден")
 
@@ -432,9 +1533,55 @@ def run_operations(client_rep):
             elif choice == "7":
                 field = input("Введите поле для сортировки (client_id, last_name, first_name, middle_name, address, phone): ")
                 client_rep.sort_by_field(field)
-                print("\nОтсортированный список:", client_rep.clients)
+                print("\nОтсортированный список:")
+                for client in client_rep.iter_clients():
+                    print(client)
 
             elif choice == "8":
+                n = int(input("Введите количество клиентов на странице (n): "))
+                last_key = None
+                while True:
+                    page = client_rep.get_page_after(n, last_key)
+                    if not page:
+                        print("Больше клиентов нет")
+                        break
+                    for short in page:
+                        print(short)
+                    last_key = page[-1].key()
+                    if input("Enter - следующая страница, q - выход: ").strip().lower() == "q":
+                        break
+
+            elif choice == "9":
+                path = input("Введите путь к файлу: ")
+                reject_path = input("Файл для отклонённых строк (Enter - не сохранять): ") or None
+                imported, rejected = import_clients(client_rep, path, reject_path)
+                print(f"Импортировано клиентов: {imported}, отклонено: {rejected}")
+
+            elif choice == "10":
+                path = input("Введите путь к файлу: ")
+                print(f"Экспортировано клиентов: {export_clients(client_rep, path)}")
+
+            elif choice == "11":
+                query = input("Введите фамилию, имя, адрес или последние цифры телефона: ")
+                found = client_rep.search(query)
+                if found:
+                    for client in found:
+                        print(client)
+                else:
+                    print("Клиенты не найдены")
+
+            elif choice == "12":
+                stats = client_rep.cache_stats()
+                if stats is None:
+                    print("Кэш используется только при работе с базой данных")
+                else:
+                    for name in ('clients', 'pages'):
+                        cache = stats[name]
+                        print(f"{name}: {cache['size']}/{cache['max_size']}, попаданий {cache['hits']}, промахов {cache['misses']}, "
+                              f"доля попаданий {cache['hit_rate']:.0%}, вытеснено {cache['evictions']}, устарело {cache['expired']}")
+                    print("Уведомления из базы:", "включены" if stats['listening'] else "выключены")
+
+            elif choice == "0":
                 print("Выход")
                 break
             else:
@@ -446,4 +1593,4 @@ def run_operations(client_rep):
 
 
 if __name__ == "__main__":
-    main()
+    main(*sys.argv[1:])
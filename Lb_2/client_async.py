@@ -0,0 +1,373 @@
+import asyncio
+import contextvars
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from itertools import islice
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+import common_path
+from Client import (CLIENT_COLUMNS, DB_SETTINGS, ISOLATION_LEVELS, RETRYABLE_ERRORS, SEARCH_EXPRESSION,
+                    SORT_COLUMNS, Client, ClientShort, escape_like, open_client_rep)
+from client_cache import MISSING, LRUCache
+from client_metrics import count, observe_query, timed
+
+COLUMNS = ', '.join(CLIENT_COLUMNS)
+
+
+class AsyncDatabaseConnector:
+    # Пул асинхронных соединений: пока один запрос ждёт ответа базы, цикл событий обслуживает остальные.
+    # Драйвер передаётся параметром, по умолчанию asyncpg (у него плейсхолдеры $1, $2, ...)
+    def __init__(self, host, user, password, database, port=5432, min_size=1, max_size=10,
+                 driver=asyncpg, command_timeout=30):
+        if driver is None:
+            raise ValueError("Для асинхронной работы с базой нужен пакет asyncpg")
+        self.driver = driver
+        self.connect_params = dict(host=host, user=user, password=password, database=database, port=port)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.command_timeout = command_timeout
+        self.pool = None
+        # Соединение открытой транзакции; у каждой задачи asyncio свой контекст
+        self._conn = contextvars.ContextVar('client_async_transaction', default=None)
+
+    async def open(self):
+        self.pool = await self.driver.create_pool(min_size=self.min_size, max_size=self.max_size,
+                                                  command_timeout=self.command_timeout, **self.connect_params)
+        return self
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _run(self, method, query, args):
+        # Вне транзакции запрос выполняет сам пул: он берёт свободное соединение только на время запроса
+        target = self._conn.get() or self.pool
+        started = time.perf_counter()
+        try:
+            return await getattr(target, method)(query, *args)
+        except self.driver.PostgresError:
+            count('db.failed_queries')
+            raise
+        finally:
+            observe_query(query, time.perf_counter() - started)
+
+    async def fetch(self, query, *args):
+        return await self._run('fetch', query, args)
+
+    async def fetchrow(self, query, *args):
+        return await self._run('fetchrow', query, args)
+
+    async def fetchval(self, query, *args):
+        return await self._run('fetchval', query, args)
+
+    async def execute(self, query, *args):
+        return await self._run('execute', query, args)
+
+    def in_transaction(self):
+        return self._conn.get() is not None
+
+    @asynccontextmanager
+    async def transaction(self, isolation_level=None):
+        # Вложенный блок asyncpg сам превращает в точку сохранения
+        if isolation_level and isolation_level.upper() not in ISOLATION_LEVELS:
+            raise ValueError(f"Неизвестный уровень изоляции: {isolation_level}")
+        conn = self._conn.get()
+        if conn is not None:
+            async with conn.transaction():
+                yield conn
+            return
+        async with self.pool.acquire() as conn:
+            token = self._conn.set(conn)
+            try:
+                async with conn.transaction(isolation=isolation_level.lower().replace(' ', '_')
+                                            if isolation_level else None):
+                    yield conn
+            finally:
+                self._conn.reset(token)
+
+    async def run_in_transaction(self, work, *args, retries=5, isolation_level=None):
+        # work - корутинная функция; при конфликте сериализации или взаимоблокировке повторяется целиком
+        if self.in_transaction():
+            return await work(*args)
+        for number in range(retries + 1):
+            try:
+                async with self.transaction(isolation_level):
+                    return await work(*args)
+            except self.driver.PostgresError as e:
+                if number == retries or getattr(e, 'sqlstate', None) not in RETRYABLE_ERRORS:
+                    raise
+                count('db.transaction_retries')
+                await asyncio.sleep(random.uniform(0, min(1.0, 0.01 * 2 ** number)))
+
+    async def stream(self, query, *args, prefetch=2000):
+        # Курсор asyncpg живёт только внутри транзакции; вне её открывается отдельная, только на чтение
+        conn = self._conn.get()
+        if conn is not None:
+            async for row in conn.cursor(query, *args, prefetch=prefetch):
+                yield row
+            return
+        async with self.pool.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                async for row in conn.cursor(query, *args, prefetch=prefetch):
+                    yield row
+
+
+def affected_rows(status):
+    # asyncpg возвращает строку статуса команды, например 'DELETE 1'
+    return int(status.rsplit(' ', 1)[-1]) if status else 0
+
+
+class AsyncClientDB:
+    def __init__(self, db_connector):
+        self.db_connector = db_connector
+
+    @timed('db.get_client_by_id')
+    async def get_client_by_id(self, client_id):
+        return await self.db_connector.fetchrow(f"SELECT {COLUMNS} FROM Client WHERE ClientID = $1", client_id)
+
+    def iter_all_client(self, order_by=None, prefetch=2000):
+        query = f"SELECT {COLUMNS} FROM Client"
+        if order_by:
+            query += f" ORDER BY {SORT_COLUMNS[order_by]}, ClientID"
+        return self.db_connector.stream(query, prefetch=prefetch)
+
+    @timed('db.add_client')
+    async def add_client(self, last_name, first_name, middle_name, address, phone):
+        return await self.db_connector.fetchrow(
+            f"INSERT INTO Client (LastName, FirstName, MiddleName, Address, Phone) VALUES ($1, $2, $3, $4, $5) "
+            f"RETURNING {COLUMNS}", last_name, first_name, middle_name, address, phone)
+
+    @timed('db.update_client')
+    async def update_client(self, client_id, last_name, first_name, middle_name, address, phone):
+        return await self.db_connector.fetchrow(
+            f"UPDATE Client SET LastName = $1, FirstName = $2, MiddleName = $3, Address = $4, Phone = $5 "
+            f"WHERE ClientID = $6 RETURNING {COLUMNS}", last_name, first_name, middle_name, address, phone, client_id)
+
+    @timed('db.delete_client')
+    async def delete_client(self, client_id):
+        return affected_rows(await self.db_connector.execute("DELETE FROM Client WHERE ClientID = $1", client_id)) > 0
+
+    @timed('db.get_count')
+    async def get_count(self):
+        return await self.db_connector.fetchval("SELECT COUNT(*) FROM Client")
+
+    @timed('db.get_k_n_short_list')
+    async def get_k_n_short_list(self, k, n):
+        return await self.db_connector.fetch(
+            "SELECT ClientID, LastName, Phone FROM Client ORDER BY ClientID LIMIT $1 OFFSET $2", n, (k - 1) * n)
+
+    @timed('db.get_page_after')
+    async def get_page_after(self, n, last_key=None):
+        if last_key is None:
+            return await self.db_connector.fetch(
+                "SELECT ClientID, LastName, Phone FROM Client ORDER BY LastName, ClientID LIMIT $1", n)
+        last_name, client_id = last_key
+        return await self.db_connector.fetch(
+            "SELECT ClientID, LastName, Phone FROM Client WHERE (LastName, ClientID) > ($1, $2) "
+            "ORDER BY LastName, ClientID LIMIT $3", last_name, client_id, n)
+
+    @timed('db.search')
+    async def search(self, query, limit=50):
+        words = query.split()
+        if not words:
+            return []
+        if len(words) == 1 and len(words[0]) < 3:
+            conditions = "lower(LastName) LIKE $1"
+            params = [escape_like(words[0].lower()) + '%']
+        else:
+            conditions = " AND ".join(f"({SEARCH_EXPRESSION}) ILIKE ${i}" for i in range(1, len(words) + 1))
+            params = ['%' + escape_like(word) + '%' for word in words]
+        return await self.db_connector.fetch(
+            f"SELECT {COLUMNS} FROM Client WHERE {conditions} ORDER BY LastName, ClientID LIMIT ${len(params) + 1}",
+            *params, limit)
+
+
+class AsyncClientRepDBAdapter:
+    def __init__(self, db_connector, cache_size=1024, cache_ttl=60.0):
+        self.db_rep = AsyncClientDB(db_connector)
+        self._order_by = None
+        self._client_cache = LRUCache(cache_size, cache_ttl, 'cache.client')
+        # Одновременные промахи по одному ID ждут один и тот же запрос, а не идут в базу каждый сам
+        self._loading = {}
+
+    @staticmethod
+    def row_to_client(row):
+        return Client.from_fields(*row) if row is not None else None
+
+    @timed('repository.get_client_by_id')
+    async def get_client_by_id(self, client_id):
+        if self.db_rep.db_connector.in_transaction():
+            return self.row_to_client(await self.db_rep.get_client_by_id(client_id))
+        client = self._client_cache.get(client_id)
+        if client is not MISSING:
+            return client
+        pending = self._loading.get(client_id)
+        if pending is None:
+            pending = self._loading[client_id] = asyncio.ensure_future(self._load_client(client_id))
+            pending.add_done_callback(lambda done: self._loaded(client_id, done))
+        return await asyncio.shield(pending)
+
+    def _loaded(self, client_id, done):
+        # После записи на этом месте может уже стоять новая загрузка, её убирать нельзя
+        if self._loading.get(client_id) is done:
+            del self._loading[client_id]
+
+    async def _load_client(self, client_id):
+        version = self._client_cache.version
+        client = self.row_to_client(await self.db_rep.get_client_by_id(client_id))
+        self._client_cache.put(client_id, client, version)
+        return client
+
+    @timed('repository.get_k_n_short_list')
+    async def get_k_n_short_list(self, k, n):
+        return [ClientShort.from_fields(*row) for row in await self.db_rep.get_k_n_short_list(k, n)]
+
+    @timed('repository.get_page_after')
+    async def get_page_after(self, n, last_key=None):
+        return [ClientShort.from_fields(*row) for row in await self.db_rep.get_page_after(n, last_key)]
+
+    @timed('repository.search')
+    async def search(self, query, limit=50):
+        return [self.row_to_client(row) for row in await self.db_rep.search(query, limit)]
+
+    async def iter_clients(self):
+        async for row in self.db_rep.iter_all_client(self._order_by):
+            yield Client.from_fields(*row)
+
+    async def sort_by_field(self, field):
+        if field not in SORT_COLUMNS:
+            print(f"Поле '{field}' не найдено.")
+            return
+        self._order_by = field
+
+    def _changed(self, client_id):
+        # Загрузка, начатая до записи, может вернуть старую строку: следующие чтения к ней не присоединяются
+        self._client_cache.invalidate(client_id)
+        self._loading.pop(client_id, None)
+
+    @timed('repository.add_client')
+    async def add_client(self, last_name, first_name, middle_name, address, phone):
+        # Проверки те же, что и у синхронных хранилищ; ID выдаёт база
+        Client(0, last_name, first_name, middle_name, address, phone)
+        client = self.row_to_client(await self.db_rep.add_client(last_name, first_name, middle_name, address, phone))
+        if client is not None:
+            self._changed(client._client_id)
+        return client
+
+    @timed('repository.update_client')
+    async def update_client(self, client_id, last_name, first_name, middle_name, address, phone):
+        Client(client_id, last_name, first_name, middle_name, address, phone)
+        row = await self.db_rep.update_client(client_id, last_name, first_name, middle_name, address, phone)
+        self._changed(client_id)
+        return row is not None
+
+    @timed('repository.delete_client')
+    async def delete_client(self, client_id):
+        result = await self.db_rep.delete_client(client_id)
+        self._changed(client_id)
+        return result
+
+    async def get_count(self):
+        return await self.db_rep.get_count()
+
+    async def run_in_transaction(self, work, *args, retries=5, isolation_level=None):
+        try:
+            return await self.db_rep.db_connector.run_in_transaction(work, *args, retries=retries,
+                                                                     isolation_level=isolation_level)
+        finally:
+            # Строки, прочитанные внутри транзакции или изменённые ею, в кэше устарели при любом исходе
+            self._client_cache.clear()
+            self._loading.clear()
+
+    def cache_stats(self):
+        return {'clients': self._client_cache.stats()}
+
+    async def close(self):
+        # Незавершённые загрузки держат соединения пула, их отменяем до закрытия пула
+        for pending in list(self._loading.values()):
+            pending.cancel()
+        self._loading.clear()
+        self._client_cache.clear()
+        await self.db_rep.db_connector.close()
+
+
+class AsyncClientRep:
+    # Асинхронная обёртка над синхронным хранилищем (JSON, YAML, SQLite). Файловые хранилища
+    # не потокобезопасны, поэтому по умолчанию все вызовы идут по очереди через один рабочий поток
+    def __init__(self, client_rep, executor=None):
+        self.client_rep = client_rep
+        self._own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix='client-rep')
+
+    async def _call(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def get_client_by_id(self, client_id):
+        return await self._call(self.client_rep.get_client_by_id, client_id)
+
+    async def get_k_n_short_list(self, k, n):
+        return await self._call(self.client_rep.get_k_n_short_list, k, n)
+
+    async def get_page_after(self, n, last_key=None):
+        return await self._call(self.client_rep.get_page_after, n, last_key)
+
+    async def search(self, query, limit=50):
+        return await self._call(self.client_rep.search, query, limit)
+
+    async def iter_clients(self, batch_size=1000):
+        # Клиенты читаются пачками в рабочем потоке, чтобы не переключаться на поток ради каждого
+        clients = await self._call(self.client_rep.iter_clients)
+        while True:
+            batch = await self._call(list, islice(clients, batch_size))
+            if not batch:
+                return
+            for client in batch:
+                yield client
+
+    async def sort_by_field(self, field):
+        # Сортировка меняет список клиентов и кэши индексов, поэтому тоже идёт через рабочий поток
+        return await self._call(self.client_rep.sort_by_field, field)
+
+    async def add_client(self, last_name, first_name, middle_name, address, phone):
+        return await self._call(self.client_rep.add_client, last_name, first_name, middle_name, address, phone)
+
+    async def update_client(self, client_id, last_name, first_name, middle_name, address, phone):
+        return await self._call(self.client_rep.update_client, client_id, last_name, first_name, middle_name,
+                                address, phone)
+
+    async def delete_client(self, client_id):
+        return await self._call(self.client_rep.delete_client, client_id)
+
+    async def get_count(self):
+        return await self._call(self.client_rep.get_count)
+
+    def cache_stats(self):
+        return self.client_rep.cache_stats()
+
+    async def close(self):
+        await self._call(self.client_rep.close)
+        if self._own_executor:
+            self.executor.shutdown(wait=False)
+
+
+async def open_async_client_rep(storage_type, driver=asyncpg, **pool_options):
+    # Возвращает асинхронное хранилище и соединитель (только для "db"). close() хранилища закрывает и пул
+    # соединителя, повторный close() соединителя ничего не делает
+    if storage_type == "db":
+        db_connector = await AsyncDatabaseConnector(**DB_SETTINGS, driver=driver, **pool_options).open()
+        return AsyncClientRepDBAdapter(db_connector), db_connector
+    client_rep, _ = await asyncio.get_running_loop().run_in_executor(None, open_client_rep, storage_type)
+    return AsyncClientRep(client_rep), None
@@ -0,0 +1,110 @@
+import csv
+import json
+from itertools import islice
+import common_path
+from client_stream import iter_json_array, iter_json_lines
+from client_validation import CLIENT_INPUT_RULES, RecordValidator, keyed_rules
+
+FIELDS = ['LastName', 'FirstName', 'MiddleName', 'Address', 'Phone']
+
+RULES = keyed_rules(CLIENT_INPUT_RULES, FIELDS)
+
+VALIDATOR = RecordValidator(RULES)
+
+
+def client_to_row(client):
+    return {
+        'ClientID': client._client_id,
+        'LastName': client._last_name,
+        'FirstName': client._first_name,
+        'MiddleName': client._middle_name,
+        'Address': client._address,
+        'Phone': client._phone,
+    }
+
+
+def iter_rows(file, path):
+    if path.endswith('.csv'):
+        return csv.DictReader(file)
+    if path.endswith('.jsonl'):
+        return iter_json_lines(file)
+    return iter_json_array(file)
+
+
+def import_clients(client_rep, path, reject_path=None, batch_size=1000):
+    imported = 0
+    rejected = 0
+    seen_phones = set()
+    batch = []
+    reject_file = open(reject_path, 'w', encoding='utf-8', newline='') if reject_path else None
+    rejects = None
+    if reject_file:
+        rejects = csv.DictWriter(reject_file, fieldnames=['record'] + FIELDS + ['error'], extrasaction='ignore')
+        rejects.writeheader()
+
+    def reject(number, row, error):
+        nonlocal rejected
+        rejected += 1
+        if rejects:
+            rejects.writerow(dict(row if isinstance(row, dict) else {}, record=number, error=error))
+
+    def flush():
+        nonlocal imported
+        existing = client_rep.find_existing_phones([record['Phone'] for _, record in batch])
+        records = []
+        numbers = []
+        for number, record in batch:
+            if record['Phone'] in existing:
+                reject(number, record, "Phone number already exists")
+            else:
+                records.append(record)
+                numbers.append(number)
+        # Строку, которую не приняла база, хранилище возвращает по номеру в пачке
+        imported += client_rep.add_clients(records, save=False,
+                                           on_error=lambda i, error: reject(numbers[i], records[i], error))
+        batch.clear()
+
+    try:
+        with open(path, 'r', encoding='utf-8-sig', newline='') as source:
+            rows = iter_rows(source, path)
+            first = 1
+            # Строки проверяются пачками: все ошибки строки собираются сразу, без исключений
+            for chunk in iter(lambda: list(islice(rows, batch_size)), []):
+                invalid = VALIDATOR.validate_batch(chunk, first)
+                for number, row in enumerate(chunk, first):
+                    if number in invalid:
+                        reject(number, row, "; ".join(invalid[number]))
+                        continue
+                    record = {field: row[field] for field in FIELDS}
+                    if record['Phone'] in seen_phones:
+                        reject(number, record, "Duplicate phone number in file")
+                        continue
+                    seen_phones.add(record['Phone'])
+                    batch.append((number, record))
+                    if len(batch) >= batch_size:
+                        flush()
+                first += len(chunk)
+            if batch:
+                flush()
+    finally:
+        if imported:
+            client_rep.save_data()
+        if reject_file:
+            reject_file.close()
+    return imported, rejected
+
+
+def export_clients(client_rep, path):
+    count = 0
+    with open(path, 'w', encoding='utf-8', newline='') as target:
+        if path.endswith('.jsonl'):
+            for client in client_rep.iter_clients():
+                target.write(json.dumps(client_to_row(client), ensure_ascii=False) + '\n')
+                count += 1
+        else:
+            writer = csv.DictWriter(target, fieldnames=['ClientID'] + FIELDS)
+            writer.writeheader()
+            for client in client_rep.iter_clients():
+                writer.writerow(client_to_row(client))
+                count += 1
+    return count
@@ -0,0 +1,144 @@
+import logging
+import select
+import threading
+import time
+from collections import OrderedDict
+
+import common_path
+from client_metrics import count
+
+logger = logging.getLogger('client.cache')
+
+MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, max_size=1024, ttl=60.0, name='cache', clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.name = name
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Любая инвалидация меняет версию, и значение, прочитанное из базы до неё, в кэш уже не попадёт
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        count(f'{self.name}.miss' if entry is None else f'{self.name}.hit')
+        return MISSING if entry is None else entry[1]
+
+    def put(self, key, value, version=None):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if version is not None and version != self._version:
+                return
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    @property
+    def version(self):
+        # Передаётся в put(), если значение загружается не через get_or_load
+        return self._version
+
+    def get_or_load(self, key, load):
+        value = self.get(key)
+        if value is MISSING:
+            version = self._version
+            value = load()
+            self.put(key, value, version)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._version += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'size': len(self._entries), 'max_size': self.max_size, 'ttl': self.ttl,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'expired': self.expired,
+                    'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+class ChangeListener:
+    def __init__(self, connect, channel, on_change, errors=(OSError,), poll_interval=1.0, retry_interval=5.0):
+        self.connect = connect
+        self.channel = channel
+        self.on_change = on_change
+        self.errors = errors
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+        self.connection = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'listen-{channel}', daemon=True)
+
+    def start(self):
+        self._listen()
+        self._thread.start()
+
+    def _listen(self):
+        self.connection = self.connect()
+        self.connection.autocommit = True
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.connection is None:
+                    self._listen()
+                    # Пока соединения не было, уведомления могли потеряться
+                    self.on_change(None)
+                if select.select([self.connection], [], [], self.poll_interval)[0]:
+                    self.connection.poll()
+                    while self.connection.notifies:
+                        self.on_change(self.connection.notifies.pop(0).payload)
+            except self.errors as e:
+                if self._stop.is_set():
+                    break
+                logger.warning("Change listener on %r lost its connection: %s", self.channel, e)
+                self._close_connection()
+                self.on_change(None)
+                self._stop.wait(self.retry_interval)
+
+    def _close_connection(self):
+        connection, self.connection = self.connection, None
+        if connection is not None:
+            try:
+                connection.close()
+            except self.errors:
+                pass
+
+    def close(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(self.poll_interval + 1)
+        self._close_connection()
@@ -0,0 +1,154 @@
+import bisect
+
+
+class BookingConflictError(ValueError):
+    def __init__(self, car_id, start, end, rental_id=None):
+        self.car_id = car_id
+        self.start = start
+        self.end = end
+        self.rental_id = rental_id
+        reason = f" (rental {rental_id})" if rental_id is not None else ""
+        super().__init__(f"Car {car_id} is already booked between {start} and {end}{reason}")
+
+
+def check_period(start, end):
+    if not start < end:
+        raise ValueError(f"Rental period must end after it starts: {start} - {end}")
+
+
+class CarSchedule:
+    # Брони одного автомобиля хранятся как полуоткрытые интервалы [начало, конец): в день возврата машину
+    # можно снова выдать. Пересекающихся броней в расписании нет, поэтому начала и концы отсортированы
+    # одинаково, и любую проверку решает один bisect
+    __slots__ = ('starts', 'ends', 'rental_ids')
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.rental_ids = []
+
+    def __len__(self):
+        return len(self.starts)
+
+    def conflict(self, start, end):
+        # Из броней, начавшихся до end, с [start, end) может пересекаться только последняя
+        i = bisect.bisect_left(self.starts, end)
+        if i and self.ends[i - 1] > start:
+            return self.rental_ids[i - 1]
+        return None
+
+    def is_free(self, start, end):
+        return self.conflict(start, end) is None
+
+    def add(self, rental_id, start, end):
+        i = bisect.bisect_left(self.starts, end)
+        if i and self.ends[i - 1] > start:
+            return False
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.rental_ids.insert(i, rental_id)
+        return True
+
+    def remove(self, rental_id, start):
+        i = bisect.bisect_left(self.starts, start)
+        if i < len(self.starts) and self.rental_ids[i] == rental_id:
+            del self.starts[i], self.ends[i], self.rental_ids[i]
+            return True
+        return False
+
+    def bookings(self, start, end):
+        i = bisect.bisect_right(self.ends, start)
+        j = bisect.bisect_left(self.starts, end, i)
+        return list(zip(self.rental_ids[i:j], self.starts[i:j], self.ends[i:j]))
+
+    def free_slots(self, start, end):
+        slots = []
+        position = start
+        for _, booked_start, booked_end in self.bookings(start, end):
+            if booked_start > position:
+                slots.append((position, booked_start))
+            position = max(position, booked_end)
+        if position < end:
+            slots.append((position, end))
+        return slots
+
+
+class AvailabilityIndex:
+    def __init__(self):
+        self._schedules = {}
+        self._bookings = {}
+
+    def __len__(self):
+        return len(self._bookings)
+
+    def schedule(self, car_id):
+        schedule = self._schedules.get(car_id)
+        if schedule is None:
+            schedule = self._schedules[car_id] = CarSchedule()
+        return schedule
+
+    def book(self, rental_id, car_id, start, end):
+        check_period(start, end)
+        if rental_id in self._bookings:
+            raise ValueError(f"Rental {rental_id} is already indexed")
+        schedule = self.schedule(car_id)
+        if not schedule.add(rental_id, start, end):
+            raise BookingConflictError(car_id, start, end, schedule.conflict(start, end))
+        self._bookings[rental_id] = (car_id, start, end)
+
+    def release(self, rental_id):
+        booking = self._bookings.pop(rental_id, None)
+        if booking is None:
+            return False
+        car_id, start, _ = booking
+        self._schedules[car_id].remove(rental_id, start)
+        return True
+
+    def rebook(self, rental_id, car_id, start, end):
+        # Перенос брони: старый интервал не должен мешать новому, а при конфликте он возвращается на место
+        check_period(start, end)
+        previous = self._bookings.get(rental_id)
+        self.release(rental_id)
+        try:
+            self.book(rental_id, car_id, start, end)
+        except BookingConflictError:
+            if previous is not None:
+                self.book(rental_id, *previous)
+            raise
+
+    def check(self, car_id, start, end):
+        check_period(start, end)
+        schedule = self._schedules.get(car_id)
+        rental_id = schedule.conflict(start, end) if schedule is not None else None
+        if rental_id is not None:
+            raise BookingConflictError(car_id, start, end, rental_id)
+
+    def is_free(self, car_id, start, end):
+        check_period(start, end)
+        schedule = self._schedules.get(car_id)
+        return schedule is None or schedule.is_free(start, end)
+
+    def free_cars(self, car_ids, start, end):
+        # O(log n) на каждый автомобиль-кандидат, где n - число его броней
+        check_period(start, end)
+        schedules = self._schedules
+        return [car_id for car_id in car_ids
+                if car_id not in schedules or schedules[car_id].is_free(start, end)]
+
+    def free_slots(self, car_id, start, end):
+        check_period(start, end)
+        schedule = self._schedules.get(car_id)
+        return schedule.free_slots(start, end) if schedule is not None else [(start, end)]
+
+    def has_bookings(self, car_id):
+        return bool(self._schedules.get(car_id))
+
+    def bookings(self, car_id, start, end):
+        schedule = self._schedules.get(car_id)
+        return schedule.bookings(start, end) if schedule is not None else []
+
+    def drop_car(self, car_id):
+        schedule = self._schedules.pop(car_id, None)
+        if schedule is not None:
+            for rental_id in schedule.rental_ids:
+                del self._bookings[rental_id]
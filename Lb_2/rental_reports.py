@@ -0,0 +1,471 @@
+import sys
+import zipfile
+from datetime import date, timedelta
+
+import numpy as np
+
+import common_path
+from client_file import CorruptFileError, atomic_write_binary
+from client_metrics import count, timed
+
+DAY = 'datetime64[D]'
+MONTH = 'datetime64[M]'
+
+
+def to_day(value):
+    return np.datetime64(value, 'D')
+
+
+def to_date(day):
+    return day.astype(object)
+
+
+def month_start(day):
+    return to_date(to_day(day).astype(MONTH).astype(DAY))
+
+
+def next_month(day):
+    return to_date((to_day(day).astype(MONTH) + 1).astype(DAY))
+
+
+def row_hash(*columns):
+    # Перемешивание 64-битных слов столбцов (как в splitmix64): сумма хэшей строк не зависит от их порядка
+    h = np.full(len(columns[0]), 0x9E3779B97F4A7C15, dtype=np.uint64)
+    for column in columns:
+        h ^= np.ascontiguousarray(column).view(np.uint64)
+        h *= np.uint64(0xBF58476D1CE4E5B9)
+        h ^= h >> np.uint64(31)
+    return h
+
+
+class DailyFacts:
+    # Итоги по дням в столбцах. Плотные массивы days/paid/accrued идут подряд по дням, разреженные пары
+    # (день, автомобиль) и тройки (день, клиент, сумма) хранят только то, что в эти дни было
+    FIELDS = ('days', 'paid', 'accrued', 'car_day', 'car_id', 'client_day', 'client_id', 'client_amount')
+
+    def __init__(self, days, paid, accrued, car_day, car_id, client_day, client_id, client_amount):
+        self.days = days
+        self.paid = paid
+        self.accrued = accrued
+        self.car_day = car_day
+        self.car_id = car_id
+        self.client_day = client_day
+        self.client_id = client_id
+        self.client_amount = client_amount
+
+    @classmethod
+    def empty(cls):
+        days, ids, amounts = np.array([], dtype=DAY), np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+        return cls(days, amounts, amounts, days, ids, days, ids, amounts)
+
+    @classmethod
+    def concat(cls, parts):
+        parts = [part for part in parts if len(part.days)]
+        if not parts:
+            return cls.empty()
+        if len(parts) == 1:
+            return parts[0]
+        return cls(*(np.concatenate([getattr(part, field) for part in parts]) for field in cls.FIELDS))
+
+    def __len__(self):
+        return len(self.days)
+
+    @property
+    def start(self):
+        return self.days[0] if len(self.days) else None
+
+    @property
+    def end(self):
+        return self.days[-1] + 1 if len(self.days) else None
+
+    def window(self, start, end):
+        start, end = to_day(start), to_day(end)
+        dense = (self.days >= start) & (self.days < end)
+        cars = (self.car_day >= start) & (self.car_day < end)
+        clients = (self.client_day >= start) & (self.client_day < end)
+        return DailyFacts(self.days[dense], self.paid[dense], self.accrued[dense], self.car_day[cars], self.car_id[cars],
+                          self.client_day[clients], self.client_id[clients], self.client_amount[clients])
+
+    def replace(self, start, end, part):
+        # Дни [start, end) внутри отрезка заменяются пересчитанными
+        return DailyFacts.concat([self.window(self.start, start), part, self.window(end, self.end)])
+
+    def save(self, path, fingerprints=None):
+        fingerprints = fingerprints or {}
+
+        def write(raw):
+            np.savez(raw, fingerprint_month=np.array(list(fingerprints), dtype=DAY),
+                     fingerprint=np.array(list(fingerprints.values()), dtype=np.int64),
+                     **{field: getattr(self, field) for field in self.FIELDS})
+        atomic_write_binary(path, write)
+
+    @classmethod
+    def load(cls, path):
+        # Возвращает итоги и отпечатки месяцев, по данным которых они посчитаны: {первый день месяца: отпечаток}.
+        # В кэше старого формата отпечатков по месяцам нет, такие месяцы будут пересчитаны при проверке
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                fingerprints = {}
+                if 'fingerprint_month' in data.files:
+                    fingerprints = dict(zip(map(to_date, data['fingerprint_month']), map(int, data['fingerprint'])))
+                return cls(*(data[field] for field in cls.FIELDS)), fingerprints
+        except FileNotFoundError:
+            return cls.empty(), {}
+        except (KeyError, ValueError, OSError, zipfile.BadZipFile) as e:
+            raise CorruptFileError(f"{path}: {e}") from e
+
+
+def group_sum(keys, weights):
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique, np.bincount(inverse, weights=weights, minlength=len(unique))
+
+
+class ReportColumns:
+    # Аренды и платежи в столбцах NumPy; стоимость суток подставлена в аренду заранее
+    def __init__(self, rental_id, client_id, car_id, start, end, cost_per_day,
+                 payment_rental_id, payment_amount, payment_date):
+        self.rental_id = np.asarray(rental_id, dtype=np.int64)
+        self.client_id = np.asarray(client_id, dtype=np.int64)
+        self.car_id = np.asarray(car_id, dtype=np.int64)
+        self.start = np.asarray(start, dtype=DAY)
+        self.end = np.asarray(end, dtype=DAY)
+        self.cost_per_day = np.asarray(cost_per_day, dtype=np.float64)
+        self.payment_amount = np.asarray(payment_amount, dtype=np.float64)
+        self.payment_date = np.asarray(payment_date, dtype=DAY)
+        # Клиент платежа берётся из его аренды; платежи без известной аренды в отчёты по клиентам не попадают
+        payment_rental_id = np.asarray(payment_rental_id, dtype=np.int64)
+        self.payment_client_id = np.full(len(payment_rental_id), -1, dtype=np.int64)
+        if len(self.rental_id):
+            order = np.argsort(self.rental_id)
+            found = order[np.minimum(np.searchsorted(self.rental_id, payment_rental_id, sorter=order), len(order) - 1)]
+            known = self.rental_id[found] == payment_rental_id
+            self.payment_client_id[known] = self.client_id[found[known]]
+
+    @classmethod
+    @timed('reports.load_columns')
+    def from_repositories(cls, car_rep, rental_rep, payment_rep):
+        rentals = rental_rep.records
+        costs = {car._car_id: car._rental_cost_per_day for car in car_rep.records}
+        payments = payment_rep.records
+        columns = cls(
+            np.fromiter((r._rental_id for r in rentals), np.int64, len(rentals)),
+            np.fromiter((r._client_id for r in rentals), np.int64, len(rentals)),
+            np.fromiter((r._car_id for r in rentals), np.int64, len(rentals)),
+            np.array([r._start_date for r in rentals], dtype=DAY),
+            np.array([r._end_date for r in rentals], dtype=DAY),
+            np.fromiter((costs.get(r._car_id, 0.0) for r in rentals), np.float64, len(rentals)),
+            np.fromiter((p._rental_id for p in payments), np.int64, len(payments)),
+            np.fromiter((p._amount for p in payments), np.float64, len(payments)),
+            np.array([p._payment_date for p in payments], dtype=DAY),
+        )
+        count('reports.loaded_rentals', len(rentals))
+        return columns
+
+    def fingerprints(self, start, end):
+        # Отпечаток каждого месяца, задетого окном [start, end): сумма хэшей только тех аренд и платежей,
+        # что приходятся на этот месяц. Аренда учитывается во всех месяцах, которые она задевает.
+        # Месяцы без строк не возвращаются
+        start, end = to_day(start), to_day(end)
+        if end <= start:
+            return {}
+        first_month = start.astype(MONTH)
+        touching = (self.start < end) & (self.end > start) & (self.end > self.start)
+        first = np.maximum(self.start[touching], start).astype(MONTH)
+        last = (np.minimum(self.end[touching], end) - 1).astype(MONTH)
+        spans = (last - first).astype(np.int64) + 1
+        months = np.repeat(first, spans) + (np.arange(spans.sum()) - np.repeat(np.cumsum(spans) - spans, spans))
+        hashes = np.repeat(row_hash(self.rental_id[touching], self.client_id[touching], self.car_id[touching],
+                                    self.start[touching], self.end[touching], self.cost_per_day[touching]), spans)
+        paid = (self.payment_date >= start) & (self.payment_date < end)
+        months = np.concatenate([months, self.payment_date[paid].astype(MONTH)])
+        hashes = np.concatenate([hashes, row_hash(self.payment_client_id[paid], self.payment_amount[paid],
+                                                  self.payment_date[paid])])
+        offsets = (months - first_month).astype(np.int64)
+        size = int(((end - 1).astype(MONTH) - first_month).astype(np.int64)) + 1
+        totals = np.zeros(size, dtype=np.uint64)
+        np.add.at(totals, offsets, hashes)
+        present = np.flatnonzero(np.bincount(offsets, minlength=size))
+        return {to_date((first_month + i).astype(DAY)): int(total)
+                for i, total in zip(present, totals[present].view(np.int64))}
+
+    def bounds(self):
+        starts = np.concatenate([self.start, self.payment_date])
+        ends = np.concatenate([self.end, self.payment_date + 1])
+        if not len(starts):
+            return None
+        return to_date(starts.min()), to_date(ends.max())
+
+    @timed('reports.facts')
+    def facts(self, start, end):
+        start, end = to_day(start), to_day(end)
+        size = int((end - start).astype(np.int64))
+        if size <= 0:
+            return DailyFacts.empty()
+        days = np.arange(start, end, dtype=DAY)
+
+        paid_mask = (self.payment_date >= start) & (self.payment_date < end)
+        paid_offset = (self.payment_date[paid_mask] - start).astype(np.int64)
+        paid = np.bincount(paid_offset, weights=self.payment_amount[paid_mask], minlength=size)
+
+        # Аренда, обрезанная по окну, как полуоткрытый отрезок смещений [first, last)
+        first = np.clip((self.start - start).astype(np.int64), 0, size)
+        last = np.clip((self.end - start).astype(np.int64), 0, size)
+        rented = last > first
+        first, last = first[rented], last[rented]
+        cost = self.cost_per_day[rented]
+        # Разностный массив: стоимость суток прибавляется в день начала и вычитается в день возврата
+        accrued = np.cumsum(np.bincount(first, weights=cost, minlength=size + 1)
+                            - np.bincount(last, weights=cost, minlength=size + 1))[:size]
+
+        lengths = last - first
+        car_id = np.repeat(self.car_id[rented], lengths)
+        shifts = np.repeat(first - (np.cumsum(lengths) - lengths), lengths)
+        car_offset = np.arange(len(car_id)) + shifts
+        # Пересекающиеся аренды одной машины дают один день, как GROUP BY в SqlReportSource
+        car_width = int(car_id.max()) + 1 if len(car_id) else 1
+        car_keys = np.unique(car_offset * car_width + car_id)
+
+        client_mask = paid_mask & (self.payment_client_id >= 0)
+        client_offset = (self.payment_date[client_mask] - start).astype(np.int64)
+        client_id = self.payment_client_id[client_mask]
+        width = int(client_id.max()) + 1 if len(client_id) else 1
+        keys, client_amount = group_sum(client_offset * width + client_id, self.payment_amount[client_mask])
+        return DailyFacts(days, paid, accrued, start + car_keys // car_width, car_keys % car_width,
+                          start + keys // width, keys % width, client_amount)
+
+
+RENTED_DAYS_SQL = """
+    FROM Rental r
+    JOIN Car c ON c.CarID = r.CarID
+    CROSS JOIN LATERAL generate_series(GREATEST(r.RentalStartDate, %s), LEAST(r.RentalEndDate, %s) - 1,
+                                       interval '1 day') AS d
+    WHERE daterange(r.RentalStartDate, r.RentalEndDate) && daterange(%s, %s)
+"""
+
+
+class SqlReportSource:
+    # Для ClientDB-подобных хранилищ суммы по дням считает сама база, по сети идут только итоги
+    def __init__(self, db_connector):
+        self.db_connector = db_connector
+
+    def _rows(self, query, params):
+        cursor = self.db_connector.execute_query(query, params, idempotent=True)
+        return cursor.fetchall() if cursor else []
+
+    def fingerprints(self, start, end):
+        # Как ReportColumns.fingerprints: по месяцу на строку, читаются только аренды и платежи окна.
+        # Хэши другие, но отпечатки сравниваются только с посчитанными этим же источником
+        if end <= start:
+            return {}
+        rows = self._rows("""
+            SELECT m, SUM(h) FROM (
+                SELECT date_trunc('month', g)::date AS m, hashtext(r::text || c.RentalCostPerDay::text) AS h
+                FROM Rental r
+                JOIN Car c ON c.CarID = r.CarID
+                CROSS JOIN LATERAL generate_series(date_trunc('month', GREATEST(r.RentalStartDate, %s)),
+                                                   LEAST(r.RentalEndDate, %s) - 1, interval '1 month') AS g
+                WHERE daterange(r.RentalStartDate, r.RentalEndDate) && daterange(%s, %s)
+                UNION ALL
+                SELECT date_trunc('month', p.PaymentDate)::date, hashtext(p::text || COALESCE(r.ClientID, -1)::text)
+                FROM Payment p
+                LEFT JOIN Rental r ON r.RentalID = p.RentalID
+                WHERE p.PaymentDate >= %s AND p.PaymentDate < %s
+            ) t GROUP BY m
+        """, (start, end, start, end, start, end))
+        return {month: int(total) for month, total in rows}
+
+    def bounds(self):
+        rows = self._rows("""
+            SELECT LEAST((SELECT MIN(RentalStartDate) FROM Rental), (SELECT MIN(PaymentDate) FROM Payment)),
+                   GREATEST((SELECT MAX(RentalEndDate) FROM Rental), (SELECT MAX(PaymentDate) + 1 FROM Payment))
+        """, None)
+        if not rows or rows[0][0] is None:
+            return None
+        return rows[0]
+
+    @timed('reports.sql_facts')
+    def facts(self, start, end):
+        size = (end - start).days
+        if size <= 0:
+            return DailyFacts.empty()
+        first, last = to_day(start), to_day(end)
+        days = np.arange(first, last, dtype=DAY)
+        paid = np.zeros(size)
+        accrued = np.zeros(size)
+
+        rows = self._rows("SELECT PaymentDate - %s, SUM(Amount)::float8 FROM Payment "
+                          "WHERE PaymentDate >= %s AND PaymentDate < %s GROUP BY PaymentDate", (start, start, end))
+        if rows:
+            offsets, amounts = np.array(rows).T
+            paid[offsets.astype(np.int64)] = amounts
+
+        rows = self._rows(f"SELECT d::date - %s, SUM(c.RentalCostPerDay)::float8 {RENTED_DAYS_SQL} GROUP BY 1",
+                          (start, start, end, start, end))
+        if rows:
+            offsets, amounts = np.array(rows).T
+            accrued[offsets.astype(np.int64)] = amounts
+
+        # Одна строка на машину и день, даже если аренды этой машины пересекаются
+        rows = self._rows(f"SELECT d::date - %s, r.CarID {RENTED_DAYS_SQL} GROUP BY 1, 2 ORDER BY 1, 2",
+                          (start, start, end, start, end))
+        car_offset, car_id = np.array(rows, dtype=np.int64).reshape(-1, 2).T
+
+        rows = self._rows("SELECT p.PaymentDate - %s, r.ClientID, SUM(p.Amount)::float8 "
+                          "FROM Payment p JOIN Rental r ON r.RentalID = p.RentalID "
+                          "WHERE p.PaymentDate >= %s AND p.PaymentDate < %s GROUP BY 1, 2", (start, start, end))
+        client = np.array(rows, dtype=np.float64).reshape(-1, 3).T
+        return DailyFacts(days, paid, accrued, first + car_offset, car_id,
+                          first + client[0].astype(np.int64), client[1].astype(np.int64), client[2])
+
+
+class RentalReports:
+    # Итоги закрытых дней (до сегодняшнего) не меняются, поэтому кэшируются: повторный отчёт
+    # досчитывает только дни, которых в кэше ещё нет. Незакрытые дни считаются каждый раз заново.
+    # Вместе с кэшем хранятся отпечатки месяцев: если аренды или платежи какого-то месяца окна с тех пор
+    # менялись, пересчитывается только этот месяц. Новые аренды в других месяцах кэш не трогают
+    def __init__(self, source, cache_path=None, today=None):
+        self.source = source
+        self.cache_path = cache_path
+        self.today = today
+        self.cache = DailyFacts.empty()
+        self.fingerprints = {}
+        if cache_path:
+            try:
+                self.cache, self.fingerprints = DailyFacts.load(cache_path)
+            except CorruptFileError as e:
+                print("Ignoring report cache:", e)
+
+    def closed_before(self):
+        return self.today or date.today()
+
+    def _compute(self, start, end):
+        count('reports.computed_days', (end - start).days)
+        return self.source.facts(start, end)
+
+    def facts(self, start, end):
+        closed = min(end, self.closed_before())
+        parts = []
+        if start < closed:
+            changed = self._refresh_months(start, closed)
+            cache_start = to_date(self.cache.start) if len(self.cache) else None
+            cache_end = to_date(self.cache.end) if len(self.cache) else None
+            if cache_start is None:
+                self.cache = self._compute(start, closed)
+                changed = True
+            elif start < cache_start or closed > cache_end:
+                # Кэш остаётся одним непрерывным отрезком дней, поэтому досчитываются только края
+                before = self._compute(start, cache_start) if start < cache_start else DailyFacts.empty()
+                after = self._compute(cache_end, closed) if closed > cache_end else DailyFacts.empty()
+                self.cache = DailyFacts.concat([before, self.cache, after])
+                changed = True
+            if changed:
+                self._save_cache()
+            parts.append(self.cache.window(start, closed))
+        if closed < end:
+            parts.append(self._compute(max(start, closed), end))
+        return DailyFacts.concat(parts)
+
+    def _refresh_months(self, start, end):
+        # Сверяет отпечатки месяцев, задетых окном, и пересчитывает закэшированные дни изменившихся.
+        # Отпечаток берётся по целому месяцу, чтобы не зависеть от границ окна
+        first, stop = month_start(start), next_month(end - timedelta(days=1))
+        fingerprints = self.source.fingerprints(first, stop)
+        changed = False
+        month = first
+        while month < stop:
+            following = next_month(month)
+            if len(self.cache):
+                low, high = max(month, to_date(self.cache.start)), min(following, to_date(self.cache.end))
+                if low < high and self.fingerprints.get(month) != fingerprints.get(month):
+                    count('reports.stale_months')
+                    self.cache = self.cache.replace(low, high, self._compute(low, high))
+                    changed = True
+            if self.fingerprints.get(month) != fingerprints.get(month):
+                if month in fingerprints:
+                    self.fingerprints[month] = fingerprints[month]
+                else:
+                    del self.fingerprints[month]
+                changed = True
+            month = following
+        return changed
+
+    def _save_cache(self):
+        if self.cache_path:
+            try:
+                self.cache.save(self.cache_path, self.fingerprints)
+            except OSError as e:
+                print(f"Ошибка при сохранении кэша отчётов: {e}")
+
+    def invalidate(self, since=None):
+        # Для исправлений задним числом: итоги с этого дня будут посчитаны заново
+        if since is None:
+            self.cache = DailyFacts.empty()
+            self.fingerprints = {}
+        else:
+            self.cache = self.cache.window(date.min, since)
+        self._save_cache()
+
+    def history(self):
+        bounds = self.source.bounds()
+        return (bounds[0], max(bounds[1], self.closed_before())) if bounds else None
+
+    @timed('reports.daily_revenue')
+    def daily_revenue(self, start, end):
+        # Оплачено (по датам платежей) и начислено (стоимость суток за каждый день аренды)
+        facts = self.facts(start, end)
+        return facts.days, facts.paid, facts.accrued
+
+    @timed('reports.car_utilization')
+    def car_utilization(self, start, end, car_ids=None):
+        facts = self.facts(start, end)
+        if car_ids is None:
+            car_ids = np.unique(facts.car_id)
+        car_ids = np.asarray(car_ids, dtype=np.int64)
+        rented = np.zeros(len(car_ids), dtype=np.int64)
+        if len(car_ids) and len(facts.car_id):
+            order = np.argsort(car_ids)
+            position = np.minimum(np.searchsorted(car_ids, facts.car_id, sorter=order), len(car_ids) - 1)
+            known = car_ids[order[position]] == facts.car_id
+            rented = np.bincount(order[position][known], minlength=len(car_ids))
+        return car_ids, rented, rented / max((end - start).days, 1)
+
+    @timed('reports.client_lifetime_value')
+    def client_lifetime_value(self, end=None):
+        history = self.history()
+        if history is None:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+        facts = self.facts(history[0], end or history[1])
+        return group_sum(facts.client_id, facts.client_amount)
+
+
+def main(cars_path="cars.json", rentals_path="rentals.json", payments_path="payments.json",
+         start=None, end=None, cache_path="rental_reports.npz"):
+    from CarRental import Car_rep, Payment_rep, Rental_rep
+
+    car_rep = Car_rep(cars_path)
+    rental_rep = Rental_rep(rentals_path, car_rep)
+    payment_rep = Payment_rep(payments_path, rental_rep)
+    reports = RentalReports(ReportColumns.from_repositories(car_rep, rental_rep, payment_rep), cache_path)
+    end = date.fromisoformat(end) if end else reports.closed_before()
+    # По умолчанию - месяц, в который попадает последний закрытый день
+    start = date.fromisoformat(start) if start else (end - timedelta(days=1)).replace(day=1)
+
+    days, paid, accrued = reports.daily_revenue(start, end)
+    print(f"Выручка с {start} по {end}: оплачено {paid.sum():.2f}, начислено {accrued.sum():.2f}")
+    for day, day_paid, day_accrued in zip(days, paid, accrued):
+        print(f"  {day}: оплачено {day_paid:.2f}, начислено {day_accrued:.2f}")
+    car_ids, rented, utilization = reports.car_utilization(start, end, car_rep.find_car_ids())
+    print("Загрузка автомобилей:")
+    for car_id, days_rented, share in zip(car_ids, rented, utilization):
+        print(f"  {car_rep.get_car_by_id(int(car_id)).get_car_details()}: {days_rented} дн., {share:.0%}")
+    client_ids, totals = reports.client_lifetime_value()
+    print("Сумма платежей клиентов за всё время:")
+    for client_id, total in sorted(zip(client_ids, totals), key=lambda item: -item[1])[:20]:
+        print(f"  клиент {client_id}: {total:.2f}")
+
+
+if __name__ == "__main__":
+    try:
+        main(*sys.argv[1:])
+    except ValueError as e:
+        print(f"Ошибка: {e}")
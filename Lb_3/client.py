@@ -1,8 +1,20 @@
+import sys
+
+import common_path
+from client_validation import CLIENT_STORED_RULES, RUSSIAN_MESSAGES, RecordValidator, keyed_rules
+
+RULES = keyed_rules(CLIENT_STORED_RULES, ['LastName', 'FirstName', 'MiddleName', 'Address', 'Phone'])
+
+VALIDATOR = RecordValidator(RULES, RUSSIAN_MESSAGES)
+
+
 class Client:
+    __slots__ = ('LastName', 'FirstName', 'MiddleName', 'Address', 'Phone')
+
     def __init__(self, LastName, FirstName, MiddleName, Address, Phone):
-        self.LastName = LastName
-        self.FirstName = FirstName
-        self.MiddleName = MiddleName
+        self.LastName = sys.intern(LastName)
+        self.FirstName = sys.intern(FirstName)
+        self.MiddleName = sys.intern(MiddleName)
         self.Address = Address
         self.Phone = Phone
 
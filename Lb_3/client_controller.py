@@ -1,16 +1,27 @@
-from client_repository import ClientRepository
+import common_path
+from client_sqlite import open_repository
+from client_table_model import ClientTableModel
+from client_writer import ClientWriter
+from client_metrics import timed
 from client_view import ClientTableView, ClientFormDialog, EditClientDialog, AllClientDetailsDialog
 from PyQt5.QtWidgets import QMessageBox
-from client import Client
+from client import VALIDATOR, Client
 
 class ClientController:
-    def __init__(self):
-        self.repository = ClientRepository()
-        self.view = ClientTableView(self)
+    def __init__(self, filename='client.json'):
+        self.repository = open_repository(filename)
+        self.writer = ClientWriter(self.repository.write_snapshot, self.repository.journal)
+        self.repository.writer = self.writer
+        self.model = ClientTableModel(self.repository)
+        self.view = ClientTableView(self, self.model)
 
-        self.repository.clients_updated.connect(self.view.update_table)
-
-        self.view.update_table(self.repository.get_clients())
+        self.repository.load_progress.connect(self.view.show_load_progress)
+        self.repository.load_finished.connect(self.view.show_load_finished)
+        self.repository.load_failed.connect(self.view.show_load_failed)
+        self.repository.load_finished.connect(self.repository.start_indexing)
+        self.writer.save_started.connect(self.view.show_save_started)
+        self.writer.save_finished.connect(self.view.show_save_finished)
+        self.writer.save_failed.connect(self.view.show_save_failed)
 
     def show_add_client_dialog(self):
         dialog = ClientFormDialog()
@@ -36,26 +47,45 @@ class ClientController:
                         QMessageBox.warning(self.view, 'Номер телефона уже существует', 'Номер должен быть уникальным')
                     else:
                         self.repository.update_client(index, updated_client)
+                        self.search_clients(self.view.search_edit.text())
+
+    def edit_client_by_phone(self, phone):
+        client = self.repository.get_client_by_phone(phone)
+        if client is not None:
+            self.show_edit_client_dialog(self.repository.get_clients().index(client))
 
+    @timed('controller.delete_client')
     def delete_client(self, index):
         if 0 <= index < len(self.repository.get_clients()):
             self.repository.delete_client(index)
+            self.search_clients(self.view.search_edit.text())
         else:
             QMessageBox.warning(self.view, 'Клиент не выбран', 'Выберите клиента для удаления')
 
+    @timed('controller.search_clients')
+    def search_clients(self, query):
+        clients = self.repository.search(query) if query.strip() else []
+        self.view.show_search_results(clients)
+
+    @timed('controller.sort_clients')
     def sort_clients(self, field):
         self.repository.sort_by_field(field)
 
     def show_all_client_details(self):
-        clients = self.repository.get_clients()
-        dialog = AllClientDetailsDialog(clients, self)
+        dialog = AllClientDetailsDialog(self.model, self, self.view)
         dialog.exec_()
 
     def validate_client_data(self, client_data):
-        if not all(client_data.values()):
-            QMessageBox.warning(self.view, 'Ошибка', 'Все поля должны быть заполнены')
+        errors = VALIDATOR.validate(client_data)
+        if errors:
+            QMessageBox.warning(self.view, 'Ошибка', '\n'.join(errors))
             return False
         return True
 
+    def shutdown(self):
+        self.writer.close()
+        self.repository.close()
+
     def run(self):
-        self.view.show()
\ No newline at end of file
+        self.view.show()
+        self.repository.start_loading()
\ No newline at end of file
@@ -0,0 +1,53 @@
+import json
+import os
+
+import common_path
+from client_metrics import count
+
+
+class ClientJournal:
+    def __init__(self, filename):
+        self.filename = filename
+        self.record_count = 0
+        # Файл открывается при первой записи и остаётся открытым до close
+        self._file = None
+
+    def append(self, record):
+        self.extend([record])
+
+    def extend(self, records):
+        if self._file is None:
+            self._file = open(self.filename, 'a', encoding='utf-8')
+        start = self._file.tell()
+        self._file.writelines(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n' for record in records)
+        self._file.flush()
+        count('journal.write_bytes', self._file.tell() - start)
+        self.record_count += len(records)
+
+    def replay(self):
+        self.record_count = 0
+        if not os.path.exists(self.filename):
+            return
+        with open(self.filename, 'r', encoding='utf-8') as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    print("Skipping damaged journal record:", line)
+                    continue
+                self.record_count += 1
+                yield record
+
+    def clear(self):
+        self.close()
+        with open(self.filename, 'w', encoding='utf-8'):
+            pass
+        self.record_count = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
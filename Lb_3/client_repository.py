@@ -1,67 +1,379 @@
-from PyQt5.QtCore import QObject, pyqtSignal
-from client import Client
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+import common_path
+from client import VALIDATOR, Client
+from client_file import CorruptFileError, atomic_write, open_checked, paused_gc, read_checksum
+from client_journal import ClientJournal
+from client_metrics import count, observe, timed
+from client_search import ClientSearchIndex
+from client_snapshot import open_snapshot, save_snapshot
+from client_stream import iter_records, write_records
+from client_validation import describe_errors
+from collections import Counter
+from operator import attrgetter
+import bisect
 import json
+import os
+import time
+
+SNAPSHOT_FIELDS = [(field, 's') for field in ('LastName', 'FirstName', 'MiddleName', 'Address', 'Phone')]
+
+
+def search_text(client):
+    return ' '.join((client.LastName, client.FirstName, client.MiddleName, client.Address))
+
+
+def duplicate_phones(clients):
+    return [phone for phone, n in Counter(client.Phone for client in clients).items() if n > 1]
+
+
+def sort_key(client, field):
+    value = getattr(client, field)
+    folded = value.casefold()
+    return folded.replace('ё', 'е'), folded, client.Phone
+
 
 class ClientRepository(QObject):
-    clients_updated = pyqtSignal(list)
+    # Как в QAbstractItemModel: сигнал "about_to" идёт до изменения self.clients, второй - после
+    rows_about_to_be_inserted = pyqtSignal(int, int)
+    rows_inserted = pyqtSignal(int, int)
+    rows_about_to_be_removed = pyqtSignal(int, int)
+    rows_removed = pyqtSignal(int, int)
+    rows_changed = pyqtSignal(int, int)
+    rows_about_to_be_reset = pyqtSignal()
+    rows_reset = pyqtSignal()
+    load_progress = pyqtSignal(int, int)
+    load_finished = pyqtSignal()
+    load_failed = pyqtSignal(str)
 
-    def __init__(self):
+    def __init__(self, filename='client.json', journal_filename='client.journal', compact_threshold=1000, load=True, snapshot=False):
         super().__init__()
+        self.filename = filename
+        self.snapshot_filename = filename + '.snap'
+        self.use_snapshot = snapshot
+        self.journal = ClientJournal(journal_filename) if journal_filename else None
+        self.compact_threshold = compact_threshold
+        self.writer = None
+        self._journal_length = 0
         self.clients = []
-        self.load_clients()
+        self._phone_index = {}
+        self._sort_cache = {}
+        self.loading = False
+        self.load_error = None
+        self._load_steps = None
+        self._search_index = None
+        self._index_steps = None
+        if load:
+            self.load_clients()
 
     def load_clients(self):
+        for _ in self.iter_load_steps(batch_size=None):
+            pass
+
+    def start_loading(self, batch_size=1000):
+        self._load_steps = self.iter_load_steps(batch_size)
+        self.continue_loading()
+
+    def continue_loading(self):
+        if self._load_steps is None:
+            return
+        if next(self._load_steps, None) is None:
+            self._load_steps = None
+        else:
+            QTimer.singleShot(0, self.continue_loading)
+
+    def iter_load_steps(self, batch_size):
+        started = time.perf_counter()
+        self.loading = True
+        self.load_error = None
+        self.rows_about_to_be_reset.emit()
+        self.clients = []
+        self._phone_index = {}
+        self._sort_cache = {}
+        self._search_index = None
+        self._index_steps = None
+        self.rows_reset.emit()
         try:
-            with open('client.json', 'r', encoding='utf-8') as file:
-                data = json.load(file)
-                self.clients = [Client.from_dict(item) for item in data]
+            snapshot = self.find_snapshot()
+            if snapshot:
+                yield from self.iter_snapshot_steps(snapshot, batch_size)
+            else:
+                yield from self.iter_file_steps(batch_size)
         except FileNotFoundError:
-            print("client.json not found. Starting with an empty list.")
-            self.clients = []
-        except json.JSONDecodeError as e:
-            print("Error decoding JSON:", e)
+            print(f"{self.filename} not found. Starting with an empty list.")
+        except (json.JSONDecodeError, CorruptFileError) as e:
+            # Повреждённый файл не перезаписываем: репозиторий остаётся только для чтения
+            print("Error loading clients:", e)
+            self.load_error = str(e)
+
+        self.rows_about_to_be_reset.emit()
+        if self.journal and not self.load_error:
+            self.replay_journal()
+            self._journal_length = self.journal.record_count
+        if not self.load_error:
+            # Записи журнала находят клиента по телефону: при повторяющихся номерах они могли попасть
+            # не в ту строку, поэтому такие данные открываются только для чтения и не перезаписываются
+            duplicates = duplicate_phones(self.clients)
+            if duplicates:
+                self.load_error = f"{self.filename}: duplicate phone numbers: {', '.join(duplicates[:10])}"
+                print("Error loading clients:", self.load_error)
+        if self.load_error:
             self.clients = []
+        self._phone_index = {client.Phone: client for client in self.clients}
+        self.loading = False
+        observe('repository.load', time.perf_counter() - started)
+        count('repository.loaded_clients', len(self.clients))
+
+        self.rows_reset.emit()
+        if self.load_error:
+            self.load_failed.emit(self.load_error)
+        self.load_finished.emit()
+
+    def find_snapshot(self):
+        return open_snapshot(self.snapshot_filename, read_checksum(self.filename))
+
+    def iter_snapshot_steps(self, snapshot, batch_size):
+        # Снимок найден и совпадает с файлом: дальше сохраняем его вместе с JSON
+        self.use_snapshot = True
+        with snapshot, paused_gc():
+            clients = list(map(Client, *snapshot.columns()))
+        batch_size = batch_size or len(clients) or 1
+        for start in range(0, len(clients), batch_size):
+            self.append_loaded(clients[start:start + batch_size])
+            self.load_progress.emit(len(self.clients), len(clients))
+            yield True
+
+    def iter_file_steps(self, batch_size):
+        with open_checked(self.filename) as file:
+            total = os.fstat(file.fileno()).st_size
+            batch = []
+            for item in iter_records(file, self.filename):
+                batch.append(item)
+                if batch_size and len(batch) >= batch_size:
+                    self.append_loaded(self.build_clients(batch))
+                    self.load_progress.emit(file.tell(), total)
+                    batch = []
+                    yield True
+            self.append_loaded(self.build_clients(batch))
+            self.load_progress.emit(total, total)
+
+    def build_clients(self, records):
+        # Вся пачка проверяется за один проход, в сообщение попадают все ошибки
+        invalid = VALIDATOR.validate_batch(records, len(self.clients) + 1)
+        if invalid:
+            raise CorruptFileError(f"{self.filename}: invalid client records\n{describe_errors(invalid)}")
+        return list(map(Client.from_dict, records))
+
+    def append_loaded(self, batch):
+        if not batch:
+            return
+        first = len(self.clients)
+        self.rows_about_to_be_inserted.emit(first, first + len(batch) - 1)
+        self.clients.extend(batch)
+        self.rows_inserted.emit(first, len(self.clients) - 1)
 
-        self.clients_updated.emit(self.clients)
+    def replay_journal(self):
+        clients = self.clients
+        positions = {client.Phone: i for i, client in enumerate(clients)}
+        for record in self.journal.replay():
+            op = record.get('op')
+            if op in ('add', 'update'):
+                client = Client.from_dict(record['client'])
+                i = positions.pop(record.get('key', client.Phone), None)
+                if i is None:
+                    i = positions.get(client.Phone)
+                if i is None:
+                    i = len(clients)
+                    clients.append(client)
+                else:
+                    clients[i] = client
+                positions[client.Phone] = i
+            elif op == 'delete':
+                i = positions.pop(record['key'], None)
+                if i is not None:
+                    clients[i] = None
+            elif op == 'sort':
+                clients = [client for client in clients if client is not None]
+                clients.sort(key=lambda x: sort_key(x, record['field']))
+                positions = {client.Phone: i for i, client in enumerate(clients)}
+        self.clients = [client for client in clients if client is not None]
+
+    @timed('repository.write')
+    def write_snapshot(self, clients):
+        # Вызывается и из потока записи: объекты Client не меняются после создания,
+        # поэтому достаточно поверхностной копии списка
+        checksum = atomic_write(self.filename, lambda file: write_records(file, self.filename, (client.to_dict() for client in clients)))
+        if self.use_snapshot:
+            columns = [list(map(attrgetter(field), clients)) for field, _ in SNAPSHOT_FIELDS]
+            save_snapshot(self.snapshot_filename, SNAPSHOT_FIELDS, columns, checksum)
+        # Снимок покрывает все записи журнала
+        if self.journal:
+            self.journal.clear()
 
     def save_clients(self):
-        with open('client.json', 'w', encoding='utf-8') as file:
-            data = [client.to_dict() for client in self.clients]
-            json.dump(data, file, ensure_ascii=False, indent=4)
+        if self.writer:
+            self.writer.save(list(self.clients))
+        else:
+            self.write_snapshot(self.clients)
+
+    @timed('repository.compact')
+    def compact(self):
+        self._journal_length = 0
+        self.save_clients()
 
+    def commit(self, record):
+        if not self.journal:
+            self.save_clients()
+            return
+        self._journal_length += 1
+        if self._journal_length >= self.compact_threshold:
+            self.compact()
+        elif self.writer:
+            self.writer.append(record)
+        else:
+            self.journal.append(record)
+
+    @timed('repository.add_client')
     def add_client(self, client):
-        if not self.is_phone_unique(client.Phone):
+        if self.read_only or not self.is_phone_unique(client.Phone):
             return False
+        row = len(self.clients)
+        self.rows_about_to_be_inserted.emit(row, row)
         self.clients.append(client)
-        self.save_clients()
-        self.clients_updated.emit(self.clients)
+        self._phone_index[client.Phone] = client
+        self._add_sorted(client)
+        self._index_client(client)
+        self.commit({'op': 'add', 'client': client.to_dict()})
+        self.rows_inserted.emit(row, row)
         return True
 
+    @timed('repository.update_client')
     def update_client(self, index, client):
-        if index < 0 or index >= len(self.clients):
+        if self.read_only or index < 0 or index >= len(self.clients):
+            return False
+        old_client = self.clients[index]
+        if client.Phone != old_client.Phone and not self.is_phone_unique(client.Phone):
             return False
         self.clients[index] = client
-        self.save_clients()
-        self.clients_updated.emit(self.clients)
+        if self._phone_index.get(old_client.Phone) is old_client:
+            del self._phone_index[old_client.Phone]
+        self._phone_index[client.Phone] = client
+        self._remove_sorted(old_client)
+        self._add_sorted(client)
+        self._unindex_client(old_client)
+        self._index_client(client)
+        self.commit({'op': 'update', 'key': old_client.Phone, 'client': client.to_dict()})
+        self.rows_changed.emit(index, index)
         return True
 
+    @timed('repository.delete_client')
     def delete_client(self, index):
-        if index < 0 or index >= len(self.clients):
+        if self.read_only or index < 0 or index >= len(self.clients):
             return False
-        self.clients.pop(index)
-        self.save_clients()
-        self.clients_updated.emit(self.clients)
+        self.rows_about_to_be_removed.emit(index, index)
+        client = self.clients.pop(index)
+        if self._phone_index.get(client.Phone) is client:
+            del self._phone_index[client.Phone]
+        self._remove_sorted(client)
+        self._unindex_client(client)
+        self.commit({'op': 'delete', 'key': client.Phone})
+        self.rows_removed.emit(index, index)
         return True
 
+    def close(self):
+        if self.journal:
+            self.journal.close()
+
+    @property
+    def read_only(self):
+        return self.loading or self.load_error is not None
+
     def is_phone_unique(self, phone):
-        return all(client.Phone != phone for client in self.clients)
+        return phone not in self._phone_index
 
+    def get_client_by_phone(self, phone):
+        return self._phone_index.get(phone)
+
+    @timed('repository.sort_by_field')
     def sort_by_field(self, field):
+        if self.read_only:
+            return
         try:
-            self.clients.sort(key=lambda x: getattr(x, field))
-            self.clients_updated.emit(self.clients)
+            cache = self._sort_cache.get(field)
+            if cache is None:
+                clients = sorted(self.clients, key=lambda x: sort_key(x, field))
+                cache = self._sort_cache[field] = ([sort_key(c, field) for c in clients], clients)
         except AttributeError:
             print(f"Поле '{field}' не найдено.")
+            return
+        self.rows_about_to_be_reset.emit()
+        self.clients = list(cache[1])
+        self.commit({'op': 'sort', 'field': field})
+        self.rows_reset.emit()
+
+    def _add_sorted(self, client):
+        for field, (keys, clients) in self._sort_cache.items():
+            key = sort_key(client, field)
+            i = bisect.bisect_right(keys, key)
+            keys.insert(i, key)
+            clients.insert(i, client)
+
+    def _remove_sorted(self, client):
+        for field, (keys, clients) in self._sort_cache.items():
+            key = sort_key(client, field)
+            i = bisect.bisect_left(keys, key)
+            while i < len(keys) and keys[i] == key:
+                if clients[i] is client:
+                    del keys[i]
+                    del clients[i]
+                    break
+                i += 1
+
+    def start_indexing(self, batch_size=5000):
+        self._index_steps = self.iter_index_steps(batch_size)
+        QTimer.singleShot(0, self.continue_indexing)
+
+    def continue_indexing(self):
+        if self._index_steps is None:
+            return
+        if next(self._index_steps, None) is None:
+            self._index_steps = None
+        else:
+            QTimer.singleShot(0, self.continue_indexing)
+
+    def iter_index_steps(self, batch_size):
+        # Индекс подключается сразу, поэтому правки во время построения попадают в него;
+        # из снимка берутся только клиенты, которые всё ещё лежат в репозитории
+        self._search_index = ClientSearchIndex(self._describe_client)
+        snapshot = list(self.clients)
+        for start in range(0, len(snapshot), batch_size):
+            for client in snapshot[start:start + batch_size]:
+                if self._phone_index.get(client.Phone) is client:
+                    self._index_client(client)
+            yield True
+
+    @timed('repository.search')
+    def search(self, query, limit=50):
+        if self.loading:
+            return []
+        if self._search_index is None:
+            self._index_steps = self.iter_index_steps(len(self.clients) or 1)
+        if self._index_steps is not None:
+            for _ in self._index_steps:
+                pass
+            self._index_steps = None
+        return [self._phone_index[phone] for phone in self._search_index.search(query, limit)]
+
+    def _describe_client(self, phone):
+        client = self._phone_index[phone]
+        return search_text(client), client.Phone
+
+    def _index_client(self, client):
+        if self._search_index is not None:
+            self._search_index.add(client.Phone, search_text(client), client.Phone)
+
+    def _unindex_client(self, client):
+        if self._search_index is not None:
+            self._search_index.remove(client.Phone, search_text(client), client.Phone)
 
     def get_clients(self):
-        return self.clients
\ No newline at end of file
+        return self.clients
@@ -0,0 +1,223 @@
+import sqlite3
+import sys
+import threading
+
+import common_path
+from client import Client
+from client_file import CorruptFileError
+from client_metrics import count, timed
+from client_repository import ClientRepository
+
+SQLITE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS Client (
+        ClientID INTEGER PRIMARY KEY,
+        LastName TEXT NOT NULL,
+        FirstName TEXT NOT NULL,
+        MiddleName TEXT NOT NULL,
+        Address TEXT NOT NULL,
+        Phone TEXT NOT NULL
+    )""",
+    # Записи журнала ищут строку по телефону, поэтому он уникален, как и в client.json
+    "DROP INDEX IF EXISTS client_phone_idx",
+    "CREATE UNIQUE INDEX IF NOT EXISTS client_phone_key ON Client (Phone)",
+    "CREATE INDEX IF NOT EXISTS client_lastname_idx ON Client (LastName)",
+    "CREATE TABLE IF NOT EXISTS Setting (Name TEXT PRIMARY KEY, Value)",
+]
+
+FIELDS = ('LastName', 'FirstName', 'MiddleName', 'Address', 'Phone')
+INSERT = "INSERT INTO Client (LastName, FirstName, MiddleName, Address, Phone) VALUES (?, ?, ?, ?, ?)"
+# Без AUTOINCREMENT SQLite выдаёт MAX(ClientID) + 1 и после удаления последней строки повторил бы номер
+# из отсортированной части, поэтому номер новой строки всегда больше границы сортировки
+INSERT_AFTER = ("INSERT INTO Client (ClientID, LastName, FirstName, MiddleName, Address, Phone) "
+                "SELECT MAX(COALESCE(MAX(ClientID), 0), ?) + 1, ?, ?, ?, ?, ? FROM Client")
+UPDATE = "UPDATE Client SET LastName = ?, FirstName = ?, MiddleName = ?, Address = ?, Phone = ? WHERE Phone = ?"
+DELETE = "DELETE FROM Client WHERE Phone = ?"
+
+
+def client_row(client):
+    return client.LastName, client.FirstName, client.MiddleName, client.Address, client.Phone
+
+
+def sort_value(value):
+    # Строковый аналог client_repository.sort_key: нулевой байт меньше любого символа,
+    # поэтому строки сравниваются так же, как кортежи
+    folded = value.casefold()
+    return folded.replace('ё', 'е') + '\0' + folded
+
+
+class SqliteClientStore:
+    # Заменяет ClientJournal: записи журнала сразу применяются к таблице, поэтому воспроизводить
+    # и сжимать нечего. Порядок клиентов в списке - порядок ClientID. Сортировка строки не трогает:
+    # запоминаются поле и последний ClientID на момент сортировки, при загрузке строки до него
+    # упорядочиваются по полю, добавленные позже идут за ними. Изменённая после сортировки строка
+    # при следующей загрузке встаёт на место по новому значению
+    record_count = 0
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._lock = threading.Lock()
+        # Пишет поток ClientWriter, читает главный поток при загрузке
+        self.connection = sqlite3.connect(filename, check_same_thread=False, cached_statements=256)
+        self.connection.create_function('sort_value', 1, sort_value, deterministic=True)
+        try:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            with self.connection:
+                for statement in SCHEMA:
+                    self.connection.execute(statement)
+            settings = dict(self.connection.execute("SELECT Name, Value FROM Setting"))
+        except sqlite3.DatabaseError as e:
+            self.connection.close()
+            raise CorruptFileError(f"{filename}: {e}") from e
+        self.sort_field = settings.get('sort_field')
+        if self.sort_field not in FIELDS:
+            self.sort_field = None
+        self.sorted_through = settings.get('sorted_through') or 0
+
+    def count(self):
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM Client").fetchone()[0]
+
+    def iter_batches(self, batch_size):
+        try:
+            with self._lock:
+                if self.sort_field:
+                    cursor = self.connection.execute(
+                        "SELECT LastName, FirstName, MiddleName, Address, Phone FROM Client "
+                        "ORDER BY CASE WHEN ClientID > ? THEN ClientID ELSE 0 END, "
+                        f"sort_value({self.sort_field}), Phone", (self.sorted_through,))
+                else:
+                    cursor = self.connection.execute(
+                        "SELECT LastName, FirstName, MiddleName, Address, Phone FROM Client ORDER BY ClientID")
+            while True:
+                with self._lock:
+                    rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [Client(*row) for row in rows]
+        except sqlite3.DatabaseError as e:
+            raise CorruptFileError(f"{self.filename}: {e}") from e
+
+    def append(self, record):
+        self.extend([record])
+
+    def extend(self, records):
+        try:
+            with self._lock, self.connection:
+                for record in records:
+                    op = record['op']
+                    if op == 'add':
+                        self.connection.execute(INSERT_AFTER, (self.sorted_through,) + client_row(Client.from_dict(record['client'])))
+                    elif op == 'update':
+                        self.connection.execute(UPDATE, client_row(Client.from_dict(record['client'])) + (record['key'],))
+                    elif op == 'delete':
+                        self.connection.execute(DELETE, (record['key'],))
+                    elif op == 'sort':
+                        self._set_sort(record['field'])
+        except sqlite3.Error as e:
+            raise OSError(f"{self.filename}: {e}") from e
+        count('sqlite.writes', len(records))
+
+    def _set_sort(self, field):
+        if field not in FIELDS:
+            raise sqlite3.DataError(f"unknown sort field {field!r}")
+        through = self.connection.execute("SELECT MAX(COALESCE(MAX(ClientID), 0), ?) FROM Client",
+                                          (self.sorted_through,)).fetchone()[0]
+        self.connection.executemany("INSERT OR REPLACE INTO Setting (Name, Value) VALUES (?, ?)",
+                                    [('sort_field', field), ('sorted_through', through)])
+        self.sort_field = field
+        self.sorted_through = through
+
+    def _delete_all(self):
+        self.connection.execute("DELETE FROM Client")
+        self.connection.execute("DELETE FROM Setting WHERE Name IN ('sort_field', 'sorted_through')")
+        self.sort_field = None
+        self.sorted_through = 0
+
+    def replace_all(self, clients):
+        try:
+            with self._lock, self.connection:
+                self._delete_all()
+                self.connection.executemany(INSERT, map(client_row, clients))
+        except sqlite3.Error as e:
+            raise OSError(f"{self.filename}: {e}") from e
+
+    def clear(self):
+        try:
+            with self._lock, self.connection:
+                self._delete_all()
+        except sqlite3.Error as e:
+            raise OSError(f"{self.filename}: {e}") from e
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+
+class SqliteClientRepository(ClientRepository):
+    def __init__(self, filename='client.db', load=True):
+        super().__init__(filename, journal_filename=None, load=False)
+        self.open_error = None
+        try:
+            self.journal = SqliteClientStore(filename)
+        except CorruptFileError as e:
+            # Как и с повреждённым JSON: ошибка покажется при загрузке, репозиторий будет только для чтения
+            self.open_error = e
+        if load:
+            self.load_clients()
+
+    def find_snapshot(self):
+        return None
+
+    def replay_journal(self):
+        pass
+
+    def iter_file_steps(self, batch_size):
+        if self.open_error:
+            raise self.open_error
+        total = self.journal.count()
+        for batch in self.journal.iter_batches(batch_size or total or 1):
+            self.append_loaded(batch)
+            self.load_progress.emit(len(self.clients), total)
+            yield True
+
+    @timed('repository.write')
+    def write_snapshot(self, clients):
+        self.journal.replace_all(clients)
+
+    def commit(self, record):
+        # Каждое изменение - одна строка таблицы, сортировка - одна запись в Setting
+        if self.writer:
+            self.writer.append(record)
+        else:
+            self.journal.append(record)
+
+
+def open_repository(filename):
+    if filename.endswith(SQLITE_SUFFIXES):
+        return SqliteClientRepository(filename, load=False)
+    journal_filename = filename.rsplit('.', 1)[0] + '.journal'
+    return ClientRepository(filename, journal_filename, load=False, snapshot=True)
+
+
+def migrate(source, target):
+    # Однократный перенос client.json (вместе с журналом) в базу SQLite
+    store = SqliteClientStore(target)
+    try:
+        if store.count():
+            raise ValueError(f"{target} already contains clients")
+        repository = ClientRepository(source, source.rsplit('.', 1)[0] + '.journal')
+        if repository.load_error:
+            raise ValueError(repository.load_error)
+        store.replace_all(repository.clients)
+        return len(repository.clients)
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit("usage: python client_sqlite.py client.json client.db")
+    print("Migrated clients:", migrate(sys.argv[1], sys.argv[2]))
@@ -0,0 +1,101 @@
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+COLUMNS = [
+    ('LastName', 'Last Name'),
+    ('FirstName', 'First Name'),
+    ('MiddleName', 'Middle Name'),
+    ('Address', 'Address'),
+    ('Phone', 'Phone'),
+]
+
+
+class ClientTableModel(QAbstractTableModel):
+    def __init__(self, repository, batch_size=200, parent=None):
+        super().__init__(parent)
+        self.repository = repository
+        self.batch_size = batch_size
+        self._fetched = min(batch_size, len(repository.get_clients()))
+        # Сколько строк объявлено в begin*Rows и ждёт сигнала репозитория о завершении изменения
+        self._pending = 0
+
+        self.repository.rows_about_to_be_inserted.connect(self.on_rows_about_to_be_inserted)
+        self.repository.rows_inserted.connect(self.on_rows_inserted)
+        self.repository.rows_about_to_be_removed.connect(self.on_rows_about_to_be_removed)
+        self.repository.rows_removed.connect(self.on_rows_removed)
+        self.repository.rows_changed.connect(self.on_rows_changed)
+        self.repository.rows_about_to_be_reset.connect(self.beginResetModel)
+        self.repository.rows_reset.connect(self.on_rows_reset)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._fetched
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        client = self.repository.get_clients()[index.row()]
+        return getattr(client, COLUMNS[index.column()][0])
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return COLUMNS[section][1]
+        return section + 1
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._fetched < len(self.repository.get_clients())
+
+    def fetchMore(self, parent=QModelIndex()):
+        remaining = len(self.repository.get_clients()) - self._fetched
+        count = min(self.batch_size, remaining)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._fetched, self._fetched + count - 1)
+        self._fetched += count
+        self.endInsertRows()
+
+    def on_rows_about_to_be_inserted(self, first, last):
+        if first > self._fetched:
+            return
+        if first == self._fetched and self.repository.loading:
+            # Пачки загрузки дописываются в конец: показываем их только до первой страницы,
+            # остальное view подгрузит через fetchMore по мере прокрутки
+            last = min(last, max(self._fetched, self.batch_size) - 1)
+            if last < first:
+                return
+        self.beginInsertRows(QModelIndex(), first, last)
+        self._pending = last - first + 1
+
+    def on_rows_inserted(self, first, last):
+        if not self._pending:
+            return
+        self._fetched += self._pending
+        self._pending = 0
+        self.endInsertRows()
+
+    def on_rows_about_to_be_removed(self, first, last):
+        if first >= self._fetched:
+            return
+        last = min(last, self._fetched - 1)
+        self.beginRemoveRows(QModelIndex(), first, last)
+        self._pending = last - first + 1
+
+    def on_rows_removed(self, first, last):
+        if not self._pending:
+            return
+        self._fetched -= self._pending
+        self._pending = 0
+        self.endRemoveRows()
+
+    def on_rows_changed(self, first, last):
+        if first >= self._fetched:
+            return
+        last = min(last, self._fetched - 1)
+        self.dataChanged.emit(self.index(first, 0), self.index(last, len(COLUMNS) - 1))
+
+    def on_rows_reset(self):
+        self._fetched = min(max(self._fetched, self.batch_size), len(self.repository.get_clients()))
+        self.endResetModel()
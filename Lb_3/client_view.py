@@ -1,20 +1,34 @@
 from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QTableWidget, QTableWidgetItem, QVBoxLayout, QWidget, QPushButton, QDialog, QFormLayout, QLineEdit, QLabel, QMessageBox, QHBoxLayout
+    QApplication, QMainWindow, QTableView, QAbstractItemView, QVBoxLayout, QWidget, QPushButton, QDialog, QFormLayout, QLineEdit, QLabel, QMessageBox, QHBoxLayout,
+    QListWidget, QListWidgetItem, QHeaderView
 )
+from PyQt5.QtCore import Qt
 
 class ClientTableView(QMainWindow):
-    def __init__(self, controller):
+    def __init__(self, controller, model):
         super().__init__()
         self.controller = controller
+        self.model = model
         self.initUI()
 
     def initUI(self):
         self.setWindowTitle('Список клиентов')
         self.setGeometry(100, 100, 600, 400)
 
-        self.table = QTableWidget(self)
-        self.table.setColumnCount(2)
-        self.table.setHorizontalHeaderLabels(['Last Name', 'Phone'])
+        self.table = QTableView(self)
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        for column in (1, 2, 3):
+            self.table.setColumnHidden(column, True)
+
+        self.search_edit = QLineEdit(self)
+        self.search_edit.setPlaceholderText('Поиск: фамилия, имя, адрес или последние цифры телефона')
+        self.search_edit.textChanged.connect(self.controller.search_clients)
+
+        self.search_results = QListWidget(self)
+        self.search_results.setVisible(False)
+        self.search_results.itemDoubleClicked.connect(
+            lambda item: self.controller.edit_client_by_phone(item.data(Qt.UserRole)))
 
         self.add_button = QPushButton('Добавить клиента', self)
         self.add_button.clicked.connect(self.controller.show_add_client_dialog)
@@ -27,6 +41,8 @@ class ClientTableView(QMainWindow):
         button_layout.addWidget(self.view_details_button)
 
         layout = QVBoxLayout()
+        layout.addWidget(self.search_edit)
+        layout.addWidget(self.search_results)
         layout.addWidget(self.table)
         layout.addLayout(button_layout)
 
@@ -34,30 +50,69 @@ class ClientTableView(QMainWindow):
         container.setLayout(layout)
         self.setCentralWidget(container)
 
-    def update_table(self, clients):
-        self.table.setRowCount(len(clients))
-        for i, client in enumerate(clients):
-            self.table.setItem(i, 0, QTableWidgetItem(client.LastName))
-            self.table.setItem(i, 1, QTableWidgetItem(client.Phone))
+    def show_search_results(self, clients):
+        self.search_results.clear()
+        for client in clients:
+            item = QListWidgetItem(f'{client.LastName} {client.FirstName} {client.MiddleName}, {client.Address}, {client.Phone}')
+            item.setData(Qt.UserRole, client.Phone)
+            self.search_results.addItem(item)
+        self.search_results.setVisible(bool(self.search_edit.text().strip()))
+
+    def show_save_started(self):
+        self.statusBar().showMessage('Сохранение...')
+
+    def show_save_finished(self, count):
+        self.statusBar().showMessage(f'Сохранено клиентов: {count}', 3000)
+
+    def show_save_failed(self, error):
+        self.statusBar().showMessage(f'Ошибка сохранения: {error}')
+
+    def show_load_progress(self, loaded, total):
+        self.search_edit.setEnabled(False)
+        self.add_button.setEnabled(False)
+        self.view_details_button.setEnabled(False)
+        percent = loaded * 100 // total if total else 100
+        self.statusBar().showMessage(f'Загрузка клиентов: {percent}%')
+
+    def show_load_failed(self, error):
+        QMessageBox.critical(self, 'Ошибка загрузки', f'Файл клиентов повреждён и открыт только для чтения:\n{error}')
+
+    def show_load_finished(self):
+        self.search_edit.setEnabled(True)
+        self.add_button.setEnabled(not self.controller.repository.read_only)
+        self.view_details_button.setEnabled(True)
+        self.statusBar().showMessage(f'Загружено клиентов: {len(self.controller.repository.get_clients())}', 3000)
 
 class AllClientDetailsDialog(QDialog):
-    def __init__(self, clients, controller, parent=None):
+    # Отчество и адрес показываются по кнопке: у скрытых столбцов представление не запрашивает данные
+    DETAIL_COLUMNS = (2, 3)
+
+    def __init__(self, model, controller, parent=None):
         super().__init__(parent)
-        self.clients = clients
+        self.model = model
         self.controller = controller
+        self.setAttribute(Qt.WA_DeleteOnClose)
         self.initUI()
-
-        self.controller.repository.clients_updated.connect(self.update_table)
+        self.finished.connect(self.detach)
 
     def initUI(self):
         self.setWindowTitle('Детальная информация')
         self.setGeometry(100, 100, 600, 400)
 
-        self.table = QTableWidget(self)
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels(['Last Name', 'First Name', 'Middle Name', 'Address', 'Phone'])
-
-        self.update_table(self.clients)
+        self.table = QTableView(self)
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setWordWrap(False)
+        # Строки одной высоты: представлению не нужно измерять их, и открытие не зависит от числа клиентов
+        rows = self.table.verticalHeader()
+        rows.setSectionResizeMode(QHeaderView.Fixed)
+        rows.setDefaultSectionSize(self.fontMetrics().height() + 8)
+        for column in self.DETAIL_COLUMNS:
+            self.table.setColumnHidden(column, True)
+
+        self.details_button = QPushButton('Показать отчество и адрес', self)
+        self.details_button.setCheckable(True)
+        self.details_button.toggled.connect(self.show_details)
 
         self.edit_button = QPushButton('Изменить клиента', self)
         self.edit_button.clicked.connect(self.edit_selected_client)
@@ -72,6 +127,7 @@ class AllClientDetailsDialog(QDialog):
         self.sort_phone_button.clicked.connect(lambda: self.controller.sort_clients('Phone'))
 
         button_layout = QHBoxLayout()
+        button_layout.addWidget(self.details_button)
         button_layout.addWidget(self.edit_button)
         button_layout.addWidget(self.delete_button)
         button_layout.addWidget(self.sort_last_name_button)
@@ -83,26 +139,24 @@ class AllClientDetailsDialog(QDialog):
 
         self.setLayout(layout)
 
-    def update_table(self, clients=None):
-        if clients is None:
-            clients = self.controller.repository.get_clients()
-        self.table.setRowCount(len(clients))
-        for i, client in enumerate(clients):
-            self.table.setItem(i, 0, QTableWidgetItem(client.LastName))
-            self.table.setItem(i, 1, QTableWidgetItem(client.FirstName))
-            self.table.setItem(i, 2, QTableWidgetItem(client.MiddleName))
-            self.table.setItem(i, 3, QTableWidgetItem(client.Address))
-            self.table.setItem(i, 4, QTableWidgetItem(client.Phone))
+    def show_details(self, shown):
+        for column in self.DETAIL_COLUMNS:
+            self.table.setColumnHidden(column, not shown)
+        self.details_button.setText('Скрыть отчество и адрес' if shown else 'Показать отчество и адрес')
+
+    def detach(self):
+        # Модель общая с главным окном: закрытый диалог не должен получать её сигналы
+        self.table.setModel(None)
 
     def edit_selected_client(self):
-        selected_row = self.table.currentRow()
+        selected_row = self.table.currentIndex().row()
         if selected_row >= 0:
             self.controller.show_edit_client_dialog(selected_row)
         else:
             QMessageBox.warning(self, 'Клиент не выбран', 'Выберите клиента для изменения')
 
     def delete_selected_client(self):
-        selected_row = self.table.currentRow()
+        selected_row = self.table.currentIndex().row()
         if selected_row >= 0:
             self.controller.delete_client(selected_row)
         else:
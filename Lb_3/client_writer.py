@@ -0,0 +1,61 @@
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+import threading
+
+
+class ClientWriter(QObject):
+    save_started = pyqtSignal()
+    save_finished = pyqtSignal(int)
+    save_failed = pyqtSignal(str)
+    _wake = pyqtSignal()
+
+    def __init__(self, write_snapshot, journal=None):
+        super().__init__()
+        self.write_snapshot = write_snapshot
+        self.journal = journal
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._records = []
+        self._thread = QThread()
+        self.moveToThread(self._thread)
+        self._wake.connect(self._process)
+        self._thread.start()
+
+    def append(self, record):
+        with self._lock:
+            self._records.append(record)
+        self._wake.emit()
+
+    def save(self, clients):
+        # Снимок покрывает все изменения до этого момента, поэтому ещё не записанные
+        # записи журнала больше не нужны
+        with self._lock:
+            self._snapshot = clients
+            self._records = []
+        self._wake.emit()
+
+    def _process(self):
+        with self._lock:
+            snapshot, records = self._snapshot, self._records
+            self._snapshot, self._records = None, []
+        if snapshot is None and not records:
+            return
+        try:
+            if snapshot is not None:
+                self.save_started.emit()
+                self.write_snapshot(snapshot)
+            if records:
+                self.journal.extend(records)
+        except OSError as e:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = snapshot
+                    self._records[:0] = records
+            self.save_failed.emit(str(e))
+            return
+        if snapshot is not None:
+            self.save_finished.emit(len(snapshot))
+
+    def close(self):
+        self._thread.quit()
+        self._thread.wait()
+        self._process()
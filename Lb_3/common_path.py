@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Модули, общие для всех лабораторных (client_file, client_metrics, client_search, client_snapshot,
+# client_stream, client_validation), лежат в каталоге common в корне репозитория
+COMMON_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+if COMMON_DIR not in sys.path:
+    sys.path.append(COMMON_DIR)
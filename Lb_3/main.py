@@ -1,9 +1,14 @@
 import sys
 from PyQt5.QtWidgets import QApplication
+import common_path
 from client_controller import ClientController
+from client_metrics import start_profiling
 
 if __name__ == '__main__':
+    start_profiling()
     app = QApplication(sys.argv)
-    controller = ClientController()
+    arguments = app.arguments()
+    controller = ClientController(arguments[1] if len(arguments) > 1 else 'client.json')
+    app.aboutToQuit.connect(controller.shutdown)
     controller.run()
     sys.exit(app.exec_())
\ No newline at end of file
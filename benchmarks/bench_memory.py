@@ -0,0 +1,80 @@
+import argparse
+import os
+import sys
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.dirname(os.path.abspath(__file__)), os.path.join(ROOT, 'Lb_2'), os.path.join(ROOT, 'Lb_3')]
+
+from client_data import generate_clients
+from client import Client as Lb3Client
+from Client import Client as Lb2Client
+
+
+class DictClient:
+    def __init__(self, LastName, FirstName, MiddleName, Address, Phone):
+        self.LastName = LastName
+        self.FirstName = FirstName
+        self.MiddleName = MiddleName
+        self.Address = Address
+        self.Phone = Phone
+
+
+def fresh(record):
+    # Строки из генератора общие между записями; копируем их, как это делает json.load
+    return {key: ''.join(list(value)) for key, value in record.items()}
+
+
+def build_dict_clients(records):
+    return [DictClient(**r) for r in records]
+
+
+def build_lb3_clients(records):
+    return [Lb3Client(**r) for r in records]
+
+
+def build_lb2_clients(records):
+    return [Lb2Client(i, r['LastName'], r['FirstName'], r['MiddleName'], r['Address'], r['Phone'])
+            for i, r in enumerate(records, 1)]
+
+
+def build_columns(records):
+    columns = {key: [] for key in ('LastName', 'FirstName', 'MiddleName', 'Address', 'Phone')}
+    for r in records:
+        for key, column in columns.items():
+            value = r[key]
+            column.append(sys.intern(value) if key in ('LastName', 'FirstName', 'MiddleName') else value)
+    return columns
+
+
+LAYOUTS = [
+    ('dict-backed (before)', build_dict_clients),
+    ('Lb_3 Client (__slots__ + intern)', build_lb3_clients),
+    ('Lb_2 Client (__slots__ + intern)', build_lb2_clients),
+    ('columns (reference)', build_columns),
+]
+
+
+def measure(builder, count):
+    records = (fresh(r) for r in generate_clients(count))
+    tracemalloc.start()
+    data = builder(records)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del data
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-client memory footprint of the client classes")
+    parser.add_argument('-n', '--count', type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"{'layout':<36}{'bytes/client':>14}{'total MB':>12}")
+    for name, builder in LAYOUTS:
+        total = measure(builder, args.count)
+        print(f"{name:<36}{total / args.count:>14.1f}{total / 2 ** 20:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
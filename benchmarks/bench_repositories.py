@@ -0,0 +1,329 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from client_data import generate_clients
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+# Лабораторные лежат отдельно и содержат одноимённые модули (client_stream, client_file...),
+# поэтому каждый замер идёт в своём процессе, где в sys.path только одна из них
+BACKENDS = {
+    'lb3': 'Lb_3',
+    'json': 'Lb_2',
+    'yaml': 'Lb_2',
+    'sqlite': 'Lb_2',
+    'db': 'Lb_2',
+}
+DEFAULT_BACKENDS = ['lb3', 'json', 'yaml', 'sqlite']
+READ_OPERATIONS = ['get_client_by_id', 'get_k_n_short_list', 'sort_by_field']
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(timings, elapsed):
+    timings.sort()
+    return {
+        'count': len(timings),
+        'mean_ms': sum(timings) / len(timings) * 1000,
+        'p50_ms': percentile(timings, 0.50) * 1000,
+        'p95_ms': percentile(timings, 0.95) * 1000,
+        'p99_ms': percentile(timings, 0.99) * 1000,
+        'max_ms': timings[-1] * 1000,
+        'ops_per_s': len(timings) / elapsed if elapsed else None,
+    }
+
+
+def measure(operation, ops, max_seconds):
+    timings = []
+    started = time.perf_counter()
+    for i in range(ops):
+        start = time.perf_counter()
+        operation(i)
+        timings.append(time.perf_counter() - start)
+        if time.perf_counter() - started > max_seconds:
+            break
+    return summarize(timings, time.perf_counter() - started)
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS - байты
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+class Lb3Backend:
+    def __init__(self, directory, scale, options):
+        from client_repository import ClientRepository
+        from client import Client
+        self.Client = Client
+        self.make = lambda: ClientRepository(os.path.join(directory, 'client.json'),
+                                             os.path.join(directory, 'client.journal'))
+        repository = ClientRepository(os.path.join(directory, 'client.json'), None, load=False)
+        repository.clients = [Client(**r) for r in generate_clients(scale)]
+        repository.save_clients()
+        self.repository = None
+
+    def load(self):
+        self.repository = self.make()
+
+    def save(self):
+        self.repository.save_clients()
+
+    def client_count(self):
+        return len(self.repository.clients)
+
+    def get_client_by_id(self, rnd):
+        # В Lb_3 нет числовых ID, клиента однозначно определяет телефон
+        self.repository.get_client_by_phone(rnd.choice(self.repository.clients).Phone)
+
+    def get_k_n_short_list(self, rnd):
+        n = 20
+        k = rnd.randrange(max(1, len(self.repository.clients) // n))
+        [(c.LastName, c.Phone) for c in self.repository.clients[k * n:(k + 1) * n]]
+
+    def sort_by_field(self, rnd):
+        self.repository.sort_by_field(rnd.choice(['LastName', 'Phone']))
+
+    def add_client(self, record):
+        self.repository.add_client(self.Client(**record))
+
+    def update_client(self, rnd, record):
+        self.repository.update_client(rnd.randrange(len(self.repository.clients)), self.Client(**record))
+
+    def delete_client(self, rnd):
+        self.repository.delete_client(rnd.randrange(len(self.repository.clients)))
+
+
+class Lb2Backend:
+    def __init__(self, directory, scale, options):
+        import Client
+        self.rep_class = Client.Client_rep_yaml if options.backend == 'yaml' else Client.Client_rep_json
+        self.path = os.path.join(directory, 'clients.yaml' if options.backend == 'yaml' else 'clients.json')
+        rep = self.rep_class(self.path)
+        rep.add_clients(list(generate_clients(scale)), save=False)
+        rep.save_data()
+        self.rep = None
+
+    def load(self):
+        self.rep = self.rep_class(self.path)
+
+    def save(self):
+        self.rep.save_data()
+
+    def client_count(self):
+        return self.rep.get_count()
+
+    def random_id(self, rnd):
+        return rnd.choice(self.rep.clients)._client_id
+
+    def get_client_by_id(self, rnd):
+        self.rep.get_client_by_id(self.random_id(rnd))
+
+    def get_k_n_short_list(self, rnd):
+        n = 20
+        self.rep.get_k_n_short_list(rnd.randrange(1, max(2, self.client_count() // n)), n)
+
+    def sort_by_field(self, rnd):
+        self.rep.sort_by_field(rnd.choice(['last_name', 'phone']))
+
+    def add_client(self, record):
+        self.rep.add_client(record['LastName'], record['FirstName'], record['MiddleName'], record['Address'], record['Phone'])
+
+    def update_client(self, rnd, record):
+        self.rep.update_client(self.random_id(rnd), record['LastName'], record['FirstName'], record['MiddleName'],
+                               record['Address'], record['Phone'])
+
+    def delete_client(self, rnd):
+        self.rep.delete_client(self.random_id(rnd))
+
+
+class DBBackend(Lb2Backend):
+    def __init__(self, directory, scale, options):
+        import Client
+        self.connector = Client.DatabaseConnector.get_instance(
+            options.db_host, options.db_user, options.db_password, options.db_database, options.db_port)
+        if not self.connector.connected:
+            raise RuntimeError("cannot connect to the benchmark database")
+        self.rep = Client.ClientRepDBAdapter(self.connector)
+        self.rep.db_rep.initialize_db()
+        self.connector.execute_query("TRUNCATE Client RESTART IDENTITY")
+        self.rep.add_clients(list(generate_clients(scale)))
+        self.ids = list(range(1, scale + 1))
+
+    def load(self):
+        self.rep.clients = self.rep.get_all_clients()
+
+    save = None
+
+    def client_count(self):
+        return len(self.ids)
+
+    def random_id(self, rnd):
+        return rnd.choice(self.ids)
+
+    def delete_client(self, rnd):
+        client_id = self.ids.pop(rnd.randrange(len(self.ids)))
+        self.rep.delete_client(client_id)
+
+    def add_client(self, record):
+        client = self.rep.add_client(record['LastName'], record['FirstName'], record['MiddleName'], record['Address'], record['Phone'])
+        if client:
+            self.ids.append(client._client_id)
+
+
+class SqliteBackend(DBBackend):
+    def __init__(self, directory, scale, options):
+        import Client
+        self.rep = Client.Client_rep_sqlite(os.path.join(directory, 'clients.db'))
+        self.rep.add_clients(list(generate_clients(scale)))
+        self.ids = list(range(1, scale + 1))
+
+
+def unique_records(scale, count):
+    # Телефоны новых клиентов не должны совпадать с уже сгенерированными
+    for i, record in enumerate(generate_clients(count, seed=7)):
+        record['Phone'] = f"+8{scale + i:010d}"
+        yield record
+
+
+def run_backend(options):
+    sys.path.insert(0, os.path.join(ROOT, BACKENDS[options.backend]))
+    backend_class = {'lb3': Lb3Backend, 'sqlite': SqliteBackend, 'db': DBBackend}.get(options.backend, Lb2Backend)
+    rnd = random.Random(options.seed)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='client-bench-') as directory:
+        backend = backend_class(directory, options.scale, options)
+        results['load'] = measure(lambda i: backend.load(), options.load_repeat, options.max_seconds)
+        if backend.save:
+            results['save'] = measure(lambda i: backend.save(), options.load_repeat, options.max_seconds)
+        for name in READ_OPERATIONS:
+            operation = getattr(backend, name)
+            results[name] = measure(lambda i: operation(rnd), options.ops, options.max_seconds)
+        records = list(unique_records(options.scale, options.ops * 2))
+        results['update_client'] = measure(lambda i: backend.update_client(rnd, records[i]), options.ops, options.max_seconds)
+        results['add_client'] = measure(lambda i: backend.add_client(records[options.ops + i]), options.ops, options.max_seconds)
+        results['delete_client'] = measure(lambda i: backend.delete_client(rnd), options.ops, options.max_seconds)
+        clients = backend.client_count()
+    return {
+        'backend': options.backend,
+        'scale': options.scale,
+        'clients_after': clients,
+        'peak_rss_mb': peak_rss_mb(),
+        'operations': results,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    print(f"{'backend':<6}{'scale':>9}  {'operation':<20}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>11}")
+    for result in results:
+        for name, stats in result['operations'].items():
+            print(f"{result['backend']:<6}{result['scale']:>9}  {name:<20}{stats['count']:>6}{stats['p50_ms']:>10.3f}"
+                  f"{stats['p95_ms']:>10.3f}{stats['p99_ms']:>10.3f}{stats['ops_per_s']:>11.1f}")
+        if result['peak_rss_mb'] is not None:
+            print(f"{result['backend']:<6}{result['scale']:>9}  peak RSS {result['peak_rss_mb']:.1f} MB")
+
+
+def compare(base_path, new_path):
+    with open(base_path, encoding='utf-8') as f:
+        base = {(r['backend'], r['scale']): r for r in json.load(f)['results']}
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)['results']
+    print(f"{'backend':<6}{'scale':>9}  {'operation':<20}{'base p50':>10}{'new p50':>10}{'change':>9}")
+    for result in new:
+        old = base.get((result['backend'], result['scale']))
+        if not old:
+            continue
+        for name, stats in result['operations'].items():
+            before = old['operations'].get(name)
+            if not before:
+                continue
+            change = (stats['p50_ms'] / before['p50_ms'] - 1) * 100 if before['p50_ms'] else 0
+            print(f"{result['backend']:<6}{result['scale']:>9}  {name:<20}{before['p50_ms']:>10.3f}"
+                  f"{stats['p50_ms']:>10.3f}{change:>+8.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency, throughput and memory of the client repository backends")
+    parser.add_argument('-b', '--backends', nargs='+', choices=list(BACKENDS), default=DEFAULT_BACKENDS)
+    parser.add_argument('-s', '--scales', type=int, nargs='+', default=[1000, 100000],
+                        help="number of clients, e.g. 1000 100000 1000000")
+    parser.add_argument('--ops', type=int, default=200, help="samples per operation")
+    parser.add_argument('--load-repeat', type=int, default=3, help="samples for load and save")
+    parser.add_argument('--max-seconds', type=float, default=30, help="time budget per operation")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('-o', '--output', help="write results as JSON to this file")
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help="compare two result files and exit")
+    db = parser.add_argument_group("PostgreSQL (the Client table of this database is truncated, use a scratch database)")
+    db.add_argument('--db-host', default='localhost')
+    db.add_argument('--db-port', type=int, default=5432)
+    db.add_argument('--db-user', default='postgres')
+    db.add_argument('--db-password', default='')
+    db.add_argument('--db-database', default='client_bench')
+    parser.add_argument('--run', nargs=2, metavar=('BACKEND', 'SCALE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.run:
+        args.backend, args.scale = args.run[0], int(args.run[1])
+        print(json.dumps(run_backend(args)))
+        return
+
+    passthrough = ['--ops', str(args.ops), '--load-repeat', str(args.load_repeat), '--max-seconds', str(args.max_seconds),
+                   '--seed', str(args.seed), '--db-host', args.db_host, '--db-port', str(args.db_port),
+                   '--db-user', args.db_user, '--db-password', args.db_password, '--db-database', args.db_database]
+    results = []
+    for scale in args.scales:
+        for backend in args.backends:
+            process = subprocess.run([sys.executable, __file__, '--run', backend, str(scale)] + passthrough,
+                                     capture_output=True, text=True)
+            if process.returncode != 0:
+                print(f"{backend} @ {scale}: failed\n{process.stderr.strip().splitlines()[-1] if process.stderr else ''}")
+                continue
+            result = json.loads(process.stdout.strip().splitlines()[-1])
+            results.append(result)
+            print_results([result])
+
+    if args.output:
+        report = {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'settings': {'ops': args.ops, 'load_repeat': args.load_repeat, 'max_seconds': args.max_seconds, 'seed': args.seed},
+            'results': results,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.dirname(os.path.abspath(__file__)), os.path.join(ROOT, 'Lb_2')]
+
+from client_data import generate_clients
+
+FORMATS = {
+    'json': ('Client_rep_json', 'clients.json', False),
+    'jsonl': ('Client_rep_json', 'clients.jsonl', False),
+    'yaml': ('Client_rep_yaml', 'clients.yaml', False),
+    'snapshot': ('Client_rep_json', 'snapshot.json', True),
+}
+
+
+def lb2_records(count):
+    for r in generate_clients(count):
+        yield {'LastName': r['LastName'], 'FirstName': r['FirstName'], 'MiddleName': r['MiddleName'],
+               'Address': r['Address'], 'Phone': r['Phone']}
+
+
+def prepare(directory, fmt, count):
+    import Client
+    class_name, filename, snapshot = FORMATS[fmt]
+    path = os.path.join(directory, f"{count}-{filename}")
+    if not os.path.exists(path):
+        rep = getattr(Client, class_name)(path, snapshot=snapshot)
+        rep.add_clients(list(lb2_records(count)), save=False)
+        rep.save_data()
+    return path
+
+
+def load(fmt, path):
+    # Запускается в отдельном процессе, чтобы каждый замер начинался с «холодного» интерпретатора
+    start = time.perf_counter()
+    import Client
+    imported = time.perf_counter()
+    rep = getattr(Client, FORMATS[fmt][0])(path)
+    loaded = time.perf_counter()
+    print(json.dumps({'import': imported - start, 'load': loaded - imported, 'clients': len(rep.clients),
+                      'snapshot': rep.use_snapshot}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start load time of the Lb_2 file repositories per storage format")
+    parser.add_argument('-n', '--count', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('-f', '--formats', nargs='+', choices=list(FORMATS), default=list(FORMATS))
+    parser.add_argument('-r', '--repeat', type=int, default=3)
+    parser.add_argument('-d', '--dir', help="directory for the generated files (kept between runs)")
+    parser.add_argument('--load', nargs=2, metavar=('FORMAT', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.load:
+        load(*args.load)
+        return
+
+    directory = args.dir or tempfile.mkdtemp(prefix='client-bench-')
+    os.makedirs(directory, exist_ok=True)
+    print(f"files: {directory}")
+    print(f"{'format':<10}{'clients':>10}{'size MB':>10}{'best s':>10}{'median s':>10}")
+    for count in args.count:
+        for fmt in args.formats:
+            path = prepare(directory, fmt, count)
+            size = os.path.getsize(path + '.snap' if FORMATS[fmt][2] else path)
+            timings = []
+            for _ in range(args.repeat):
+                output = subprocess.run([sys.executable, __file__, '--load', fmt, path],
+                                        check=True, capture_output=True, text=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                if result['clients'] != count or result['snapshot'] != FORMATS[fmt][2]:
+                    raise RuntimeError(f"{fmt}: unexpected load result {result}")
+                timings.append(result['load'])
+            timings.sort()
+            print(f"{fmt:<10}{count:>10}{size / 2 ** 20:>10.1f}{timings[0]:>10.2f}{timings[len(timings) // 2]:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
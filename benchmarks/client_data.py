@@ -0,0 +1,31 @@
+import random
+
+LAST_NAMES = [
+    'Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Петров', 'Соколов', 'Михайлов',
+    'Новиков', 'Фёдоров', 'Морозов', 'Волков', 'Алексеев', 'Лебедев', 'Семёнов', 'Егоров',
+    'Павлов', 'Козлов', 'Степанов', 'Николаев', 'Орлов', 'Андреев', 'Макаров', 'Никитин',
+    'Захаров', 'Зайцев', 'Соловьёв', 'Борисов', 'Яковлев', 'Григорьев', 'Романов', 'Воробьёв',
+]
+FIRST_NAMES = [
+    'Александр', 'Дмитрий', 'Максим', 'Сергей', 'Андрей', 'Алексей', 'Артём', 'Илья',
+    'Кирилл', 'Михаил', 'Никита', 'Матвей', 'Роман', 'Егор', 'Арсений', 'Иван',
+]
+PATRONYMICS = [
+    'Александрович', 'Дмитриевич', 'Сергеевич', 'Андреевич', 'Алексеевич', 'Михайлович',
+    'Иванович', 'Николаевич', 'Владимирович', 'Петрович', 'Юрьевич', 'Викторович',
+]
+CITIES = ['Москва', 'Санкт-Петербург', 'Новосибирск', 'Екатеринбург', 'Казань', 'Тверь', 'Самара']
+STREETS = ['Ленина', 'Пушкина', 'Гагарина', 'Мира', 'Советская', 'Садовая', 'Лесная', 'Школьная']
+
+
+def generate_clients(count, seed=42):
+    rnd = random.Random(seed)
+    phones = rnd.sample(range(10 ** 10), count)
+    for i in range(count):
+        yield {
+            'LastName': rnd.choice(LAST_NAMES),
+            'FirstName': rnd.choice(FIRST_NAMES),
+            'MiddleName': rnd.choice(PATRONYMICS),
+            'Address': f"г. {rnd.choice(CITIES)}, ул. {rnd.choice(STREETS)}, д. {rnd.randint(1, 150)}, кв. {rnd.randint(1, 300)}",
+            'Phone': f"+7{phones[i]:010d}",
+        }
@@ -0,0 +1,189 @@
+import codecs
+import gc
+import hashlib
+import io
+import os
+import re
+import stat
+import tempfile
+from contextlib import contextmanager
+
+from client_metrics import count
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+HEADER_RE = re.compile(rb'^(?:\{"sha256": "|# sha256: )([0-9a-f]{64})')
+PLACEHOLDER = '0' * 64
+# Узнать umask можно только установив новый. Делается один раз при импорте, а не при каждой записи,
+# чтобы не менять его на время, пока другие потоки создают файлы
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+class CorruptFileError(ValueError):
+    pass
+
+
+def checksum_format(path):
+    if path.endswith('.jsonl'):
+        return '{{"sha256": "{}"}}\n', ''
+    if path.endswith(('.yaml', '.yml')):
+        return '# sha256: {}\n', ''
+    return '{{"sha256": "{}", "clients":\n', '\n}\n'
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    with open(path + '.lock', 'a+b') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def atomic_write_binary(path, write):
+    directory = os.path.dirname(os.path.abspath(path))
+    with file_lock(path):
+        fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+        try:
+            with open(fd, 'w+b') as raw:
+                result = write(raw)
+                raw.flush()
+                os.fsync(raw.fileno())
+                count('file.write_bytes', os.fstat(raw.fileno()).st_size)
+            # mkstemp создаёт файл с правами 0600; новый файл получает те же права, что дал бы open()
+            try:
+                mode = stat.S_IMODE(os.stat(path).st_mode)
+            except FileNotFoundError:
+                mode = 0o666 & ~UMASK
+            os.chmod(temp_path, mode)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    return result
+
+
+def atomic_write(path, write_body):
+    header, footer = checksum_format(path)
+
+    def write(raw):
+        placeholder = header.format(PLACEHOLDER).encode('utf-8')
+        raw.write(placeholder)
+        text = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+        write_body(text)
+        text.write(footer)
+        text.flush()
+        text.detach()
+
+        # Контрольная сумма считается по всему, что идёт после строки заголовка
+        raw.seek(len(placeholder))
+        sha256 = hashlib.sha256()
+        for chunk in iter(lambda: raw.read(1 << 16), b''):
+            sha256.update(chunk)
+        raw.seek(0)
+        raw.write(header.format(sha256.hexdigest()).encode('utf-8'))
+        return sha256.hexdigest()
+
+    return atomic_write_binary(path, write)
+
+
+def read_checksum(path):
+    try:
+        with open(path, 'rb') as raw:
+            match = HEADER_RE.match(raw.readline())
+    except FileNotFoundError:
+        return None
+    return match.group(1).decode('ascii') if match else None
+
+
+class ChecksumReader:
+    def __init__(self, raw, pending=b'', chunk_size=65536):
+        self.raw = raw
+        self.chunk_size = chunk_size
+        self.sha256 = hashlib.sha256()
+        self._pending = pending
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+
+    def read(self, size=-1):
+        while True:
+            if self._pending:
+                data, self._pending = self._pending, b''
+            else:
+                data = self.raw.read(size if size and size > 0 else self.chunk_size)
+            self.sha256.update(data)
+            text = self._decoder.decode(data, final=not data)
+            if text or not data:
+                return text
+
+    def __iter__(self):
+        rest = ''
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                break
+            lines = (rest + chunk).split('\n')
+            rest = lines.pop()
+            for line in lines:
+                yield line + '\n'
+        if rest:
+            yield rest
+
+    def drain(self):
+        while self.read(self.chunk_size):
+            pass
+
+    def tell(self):
+        return self.raw.tell()
+
+    def fileno(self):
+        return self.raw.fileno()
+
+
+@contextmanager
+def open_checked(path):
+    with file_lock(path, shared=True), open(path, 'rb') as raw:
+        first_line = raw.readline()
+        match = HEADER_RE.match(first_line)
+        # Файлы старого формата без заголовка читаются как есть, без проверки
+        reader = ChecksumReader(raw, b'' if match else first_line)
+        yield reader
+        count('file.read_bytes', raw.tell())
+        if match:
+            reader.drain()
+            if reader.sha256.hexdigest() != match.group(1).decode('ascii'):
+                raise CorruptFileError(f"{path}: checksum mismatch, the file is damaged")
+
+
+@contextmanager
+def paused_gc():
+    # При массовой загрузке сборщик мусора раз за разом обходит уже созданных клиентов
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
@@ -0,0 +1,215 @@
+import atexit
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger('client.metrics')
+
+# CLIENT_METRICS=registry | log | prometheus:<файл>, можно несколько через запятую.
+# Без переменной декораторы возвращают исходные функции и ничего не стоят
+METRICS_SPEC = os.environ.get('CLIENT_METRICS', '').strip()
+ENABLED = METRICS_SPEC not in ('', '0')
+SLOW_QUERY_SECONDS = float(os.environ.get('CLIENT_SLOW_QUERY_MS', '200')) / 1000
+PROFILE_SPEC = os.environ.get('CLIENT_PROFILE', '').strip()
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.timers = {}
+        self.sinks = []
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        with self._lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                self.timers[name] = [1, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                if seconds > timer[2]:
+                    timer[2] = seconds
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'timers': {name: {'count': count, 'total': total, 'max': longest}
+                           for name, (count, total, longest) in self.timers.items()},
+            }
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.timers = {}
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def flush(self):
+        data = self.snapshot()
+        for sink in self.sinks:
+            try:
+                sink.export(data)
+            except OSError as e:
+                logger.error("Cannot export metrics: %s", e)
+
+
+class LogSink:
+    def __init__(self, log=logger):
+        self.log = log
+
+    def export(self, data):
+        for name, value in data['counters'].items():
+            self.log.info(json.dumps({'metric': name, 'type': 'counter', 'value': value}))
+        for name, timer in data['timers'].items():
+            self.log.info(json.dumps({'metric': name, 'type': 'timer', **timer}))
+
+
+class PrometheusFileSink:
+    def __init__(self, path, prefix='client'):
+        self.path = path
+        self.prefix = prefix
+
+    @staticmethod
+    def _label(name):
+        return name.replace('\\', '\\\\').replace('"', '\\"')
+
+    def export(self, data):
+        lines = [f"# TYPE {self.prefix}_events_total counter"]
+        for name, value in sorted(data['counters'].items()):
+            lines.append(f'{self.prefix}_events_total{{name="{self._label(name)}"}} {value}')
+        lines.append(f"# TYPE {self.prefix}_operation_seconds summary")
+        for name, timer in sorted(data['timers'].items()):
+            label = self._label(name)
+            lines.append(f'{self.prefix}_operation_seconds_count{{operation="{label}"}} {timer["count"]}')
+            lines.append(f'{self.prefix}_operation_seconds_sum{{operation="{label}"}} {timer["total"]:.6f}')
+        lines.append(f"# TYPE {self.prefix}_operation_seconds_max gauge")
+        for name, timer in sorted(data['timers'].items()):
+            lines.append(f'{self.prefix}_operation_seconds_max{{operation="{self._label(name)}"}} {timer["max"]:.6f}')
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+        os.replace(temp_path, self.path)
+
+
+metrics = Metrics()
+
+
+def configure(spec):
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        kind, _, argument = item.partition(':')
+        if kind == 'log':
+            if not logging.getLogger().handlers:
+                logging.basicConfig(level=logging.INFO, format='%(message)s')
+            metrics.add_sink(LogSink())
+        elif kind == 'prometheus':
+            metrics.add_sink(PrometheusFileSink(argument or 'client_metrics.prom'))
+        elif kind not in ('1', 'registry'):
+            logger.warning("Unknown metrics sink %r", item)
+    if metrics.sinks:
+        atexit.register(metrics.flush)
+
+
+def timed(name):
+    def decorate(func):
+        if not ENABLED:
+            return func
+
+        if inspect.iscoroutinefunction(func):
+            # Для корутины время считается до её завершения, а не до создания объекта корутины
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    metrics.observe(name, time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def timer(name):
+    return metrics.timer(name) if ENABLED else nullcontext()
+
+
+def count(name, value=1):
+    if ENABLED:
+        metrics.increment(name, value)
+
+
+def observe(name, seconds):
+    if ENABLED:
+        metrics.observe(name, seconds)
+
+
+def observe_query(query, seconds):
+    if seconds >= SLOW_QUERY_SECONDS:
+        logger.warning(json.dumps({'event': 'slow_query', 'seconds': round(seconds, 6), 'query': ' '.join(query.split())},
+                                  ensure_ascii=False))
+    if ENABLED:
+        statement = query.split(None, 1)[0].upper() if query.strip() else 'EMPTY'
+        metrics.observe(f'db.query.{statement}', seconds)
+        if seconds >= SLOW_QUERY_SECONDS:
+            metrics.increment('db.slow_queries')
+
+
+def start_profiling(spec=PROFILE_SPEC):
+    # CLIENT_PROFILE=cpu[:файл.prof] или memory[:файл.txt]; результат пишется при выходе
+    mode, _, path = spec.partition(':')
+    if mode == 'cpu':
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        def stop():
+            profiler.disable()
+            profiler.dump_stats(path or 'client.prof')
+            logger.info("CPU profile written to %s", path or 'client.prof')
+        atexit.register(stop)
+    elif mode == 'memory':
+        import tracemalloc
+        tracemalloc.start(25)
+
+        def stop():
+            top = tracemalloc.take_snapshot().statistics('lineno')[:30]
+            current, peak = tracemalloc.get_traced_memory()
+            with open(path or 'client_memory.txt', 'w', encoding='utf-8') as file:
+                file.write(f"current {current / 2 ** 20:.1f} MB, peak {peak / 2 ** 20:.1f} MB\n")
+                file.writelines(f"{stat}\n" for stat in top)
+            tracemalloc.stop()
+            logger.info("Memory profile written to %s", path or 'client_memory.txt')
+        atexit.register(stop)
+    elif mode:
+        logger.warning("Unknown profiling mode %r", spec)
+
+
+if ENABLED:
+    configure(METRICS_SPEC)
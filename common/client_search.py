@@ -0,0 +1,140 @@
+import bisect
+import heapq
+import re
+
+WORD_RE = re.compile(r'\w+')
+NON_DIGIT_RE = re.compile(r'\D')
+
+
+def normalize(text):
+    return text.casefold().replace('ё', 'е')
+
+
+def phone_digits(phone):
+    return NON_DIGIT_RE.sub('', phone)
+
+
+class ClientSearchIndex:
+    def __init__(self, describe, suffix_length=4, verify_threshold=1000):
+        self.describe = describe
+        self.suffix_length = suffix_length
+        self.verify_threshold = verify_threshold
+        self._postings = {}
+        self._vocabulary = []
+        self._phones = {}
+
+    def clear(self):
+        self._postings = {}
+        self._vocabulary = []
+        self._phones = {}
+
+    def add(self, key, text, phone):
+        for token in set(WORD_RE.findall(normalize(text))):
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = []
+                bisect.insort(self._vocabulary, token)
+            postings.append(key)
+        digits = phone_digits(phone)
+        self._phones.setdefault(digits[-self.suffix_length:], []).append((digits, key))
+
+    def remove(self, key, text, phone):
+        for token in set(WORD_RE.findall(normalize(text))):
+            postings = self._postings.get(token)
+            if postings and key in postings:
+                postings.remove(key)
+                if not postings:
+                    del self._postings[token]
+                    del self._vocabulary[bisect.bisect_left(self._vocabulary, token)]
+        digits = phone_digits(phone)
+        bucket = self._phones.get(digits[-self.suffix_length:])
+        if bucket and (digits, key) in bucket:
+            bucket.remove((digits, key))
+            if not bucket:
+                del self._phones[digits[-self.suffix_length:]]
+
+    def _token_range(self, prefix):
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        end = bisect.bisect_left(self._vocabulary, prefix + '\U0010ffff', start)
+        return self._vocabulary[start:end]
+
+    def _phone_buckets(self, digits):
+        if len(digits) >= self.suffix_length:
+            bucket = self._phones.get(digits[-self.suffix_length:])
+            return [bucket] if bucket else []
+        return [bucket for suffix, bucket in self._phones.items() if suffix.endswith(digits)]
+
+    def _iter_term(self, term):
+        kind, value = term
+        if kind == 'phone':
+            for bucket in self._phone_buckets(value):
+                for digits, key in bucket:
+                    if digits.endswith(value):
+                        yield key
+        else:
+            for token in self._token_range(value):
+                yield from self._postings[token]
+
+    def _estimate(self, term):
+        kind, value = term
+        if kind == 'phone':
+            return sum(len(bucket) for bucket in self._phone_buckets(value))
+        return sum(len(self._postings[token]) for token in self._token_range(value))
+
+    def _parse(self, query):
+        terms = []
+        for word in WORD_RE.findall(normalize(query)):
+            if word.isdigit() and len(word) >= self.suffix_length:
+                terms.append(('phone', word))
+            else:
+                terms.append(('text', word))
+        return terms
+
+    @staticmethod
+    def _matches(terms, text, phone):
+        tokens = WORD_RE.findall(normalize(text))
+        digits = phone_digits(phone)
+        for kind, value in terms:
+            if kind == 'phone':
+                if not digits.endswith(value):
+                    return False
+            elif not any(token.startswith(value) for token in tokens):
+                return False
+        return True
+
+    def search(self, query, limit=50):
+        terms = self._parse(query)
+        if not terms:
+            return []
+        terms.sort(key=self._estimate)
+        driver, rest = terms[0], terms[1:]
+        if rest and self._estimate(driver) > self.verify_threshold:
+            keys = set()
+            if driver[0] == 'phone':
+                keys.update(self._iter_term(driver))
+            else:
+                for token in self._token_range(driver[1]):
+                    keys.update(self._postings[token])
+            for kind, value in rest:
+                matched = set()
+                if kind == 'phone':
+                    matched.update(key for key in self._iter_term((kind, value)) if key in keys)
+                else:
+                    for token in self._token_range(value):
+                        matched |= keys.intersection(self._postings[token])
+                keys = matched
+                if not keys:
+                    break
+            return heapq.nsmallest(limit, keys)
+        # Оба пути возвращают ключи по возрастанию: первые limit совпадений не зависят от того,
+        # сколько данных и какой путь выбран
+        candidates = set(self._iter_term(driver))
+        if not rest:
+            return heapq.nsmallest(limit, candidates)
+        result = []
+        for key in sorted(candidates):
+            if self._matches(rest, *self.describe(key)):
+                result.append(key)
+                if len(result) >= limit:
+                    break
+        return result
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import mmap
+import struct
+import sys
+from array import array
+from itertools import accumulate
+
+from client_file import CorruptFileError, atomic_write_binary
+
+MAGIC = b'CLSNAP01'
+# magic, контрольная сумма исходного JSON/YAML, контрольная сумма остальной части файла,
+# число записей, число строк, длина описания полей
+HEADER = struct.Struct('<8s32s32sIII')
+
+
+TYPECODES = {'s': 'I', 'q': 'q'}
+
+
+def padded(size):
+    return size + -size % 8
+
+
+def pad(data):
+    return data + b'\0' * (padded(len(data)) - len(data))
+
+
+def save_snapshot(path, fields, columns, source_checksum):
+    count = len(columns[0]) if columns else 0
+
+    # Одинаковые строки (фамилии, имена, города) хранятся в таблице один раз
+    table = dict.fromkeys(value for (_, kind), column in zip(fields, columns) if kind == 's' for value in column)
+    string_ids = dict(zip(table, range(len(table))))
+    # Каждая строка завершается нулевым байтом: так всю таблицу можно раскодировать одним split
+    strings = [value.encode('utf-8') + b'\0' for value in table]
+
+    parts = [pad(json.dumps(fields).encode('utf-8'))]
+    spec_length = len(parts[0])
+    offsets = array('Q', accumulate(map(len, strings), initial=0))
+    parts.append(offsets)
+    parts.append(pad(b''.join(strings)))
+    for (_, kind), column in zip(fields, columns):
+        values = array(TYPECODES[kind], map(string_ids.__getitem__, column) if kind == 's' else column)
+        parts.append(values)
+    if sys.byteorder == 'big':
+        for part in parts:
+            if isinstance(part, array):
+                part.byteswap()
+    parts = [pad(part.tobytes()) if isinstance(part, array) else part for part in parts]
+
+    payload_hash = hashlib.sha256()
+    for part in parts:
+        payload_hash.update(part)
+    header = HEADER.pack(MAGIC, bytes.fromhex(source_checksum), payload_hash.digest(), count, len(strings), spec_length)
+
+    def write(raw):
+        raw.write(header)
+        for part in parts:
+            raw.write(part)
+
+    atomic_write_binary(path, write)
+    return count
+
+
+class ClientSnapshot:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._views = []
+        self._map = None
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._parse()
+        except (CorruptFileError, struct.error, ValueError, TypeError) as e:
+            self.close()
+            raise CorruptFileError(f"{path}: {e}") from e
+
+    def _parse(self):
+        if len(self._map) < HEADER.size:
+            raise CorruptFileError("truncated snapshot")
+        magic, source, payload, self.record_count, string_count, spec_length = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise CorruptFileError("not a client snapshot")
+        if hashlib.sha256(self._view(HEADER.size, len(self._map))).digest() != payload:
+            raise CorruptFileError("checksum mismatch, the snapshot is damaged")
+        self.source_checksum = source.hex()
+
+        position = HEADER.size
+        self.fields = [tuple(field) for field in json.loads(self._map[position:position + spec_length].rstrip(b'\0'))]
+        position += spec_length
+        self._offsets = self._array('Q', position, string_count + 1)
+        position += padded((string_count + 1) * 8)
+        self._blob = position
+        position += padded(self._offsets[string_count])
+        self._columns = []
+        for _, kind in self.fields:
+            column = self._array(TYPECODES[kind], position, self.record_count)
+            self._columns.append(column)
+            position += padded(self.record_count * column.itemsize)
+        if position != len(self._map):
+            raise CorruptFileError("unexpected snapshot size")
+        self._strings = [None] * string_count
+
+    def _view(self, start, end):
+        view = memoryview(self._map)[start:end]
+        self._views.append(view)
+        return view
+
+    def _array(self, typecode, start, length):
+        size = array(typecode).itemsize
+        view = self._view(start, start + length * size)
+        if len(view) != length * size:
+            raise CorruptFileError("truncated snapshot")
+        if sys.byteorder == 'little':
+            view = view.cast(typecode)
+            self._views.append(view)
+            return view
+        values = array(typecode, view)
+        values.byteswap()
+        return values
+
+    def string(self, string_id):
+        value = self._strings[string_id]
+        if value is None:
+            start = self._blob + self._offsets[string_id]
+            end = self._blob + self._offsets[string_id + 1] - 1
+            value = self._strings[string_id] = str(self._map[start:end], 'utf-8')
+        return value
+
+    def _decode_strings(self):
+        count = len(self._strings)
+        strings = str(self._map[self._blob:self._blob + self._offsets[count]], 'utf-8').split('\0')[:-1]
+        if len(strings) == count:
+            self._strings = strings
+        else:
+            # В самих строках встретился нулевой символ, раскодируем по смещениям
+            for string_id in range(count):
+                self.string(string_id)
+
+    def __len__(self):
+        return self.record_count
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.record_count:
+            raise IndexError(index)
+        return tuple(self.string(column[index]) if kind == 's' else column[index]
+                     for (_, kind), column in zip(self.fields, self._columns))
+
+    def columns(self):
+        if None in self._strings:
+            self._decode_strings()
+        return [list(map(self._strings.__getitem__, column)) if kind == 's' else list(column)
+                for (_, kind), column in zip(self.fields, self._columns)]
+
+    def __iter__(self):
+        return zip(*self.columns())
+
+    def close(self):
+        # mmap нельзя закрыть, пока на него ссылаются memoryview
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._columns = []
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_snapshot(path, source_checksum):
+    if source_checksum is None:
+        return None
+    try:
+        snapshot = ClientSnapshot(path)
+    except FileNotFoundError:
+        return None
+    except CorruptFileError as e:
+        print("Ignoring client snapshot:", e)
+        return None
+    if snapshot.source_checksum != source_checksum:
+        snapshot.close()
+        return None
+    return snapshot
@@ -0,0 +1,95 @@
+import json
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+WHITESPACE = ' \t\r\n'
+
+
+def iter_json_array(file, chunk_size=65536):
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    state = 'start'
+    while True:
+        while pos < len(buffer) and buffer[pos] in WHITESPACE:
+            pos += 1
+
+        if pos == len(buffer):
+            if eof:
+                if state == 'start':
+                    return
+                raise json.JSONDecodeError("Unexpected end of array", buffer, pos)
+            buffer = buffer[pos:] + file.read(chunk_size)
+            pos = 0
+            eof = not buffer
+            continue
+
+        char = buffer[pos]
+        if state == 'start':
+            if char != '[':
+                raise json.JSONDecodeError("Expected '['", buffer, pos)
+            pos += 1
+            state = 'first'
+        elif char == ']' and state in ('first', 'next'):
+            return
+        elif state == 'next':
+            if char != ',':
+                raise json.JSONDecodeError("Expected ',' or ']'", buffer, pos)
+            pos += 1
+            state = 'value'
+        else:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = file.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            pos = end
+            state = 'next'
+            yield item
+            if pos > chunk_size:
+                buffer = buffer[pos:]
+                pos = 0
+
+
+def iter_json_lines(file):
+    for line in file:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_yaml_list(file):
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    chunk = []
+    for line in file:
+        if line.startswith('- ') or line.rstrip('\r\n') == '-':
+            if chunk:
+                yield from yaml.load(''.join(chunk), Loader=loader) or []
+            chunk = [line]
+        elif chunk or line.strip() not in ('', '---') and not line.startswith('#'):
+            chunk.append(line)
+    if chunk:
+        yield from yaml.load(''.join(chunk), Loader=loader) or []
+
+
+def iter_records(file, filename):
+    if filename.endswith('.jsonl'):
+        return iter_json_lines(file)
+    return iter_json_array(file)
+
+
+def write_records(file, filename, records):
+    if filename.endswith('.jsonl'):
+        for record in records:
+            file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+    else:
+        json.dump(list(records), file, ensure_ascii=False, indent=4)
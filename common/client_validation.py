@@ -0,0 +1,138 @@
+from itertools import compress, count, repeat
+from operator import and_, itemgetter, not_
+
+TYPE_NAMES = {str: 'string', int: 'integer'}
+
+MESSAGES = {
+    'record': "Record must be an object",
+    'type': "{name} must be a {type}",
+    'blank': "{name} must not be empty",
+    'max_length': "{name} must not exceed {max_length} characters",
+    'exact_length': "{name} must be exactly {exact_length} characters",
+    'alpha': "{name} must contain only alphabetic characters",
+    'phone': "{name} must be in the format '+1234567890'",
+}
+
+RUSSIAN_MESSAGES = {
+    'record': "Запись должна быть объектом",
+    'type': "{name} должен быть типа {type_name}",
+    'blank': "{name} не может быть пустым",
+    'max_length': "{name} не может быть длиннее {max_length} символов",
+    'exact_length': "{name} должен содержать ровно {exact_length} символов",
+    'alpha': "{name} может содержать только буквы",
+    'phone': "{name} должен быть в формате '+1234567890'",
+}
+
+# Правила для полей клиента, общие для всех лабораторных. Ключи записей в лабораторных разные
+# (last_name, LastName, _last_name), поэтому таблица под свои ключи собирается через keyed_rules
+CLIENT_INPUT_RULES = {
+    'last_name': ("Last name", dict(is_alpha=True, max_length=50)),
+    'first_name': ("First name", dict(is_alpha=True, max_length=50)),
+    'middle_name': ("Middle name", dict(is_alpha=True, max_length=50)),
+    'address': ("Address", dict(max_length=100)),
+    'phone': ("Phone number", dict(is_phone=True, exact_length=12)),
+}
+
+# Сохранённые записи проверяются мягче: поле должно быть непустой строкой
+CLIENT_STORED_RULES = {
+    'last_name': ("Фамилия", dict(not_blank=True)),
+    'first_name': ("Имя", dict(not_blank=True)),
+    'middle_name': ("Отчество", dict(not_blank=True)),
+    'address': ("Адрес", dict(not_blank=True)),
+    'phone': ("Телефон", dict(not_blank=True)),
+}
+
+
+def keyed_rules(rules, keys):
+    # keys перечисляют поля в том же порядке, что и в rules
+    return dict(zip(keys, rules.values()))
+
+
+def length_at_most(limit):
+    return lambda column: map(limit.__ge__, map(len, column))
+
+
+def length_exactly(length):
+    return lambda column: map(length.__eq__, map(len, column))
+
+
+def each(predicate):
+    return lambda column: map(predicate, column)
+
+
+def phone_numbers(column):
+    # '+' и затем только цифры; регулярное выражение на миллионе номеров заметно медленнее
+    return map(and_, map(str.startswith, column, repeat('+')), map(str.isdigit, map(itemgetter(slice(1, None)), column)))
+
+
+class RecordValidator:
+    def __init__(self, rules, messages=MESSAGES):
+        # rules: {ключ записи: (название поля, параметры проверки)}, порядок ключей задаёт порядок полей
+        self.rules = rules
+        self.messages = messages
+        self.keys = list(rules)
+        self._fields = [self.compile_field(name, **options) for name, options in rules.values()]
+
+    def compile_field(self, name, type=str, not_blank=False, is_alpha=False, is_phone=False,
+                      max_length=None, exact_length=None):
+        # Сообщения и проверки собираются один раз. Каждая проверка обрабатывает целый столбец
+        # встроенными функциями через map, поэтому на одно значение не приходится ни одного вызова Python-кода
+        params = dict(name=name, type=TYPE_NAMES.get(type, type.__name__), type_name=type.__name__,
+                      max_length=max_length, exact_length=exact_length)
+        checks = []
+        if max_length:
+            checks.append((length_at_most(max_length), self.messages['max_length'].format(**params)))
+        if exact_length:
+            checks.append((length_exactly(exact_length), self.messages['exact_length'].format(**params)))
+        if not_blank:
+            checks.append((each(str.strip), self.messages['blank'].format(**params)))
+        if is_alpha:
+            checks.append((each(str.isalpha), self.messages['alpha'].format(**params)))
+        if is_phone:
+            checks.append((phone_numbers, self.messages['phone'].format(**params)))
+        return type, self.messages['type'].format(**params), checks
+
+    def validate_batch(self, records, start=0):
+        # Возвращает только записи с ошибками: {номер записи: [ошибки]}
+        records = list(records)
+        invalid = {}
+
+        def fail(positions, error):
+            for position in positions:
+                invalid.setdefault(start + position, []).append(error)
+
+        is_dict = list(map(isinstance, records, repeat(dict)))
+        not_dicts = [] if all(is_dict) else list(compress(count(), map(not_, is_dict)))
+        if not_dicts:
+            records = [record if ok else {} for record, ok in zip(records, is_dict)]
+
+        for key, (expected, type_error, checks) in zip(self.keys, self._fields):
+            column = list(map(dict.get, records, repeat(key)))
+            typed = list(map(isinstance, column, repeat(expected)))
+            positions = None
+            if not all(typed):
+                fail(compress(count(), map(not_, typed)), type_error)
+                positions = list(compress(count(), typed))
+                column = [column[position] for position in positions]
+            for check, error in checks:
+                passed = list(check(column))
+                if not all(passed):
+                    failed = compress(count(), map(not_, passed))
+                    fail(failed if positions is None else map(positions.__getitem__, failed), error)
+
+        for position in not_dicts:
+            invalid[start + position] = [self.messages['record']]
+        return dict(sorted(invalid.items())) if not_dicts else invalid
+
+    def validate(self, record):
+        return self.validate_batch([record]).get(0, [])
+
+    def validate_values(self, values):
+        return self.validate(dict(zip(self.keys, values)))
+
+
+def describe_errors(invalid, limit=10):
+    lines = [f"#{number}: {'; '.join(errors)}" for number, errors in list(invalid.items())[:limit]]
+    if len(invalid) > limit:
+        lines.append(f"... {len(invalid) - limit} more")
+    return '\n'.join(lines)